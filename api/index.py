@@ -4,3 +4,6 @@ from server import app
 # We can just re-export it.
 # Note: Vercel Python runtime structure usually expects an 'api' folder or specific config.
 # But with the rewrite rule in vercel.json pointing to /api/index.py, we need this file.
+# Keep this import cheap, it runs on every cold start: server imports the HTTP clients
+# lazily, and static/ is served by Vercel's CDN (see vercel.json, SERVE_STATIC).
+# python benchmarks/bench_cold_start.py checks the import time.
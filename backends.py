@@ -0,0 +1,232 @@
+"""
+Search backends and the router that picks one per search.
+
+  gw   search.music on gw-light, under the user's ARL (AsyncDeezerGWClient._call)
+  api  the public API's /search (api.deezer.com), no ARL, its own rate limit
+
+Both return search.music-shaped results ({'data': [...], 'total': N}); parse_candidates /
+first_track read either item format. SearchRouter sends each search to the eligible backend
+with the lowest expected cost: latency EWMA, inflated by the error EWMA, plus any wait for
+a rate-limit token (gw-light counts SEARCH_GW_COST times, since it spends account quota).
+gw-light is only eligible while the account and process limiters have more than
+GW_SEARCH_RESERVE tokens, so searches never eat the quota playlist.create / addSongs need.
+A backend idle for SEARCH_PROBE_INTERVAL gets the next search, to keep its numbers fresh.
+If the chosen backend fails, the search falls over to the next one.
+"""
+import asyncio
+import logging
+import time
+
+import config
+import metrics
+from deezer_gw import DeezerAPIError, RetryableError, search_params
+from rate_limit import AdaptiveLimiter, gw_limiters
+from tracing import tracer
+
+log = logging.getLogger(__name__)
+
+BACKEND_SECONDS = metrics.histogram('deezer_search_backend_seconds', 'Search latency per backend', ('backend',))
+BACKEND_SEARCHES = metrics.counter(
+    'deezer_search_backend_total', 'Searches per backend and outcome (ok, error)', ('backend', 'outcome'))
+
+EWMA_ALPHA = 0.2
+ERROR_PENALTY = 4.0  # an always-failing backend looks 5x slower
+
+
+class Backend:
+    """Latency / error EWMAs and counters; subclasses implement search() and limiters()."""
+    name = None
+    cost = 1.0
+
+    def __init__(self):
+        self.latency = None  # EWMA seconds, None until measured
+        self.error_rate = 0.0  # EWMA of failures
+        self.last_used = 0.0
+        self.searches = 0
+        self.errors = 0
+
+    def limiters(self, client):
+        return ()
+
+    def eligible(self, client):
+        return all(limiter.state != 'open' for limiter in self.limiters(client))
+
+    def wait(self, client):
+        """Seconds until every limiter has a token."""
+        return max([max(0.0, (1 - limiter.tokens()) / limiter.rate) for limiter in self.limiters(client)] or [0.0])
+
+    def expected_cost(self, client):
+        latency = self.latency if self.latency is not None else 0.0  # unmeasured: try it
+        return (latency * (1 + ERROR_PENALTY * self.error_rate) + self.wait(client)) * self.cost
+
+    def record(self, seconds, ok):
+        self.searches += 1
+        self.last_used = time.monotonic()
+        if ok:
+            self.latency = seconds if self.latency is None else (1 - EWMA_ALPHA) * self.latency + EWMA_ALPHA * seconds
+        else:
+            self.errors += 1
+        self.error_rate = (1 - EWMA_ALPHA) * self.error_rate + EWMA_ALPHA * (0.0 if ok else 1.0)
+        BACKEND_SEARCHES.inc(backend=self.name, outcome='ok' if ok else 'error')
+        if ok:
+            BACKEND_SECONDS.observe(seconds, backend=self.name)
+
+    async def aclose(self):
+        pass
+
+    def stats(self):
+        return {
+            'latency_ms': round(self.latency * 1000, 1) if self.latency is not None else None,
+            'error_rate': round(self.error_rate, 4),
+            'searches': self.searches,
+            'errors': self.errors,
+        }
+
+
+class GWBackend(Backend):
+    name = 'gw'
+
+    def __init__(self, reserve=None, cost=None):
+        super().__init__()
+        self.reserve = reserve if reserve is not None else config.GW_SEARCH_RESERVE
+        self.cost = cost if cost is not None else config.SEARCH_GW_COST
+
+    def limiters(self, client):
+        return (gw_limiters.process, gw_limiters.for_account(client.account_key))
+
+    def eligible(self, client):
+        # Leave the last GW_SEARCH_RESERVE tokens to playlist writes
+        return all(limiter.state != 'open' and limiter.tokens() > self.reserve for limiter in self.limiters(client))
+
+    async def search(self, client, query, nb):
+        return await client._call('search.music', search_params(query, nb))
+
+
+class PublicAPIBackend(Backend):
+    name = 'api'
+
+    def __init__(self, url=None, limiter=None):
+        super().__init__()
+        self.url = (url or config.DEEZER_API_URL).rstrip('/')
+        self.limiter = limiter or AdaptiveLimiter('public api', config.API_RATE, config.API_BURST)
+        self._http = None
+
+    def limiters(self, client):
+        return (self.limiter,)
+
+    def _client(self):
+        if self._http is None:
+            import httpx  # first use only (cold start)
+            self._http = httpx.AsyncClient(timeout=config.GW_TIMEOUT, limits=httpx.Limits(
+                max_connections=config.GW_MAX_CONNECTIONS, max_keepalive_connections=config.GW_MAX_CONNECTIONS))
+        return self._http
+
+    async def search(self, client, query, nb):
+        delay, probe = self.limiter.reserve()  # may raise CircuitOpenError
+        try:
+            if delay:
+                await asyncio.sleep(delay)
+            results = await self._search(query, nb)
+        except (RetryableError, DeezerAPIError):
+            raise  # _search's on_throttle / on_failure / on_success settled the breaker
+        except BaseException:
+            self.limiter.release(probe)  # cancelled (a closed stream) or an unexpected error
+            raise
+        return results
+
+    async def _search(self, query, nb):
+        http = self._client()
+        try:
+            response = await http.get(f'{self.url}/search', params={'q': query, 'limit': nb})
+        except Exception as e:
+            self.limiter.on_failure()
+            raise RetryableError(f"public API search failed: {e}") from e
+        if response.status_code == 429 or response.status_code >= 500:
+            if response.status_code == 429:
+                self.limiter.on_throttle()
+            else:
+                self.limiter.on_failure()
+            raise RetryableError(f"HTTP {response.status_code} from public API search",
+                                 throttled=response.status_code == 429)
+        data = response.json()
+        error = data.get('error')
+        if error:
+            if error.get('code') == 4:  # "Quota limit exceeded"
+                self.limiter.on_throttle()
+                raise RetryableError(f"public API quota: {error.get('message')}", throttled=True)
+            self.limiter.on_success()
+            raise DeezerAPIError('api.search', error)
+        self.limiter.on_success()
+        return {'data': data.get('data') or [], 'total': data.get('total', 0)}
+
+    async def aclose(self):
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
+
+    def stats(self):
+        return dict(super().stats(), limiter=self.limiter.stats())
+
+
+BACKENDS = {'gw': GWBackend, 'api': PublicAPIBackend}
+
+
+class SearchRouter:
+    def __init__(self, names=None, probe_interval=None):
+        names = names or config.SEARCH_BACKENDS
+        unknown = [name for name in names if name not in BACKENDS]
+        if unknown:
+            raise ValueError(f"Unknown SEARCH_BACKENDS {unknown}; choose from {', '.join(BACKENDS)}")
+        self.backends = [BACKENDS[name]() for name in names]
+        self.probe_interval = probe_interval if probe_interval is not None else config.SEARCH_PROBE_INTERVAL
+        self.failovers = 0
+
+    def order(self, client):
+        """Backends to try for one search, best first."""
+        if len(self.backends) == 1:
+            return self.backends
+        eligible = [b for b in self.backends if b.eligible(client)]
+        # Nothing has quota to spare: rank them all rather than fail the search
+        ranked = sorted(eligible or self.backends, key=lambda b: b.expected_cost(client))
+        now = time.monotonic()
+        stale = [b for b in ranked[1:] if now - b.last_used > self.probe_interval]
+        if stale:
+            ranked.remove(stale[0])
+            ranked.insert(0, stale[0])
+            stale[0].last_used = now  # one probe per interval, not one per concurrent search
+        return ranked + [b for b in self.backends if b not in ranked]
+
+    async def search(self, client, query, nb):
+        """search.music-shaped results for `query`, from the best backend that answers."""
+        error = None
+        for backend in self.order(client):
+            if error is not None:
+                self.failovers += 1
+                log.debug("Search via %s failed (%s), trying %s", error[0], error[1], backend.name)
+            start = time.perf_counter()
+            try:
+                with tracer.span('backend', backend=backend.name):
+                    results = await backend.search(client, query, nb)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                backend.record(time.perf_counter() - start, ok=False)
+                error = (backend.name, e)
+                continue
+            backend.record(time.perf_counter() - start, ok=True)
+            return results
+        raise error[1]
+
+    async def aclose(self):
+        for backend in self.backends:
+            await backend.aclose()
+
+    def stats(self):
+        return {
+            'backends': {b.name: b.stats() for b in self.backends},
+            'failovers': self.failovers,
+        }
+
+
+# Shared by every AsyncDeezerGWClient
+search_router = SearchRouter()
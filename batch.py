@@ -0,0 +1,188 @@
+import argparse
+import asyncio
+import json
+import os
+import sys
+from itertools import islice
+
+import config
+from parser import iter_parse
+from coordinator import coordinator
+from payload import legacy_row
+
+
+def iter_sources(paths):
+    """Expand CLI paths into input files: directories are walked (sorted, hidden files skipped), '-' is stdin."""
+    for path in paths or ['-']:
+        if path != '-' and os.path.isdir(path):
+            for root, dirs, files in os.walk(path):
+                dirs[:] = sorted(d for d in dirs if not d.startswith('.'))
+                for name in sorted(files):
+                    if not name.startswith('.'):
+                        yield os.path.join(root, name)
+        else:
+            yield path
+
+
+def iter_songs(paths):
+    """Yield (source, n, artist, title) for every song, reading each file line by line."""
+    for source in iter_sources(paths):
+        if source == '-':
+            stream = sys.stdin
+        else:
+            try:
+                stream = open(source, 'r', encoding='utf-8', errors='replace')
+            except OSError as e:
+                print(f"Skipping {source}: {e}", file=sys.stderr)
+                continue
+        try:
+            for n, (artist, title) in enumerate(iter_parse(stream)):
+                yield source, n, artist, title
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+
+
+def song_key(source, n):
+    return f"{source}#{n}"
+
+
+def load_checkpoint(path):
+    """
+    Keys of songs already written to the output JSONL, which doubles as the checkpoint.
+    A half-written last line (crash mid-write) is cut off so appending continues cleanly.
+    """
+    done = set()
+    if not path or path == '-' or not os.path.exists(path):
+        return done
+    good = 0  # byte offset just past the last complete record
+    with open(path, 'rb') as f:
+        for raw in f:
+            if not raw.endswith(b'\n'):
+                break
+            try:
+                record = json.loads(raw)
+                key = song_key(record['source'], record['n'])
+            except (ValueError, KeyError, TypeError):
+                break
+            done.add(key)
+            good += len(raw)
+        size = f.seek(0, os.SEEK_END)
+    if good < size:
+        print(f"Checkpoint: dropping an incomplete record at the end of {path}", file=sys.stderr)
+        with open(path, 'r+b') as f:
+            f.truncate(good)
+    return done
+
+
+class BatchStats:
+    def __init__(self):
+        self.parsed = 0
+        self.skipped = 0
+        self.counts = {'found': 0, 'ambiguous': 0, 'missing': 0, 'error': 0}
+
+    def summary(self):
+        resolved = sum(self.counts.values()) - self.counts['error']
+        parts = ', '.join(f"{count} {status}" for status, count in self.counts.items())
+        return f"{self.parsed} songs parsed, {self.skipped} already done, {resolved} resolved ({parts})"
+
+
+async def run_batch(client, paths, out, done=None, concurrency=None, read_ahead=256):
+    """
+    Parse `paths` incrementally and resolve songs while parsing continues: at most
+    `concurrency` songs are being searched at once, and each result is written to `out`
+    as one JSON line as soon as it completes (so output is in completion order; sort by
+    source/n if needed). Songs whose key is in `done` are skipped.
+    Failed songs are reported on stderr and not written, so a resumed run retries them.
+    """
+    concurrency = max(1, concurrency or config.RESOLVE_CONCURRENCY)
+    done = done or set()
+    stats = BatchStats()
+    slots = asyncio.Semaphore(concurrency)
+    tasks = set()
+    songs = iter_songs(paths)
+
+    async def resolve(source, n, artist, title):
+        try:
+            row = await coordinator.resolve_one(client, artist, title)
+        except Exception as e:
+            stats.counts['error'] += 1
+            print(f"[ERROR] {source}#{n} {artist} - {title}: {e}", file=sys.stderr)
+            return
+        finally:
+            slots.release()
+        stats.counts[row['status']] += 1
+        out.write(json.dumps({'source': source, 'n': n, **legacy_row(row)}, ensure_ascii=False) + '\n')
+        out.flush()
+
+    try:
+        while True:
+            # File/stdin reads block, so parse the next slice in a thread while searches run
+            batch = await asyncio.to_thread(lambda: list(islice(songs, read_ahead)))
+            if not batch:
+                break
+            for source, n, artist, title in batch:
+                stats.parsed += 1
+                if song_key(source, n) in done:
+                    stats.skipped += 1
+                    continue
+                await slots.acquire()  # backpressure: don't parse far ahead of the searches
+                task = asyncio.create_task(resolve(source, n, artist, title))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+                if stats.parsed % 100 == 0:
+                    print(f"... {stats.parsed} songs parsed", file=sys.stderr)
+
+        if tasks:
+            await asyncio.gather(*tasks)
+    finally:
+        # Interrupted: stop the searches still running so nothing writes after we return
+        for task in tasks:
+            task.cancel()
+    return stats
+
+
+async def amain(args):
+    from deezer_gw_async import AsyncDeezerGWClient
+
+    if not config.ARL:
+        print("Error: batch mode needs DEEZER_ARL in .env", file=sys.stderr)
+        return 1
+
+    to_stdout = args.output == '-'
+    done = set() if to_stdout else load_checkpoint(args.output)
+    if done:
+        print(f"Resuming: {len(done)} songs already in {args.output}", file=sys.stderr)
+
+    client = await AsyncDeezerGWClient.connect(config.ARL)
+    out = sys.stdout if to_stdout else open(args.output, 'a', encoding='utf-8')
+    try:
+        stats = await run_batch(client, args.paths, out, done, args.concurrency)
+    finally:
+        if not to_stdout:
+            out.close()
+        await client.aclose()
+    print(stats.summary(), file=sys.stderr)
+    return 1 if stats.counts['error'] else 0
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(
+        prog='main.py --batch',
+        description="Resolve tracklists to Deezer tracks, one JSON line per song. "
+                    "Re-running with the same --output resumes where it stopped.")
+    ap.add_argument('paths', nargs='*', help="files or directories of tracklists; '-' or nothing = stdin")
+    ap.add_argument('-o', '--output', default='-', help="JSONL output (and checkpoint) file; '-' = stdout")
+    ap.add_argument('-c', '--concurrency', type=int, default=None,
+                    help=f"songs searched at once (default RESOLVE_CONCURRENCY={config.RESOLVE_CONCURRENCY})")
+    args = ap.parse_args(argv)
+    config.setup_logging()
+    try:
+        return asyncio.run(amain(args))
+    except KeyboardInterrupt:
+        print("Interrupted; run again with the same --output to resume.", file=sys.stderr)
+        return 130
+
+
+if __name__ == '__main__':
+    sys.exit(main())
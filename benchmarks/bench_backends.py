@@ -0,0 +1,86 @@
+"""
+Search backend routing benchmark: one user prepares --songs songs and then creates the
+playlist, under the production gw-light rate limits, with SEARCH_BACKENDS=gw (everything
+on the user's ARL, as before) and gw,api (searches routed between gw-light and the public
+API, gw-light quota kept for the writes).
+
+The fake gw-light answers both (search.music with --latency, the public API's /search with
+--api-latency). Reports prepare time, where the searches went, the account's rate-limit
+tokens left after the prepare, and how long the playlist writes then took.
+
+    python benchmarks/bench_backends.py --songs 300 --latency lognormal:0.08:0.5 --api-latency lognormal:0.06:0.5
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fake_gw import start_fake_gw
+from bench_prepare import make_songs
+
+
+async def run(args, gw):
+    import backends
+    import deezer_gw_async
+    import rate_limit
+    from deezer_gw import arl_key
+    from resolver import resolve_songs
+    from search_cache import SearchCache
+
+    print(f'{args.songs} songs, gw-light {gw.latency.spec}, public API {args.api_latency}, '
+          f'account limit {rate_limit.config.GW_ARL_RATE:.0f}/s (burst {rate_limit.config.GW_ARL_BURST:.0f})')
+    print(f'{"backends":<9} {"prepare s":>9} {"gw searches":>12} {"api searches":>13} '
+          f'{"tokens left":>12} {"writes s":>9} {"total s":>8}')
+    for n, names in enumerate((['gw'], ['gw', 'api'])):
+        # Fresh limiters and router per run, as if in a new process
+        limiters = rate_limit.GWLimiters()
+        deezer_gw_async.gw_limiters = backends.gw_limiters = limiters
+        deezer_gw_async.search_router = router = backends.SearchRouter(names)
+        arl = f'bench-arl-{n}'
+        client = await deezer_gw_async.AsyncDeezerGWClient.connect(arl)
+        client.search_cache = SearchCache(path='')
+        client.track_index = None
+        songs = [dict(song, title=f"{song['title']} {'-'.join(names)}") for song in make_songs(args.songs)]
+
+        gw.calls.clear()
+        t0 = time.perf_counter()
+        rows = await resolve_songs(client, songs)
+        prepared = time.perf_counter() - t0
+        tokens = limiters.for_account(arl_key(arl)).tokens()
+        searches = dict(gw.calls)
+
+        track_ids = [row['id'] for row in rows if row['status'] == 'found']
+        t1 = time.perf_counter()
+        playlist_id = await client.create_playlist(f'bench {n}')
+        for start in range(0, len(track_ids), 100):
+            await client.add_tracks_to_playlist(playlist_id, track_ids[start:start + 100])
+        written = time.perf_counter() - t1
+
+        print(f'{",".join(names):<9} {prepared:>9.2f} {searches.get("search.music", 0):>12} '
+              f'{searches.get("api.search", 0):>13} {tokens:>12.1f} {written:>9.2f} {prepared + written:>8.2f}')
+        await client.aclose()
+        await router.aclose()
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument('--songs', type=int, default=300)
+    ap.add_argument('--latency', default='lognormal:0.08:0.5', help='gw-light latency')
+    ap.add_argument('--api-latency', default='lognormal:0.06:0.5', help='public API latency')
+    args = ap.parse_args()
+
+    # Before deezer_gw is imported: it reads these at import time
+    gw = start_fake_gw(args.latency, method_latency={'api.search': args.api_latency})
+    os.environ['DEEZER_GW_URL'] = gw.url
+    os.environ['DEEZER_API_URL'] = gw.api_url
+    os.environ.setdefault('LOG_LEVEL', 'WARNING')
+
+    asyncio.run(run(args, gw))
+    gw.shutdown()
+
+
+if __name__ == '__main__':
+    main()
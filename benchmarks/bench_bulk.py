@@ -0,0 +1,98 @@
+"""
+Bulk import benchmark: --lists tracklists of --tracks songs each (a --shared share of every
+list drawn from a common pool, like the hits that show up on many mixes), converted
+
+  serial    one list at a time: parse, prepare, create and wait, as the web UI does
+  bulk      all lists in one bulk_import (union of songs resolved once), then all playlists
+
+against the fake gw-light. Reports tracks per second end to end, gw-light searches and
+playlist calls. Each mode uses its own song names, so nothing is answered from the cache
+of the previous one.
+
+    python benchmarks/bench_bulk.py --lists 50 --tracks 100 --latency 0.05
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fake_gw import start_fake_gw
+
+
+def make_lists(rng, n_lists, n_tracks, shared, tag):
+    pool = [f'Hit Artist{i} {tag} - Hit song {i}' for i in range(n_tracks * 2)]
+    lists = []
+    for n in range(n_lists):
+        lines = [rng.choice(pool) if rng.random() < shared else f'Artist{n}x{i} {tag} - Song {i}'
+                 for i in range(n_tracks)]
+        lists.append({'name': f'mix {n}', 'text': '\n'.join(lines)})
+    return lists
+
+
+async def run(args, gw):
+    from session_pool import pool
+
+    async with pool.use('bench-arl') as client:
+        await compare(args, gw, client)
+    await pool.aclose()
+
+
+async def compare(args, gw, client):
+    from bulk import bulk_import, finish_report
+    from jobs import JobQueue, JobStore
+
+    print(f'{args.lists} lists x {args.tracks} tracks ({args.shared:.0%} from a shared pool), '
+          f'fake gw-light latency {gw.latency.spec}, {args.workers} playlist workers')
+    print(f'{"mode":<9} {"seconds":>8} {"tracks/s":>9} {"searches":>9} {"playlist calls":>15} {"added":>7}')
+    rng = random.Random(args.seed)
+    for mode in ('serial', 'bulk'):
+        lists = make_lists(rng, args.lists, args.tracks, args.shared, mode)
+        queue = JobQueue(JobStore(path=''), workers=args.workers)
+        gw.calls.clear()
+        added = 0
+        t0 = time.perf_counter()
+        if mode == 'bulk':
+            report = await finish_report(await bulk_import(client, 'bench-arl', lists, queue), queue)
+            added = report['totals']['tracks_added']
+        else:
+            for item in lists:
+                report = await finish_report(await bulk_import(client, 'bench-arl', [item], queue), queue)
+                added += report['totals']['tracks_added']
+        seconds = time.perf_counter() - t0
+        await queue.aclose()
+        songs = args.lists * args.tracks
+        playlist_calls = sum(count for method, count in gw.calls.items() if method.startswith('playlist.'))
+        print(f'{mode:<9} {seconds:>8.2f} {songs / seconds:>9.0f} {gw.calls["search.music"]:>9} '
+              f'{playlist_calls:>15} {added:>7}')
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument('--lists', type=int, default=50)
+    ap.add_argument('--tracks', type=int, default=100)
+    ap.add_argument('--shared', type=float, default=0.3, help='share of each list drawn from a common pool')
+    ap.add_argument('--latency', default='0.05')
+    ap.add_argument('--workers', type=int, default=2, help='JOB_WORKERS')
+    ap.add_argument('--seed', type=int, default=42)
+    args = ap.parse_args()
+
+    # Before deezer_gw is imported: it reads these at import time
+    gw = start_fake_gw(args.latency, seed=args.seed)
+    os.environ['DEEZER_GW_URL'] = gw.url
+    os.environ['SEARCH_CACHE_DB'] = ''
+    os.environ['TRACK_INDEX_PATH'] = ''
+    os.environ.setdefault('LOG_LEVEL', 'WARNING')
+    # Measure the workflow, not the production rate limits (rate_limit.py)
+    for name in ('GW_RATE', 'GW_BURST', 'GW_ARL_RATE', 'GW_ARL_BURST'):
+        os.environ.setdefault(name, '100000')
+
+    asyncio.run(run(args, gw))
+    gw.shutdown()
+
+
+if __name__ == '__main__':
+    main()
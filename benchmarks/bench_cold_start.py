@@ -0,0 +1,88 @@
+"""
+Cold-start import profile of the Vercel entry point (api/index.py): imports it in fresh
+interpreters with `python -X importtime` and reports the median total and the heaviest
+modules it pulls in.
+
+    python benchmarks/bench_cold_start.py --runs 5 --budget 750
+
+Fails (exit 1) when the median import time is over --budget milliseconds, or when a module
+that should only load on first use (LAZY: HTTP clients, uvicorn) is imported at startup.
+The budget depends on the machine; the LAZY check doesn't.
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ENTRY = 'api.index'
+
+# Loaded by the first request that needs them, never at import
+LAZY = ('requests', 'httpx', 'h2', 'uvicorn')
+
+
+def profile():
+    """[(module, self_us, cumulative_us, depth)] for one cold import of ENTRY, in -X importtime order."""
+    env = dict(os.environ, PYTHONDONTWRITEBYTECODE='1', VERCEL='1')
+    # Memory-only stores: the profile shouldn't depend on what's on disk
+    env.update({'SEARCH_CACHE_DB': '', 'TRACK_INDEX_PATH': '', 'JOBS_DB': ''})
+    proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {ENTRY}'],
+                          cwd=ROOT, env=env, capture_output=True, text=True)
+    if proc.returncode:
+        sys.exit(f'import {ENTRY} failed:\n{proc.stderr}')
+    modules = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        own, cumulative, name = line[len('import time:'):].split('|')
+        depth = (len(name) - len(name.lstrip())) // 2
+        modules.append((name.strip(), int(own), int(cumulative), depth))
+    return modules
+
+
+def children(modules, parent):
+    """Modules `parent` imported itself. -X importtime lists them just before it, one level deeper."""
+    for i, (name, _, _, depth) in enumerate(modules):
+        if name == parent:
+            found = []
+            for child in reversed(modules[:i]):
+                if child[3] <= depth:
+                    break
+                if child[3] == depth + 1:
+                    found.append(child)
+            return found
+    return []
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument('--runs', type=int, default=5)
+    ap.add_argument('--budget', type=float, default=750, help='median import time allowed, ms')
+    ap.add_argument('--top', type=int, default=12, help='heaviest modules to list')
+    args = ap.parse_args()
+
+    runs = [profile() for _ in range(args.runs)]
+    totals = [next(cum for name, _, cum, _ in run if name == ENTRY) / 1000 for run in runs]
+    median = statistics.median(totals)
+    last = runs[-1]
+
+    # What server.py pulls in, heaviest first
+    print(f'{"imported by server":<32} {"cumulative ms":>14}')
+    for name, _, cum, _ in sorted(children(last, 'server'), key=lambda m: -m[2])[:args.top]:
+        print(f'{name:<32} {cum / 1000:>14.1f}')
+    print(f'import {ENTRY}: median {median:.0f} ms over {args.runs} runs '
+          f'(min {min(totals):.0f}, max {max(totals):.0f}), budget {args.budget:.0f} ms')
+
+    imported = {name for name, _, _, _ in last}
+    problems = [f'{name} is imported at startup' for name in LAZY if name in imported]
+    if median > args.budget:
+        problems.append(f'median import time {median:.0f} ms is over the {args.budget:.0f} ms budget')
+    for problem in problems:
+        print(f'REGRESSION {problem}')
+    if problems:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
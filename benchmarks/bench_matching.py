@@ -0,0 +1,58 @@
+"""
+Local ranking micro-benchmark: candidates scored per second by matching.rank, with a
+cold feature cache (every candidate string new) and a warm one (same candidates again,
+as when search results come from the cache).
+
+    python benchmarks/bench_matching.py --songs 200 --candidates 100
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from matching import Candidate, rank, title_features, artist_features
+
+WORDS = ['Love', 'Night', 'Dance', 'Blue', 'Café', 'Fire', 'Dream', 'Ritmo', 'Sky', 'Ghost', 'Beyoncé', 'Señor']
+SUFFIXES = ['', '', ' (Remix)', ' - Remastered 2011', ' (feat. Sky Blue)', ' [Live]', ' (Radio Edit)']
+
+
+def phrase(rng, lo, hi):
+    return ' '.join(rng.choice(WORDS) for _ in range(rng.randint(lo, hi)))
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument('--songs', type=int, default=200)
+    ap.add_argument('--candidates', type=int, default=100, help='candidates scored per song')
+    ap.add_argument('--seed', type=int, default=42)
+    args = ap.parse_args()
+
+    rng = random.Random(args.seed)
+    songs = []
+    for s in range(args.songs):
+        candidates = [
+            Candidate(id=f'{s}-{i}', artist=f'{phrase(rng, 1, 2)} {s}',
+                      title=f'{phrase(rng, 1, 4)} {i}{rng.choice(SUFFIXES)}', album=None)
+            for i in range(args.candidates)
+        ]
+        songs.append((phrase(rng, 1, 2), phrase(rng, 1, 4), candidates))
+
+    total = args.songs * args.candidates
+    print(f'{args.songs} songs x {args.candidates} candidates')
+    for name in ('cold cache', 'warm cache'):
+        if name == 'cold cache':
+            title_features.cache_clear()
+            artist_features.cache_clear()
+        t0 = time.perf_counter()
+        for artist, title, candidates in songs:
+            rank(artist, title, candidates)
+        elapsed = time.perf_counter() - t0
+        print(f'{name:<12} {total / elapsed:>12,.0f} candidates/s  '
+              f'{elapsed / args.songs * 1000:>7.2f} ms per song')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,118 @@
+"""
+Parser micro-benchmark: lines/sec for parse_description and iter_parse on synthetic
+tracklists (timestamps, numbering, dashes, noise), against the original implementation.
+Also checks that the outputs are identical.
+
+    python benchmarks/bench_parser.py --lines 100000 --repeat 3
+"""
+import argparse
+import os
+import random
+import re
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from parser import parse_description, iter_parse
+
+
+def legacy_parse_description(text):
+    """parse_description as it was before the single-pass rewrite (reference output)."""
+    songs = []
+    for line in text.split('\n'):
+        line = line.strip()
+        if not line:
+            continue
+        line_clean = re.sub(r'^\s*[\(\[]?(\d{1,2}:)?\d{1,2}:\d{2}[\)\]]?\s*', '', line)
+        line_clean = re.sub(r'^\d+[\.\)]?\s*', '', line_clean)
+        line_clean = line_clean.replace('—', '-').replace('–', '-')
+        if ' - ' in line_clean:
+            parts = line_clean.split(' - ')
+            if len(parts) >= 2:
+                artist = parts[0].strip()
+                title = ' - '.join(parts[1:]).strip()
+                if len(artist) == 0 and len(title) > 0:
+                    songs.append(("", title))
+                elif len(artist) > 0 and len(title) > 0:
+                    songs.append((artist, title))
+        else:
+            if len(line_clean) > 3:
+                songs.append(("", line_clean))
+    return songs
+
+
+WORDS = ['Love', 'Night', 'Dance', 'Blue', 'Café', 'Fire', 'Dream', 'Ritmo', 'Sky', 'Ghost', '8', 'Ø']
+
+
+def synthetic_line(rng):
+    artist = ' '.join(rng.choice(WORDS) for _ in range(rng.randint(1, 3)))
+    title = ' '.join(rng.choice(WORDS) for _ in range(rng.randint(1, 4)))
+    kind = rng.randrange(12)
+    if kind == 0:
+        return ''
+    if kind == 1:
+        return 'Follow me on https://example.com'
+    if kind == 2:
+        return f'{rng.randint(0, 59):02d}:{rng.randint(0, 59):02d} {title}'
+    if kind == 3:
+        return f'[{rng.randint(0, 2)}:{rng.randint(0, 59):02d}:{rng.randint(0, 59):02d}] {artist} — {title}'
+    if kind == 4:
+        return f'{rng.randint(1, 300)}. {artist} - {title} (Remix)'
+    if kind == 5:
+        return f'  {rng.randint(1, 9)}) {artist} – {title}  '
+    if kind == 6:
+        return f'- {title}'
+    if kind == 7:
+        return f'{artist} - {title} - Live'
+    if kind == 8:
+        return 'abc'
+    return f'{rng.randint(0, 9)}:{rng.randint(0, 59):02d} {artist} - {title}'
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument('--lines', type=int, default=100000)
+    ap.add_argument('--repeat', type=int, default=3)
+    ap.add_argument('--seed', type=int, default=42)
+    args = ap.parse_args()
+
+    rng = random.Random(args.seed)
+    text = '\n'.join(synthetic_line(rng) for _ in range(args.lines))
+
+    expected = legacy_parse_description(text)
+    assert parse_description(text) == expected, 'parse_description output changed'
+    assert list(iter_parse(text)) == expected, 'iter_parse(str) output changed'
+
+    with tempfile.NamedTemporaryFile('w', encoding='utf-8', suffix='.txt', delete=False) as f:
+        f.write(text)
+        path = f.name
+
+    def from_file():
+        with open(path, encoding='utf-8') as fh:
+            return sum(1 for _ in iter_parse(fh))
+
+    cases = [
+        ('legacy parse_description', lambda: legacy_parse_description(text)),
+        ('parse_description', lambda: parse_description(text)),
+        ('iter_parse(str)', lambda: sum(1 for _ in iter_parse(text))),
+        ('iter_parse(file)', from_file),
+    ]
+    print(f'{args.lines} lines, {len(text) / 1e6:.1f} MB, {len(expected)} songs')
+    baseline = None
+    for name, fn in cases:
+        best = min(_timed(fn) for _ in range(args.repeat))
+        baseline = baseline or best
+        print(f'{name:<26} {args.lines / best:>12,.0f} lines/s  {baseline / best:>5.1f}x')
+    os.unlink(path)
+
+
+def _timed(fn):
+    t0 = time.perf_counter()
+    fn()
+    return time.perf_counter() - t0
+
+
+if __name__ == '__main__':
+    main()
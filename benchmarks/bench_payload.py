@@ -0,0 +1,98 @@
+"""
+/api/prepare payload benchmark: a --rows result (found / ambiguous / missing rows built by
+resolver.match_row from Deezer-like candidates) serialised the old way and the new ways:
+  fastapi:  dict rows through FastAPI's default path (jsonable_encoder + json.dumps), as before
+  rows:     the same dict rows, payload.dumps (orjson when installed)
+  compact:  payload.pack_results + payload.dumps (arrays, artist/album tables)
+Reports body size (raw and gzipped) and time to build + serialise, and the memory held by
+one response's candidates as dicts vs Candidate tuples.
+
+    python benchmarks/bench_payload.py --rows 500
+"""
+import argparse
+import gzip
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import payload
+from deezer_gw import parse_candidates
+from resolver import match_row
+
+WORDS = ['Love', 'Night', 'Dance', 'Blue', 'Café', 'Fire', 'Dream', 'Ritmo', 'Sky', 'Ghost', 'Heart', 'Señor',
+         'Gold', 'River', 'Summer', 'Moon', 'Wild', 'Paris', 'Electric', 'Home']
+SUFFIXES = ['', '', '', ' (Remix)', ' - Remastered 2011', ' (feat. Sky Blue)', ' [Live]', ' (Radio Edit)']
+
+
+def phrase(rng, lo, hi):
+    return ' '.join(rng.choice(WORDS) for _ in range(rng.randint(lo, hi)))
+
+
+def make_rows(rng, n):
+    """Rows of a typical playlist: artists repeat, an artist's tracks share a few albums."""
+    artists = [phrase(rng, 1, 3) for _ in range(max(1, n // 4))]
+    albums = {a: [phrase(rng, 1, 3) for _ in range(3)] for a in artists}
+    rows = []
+    for i in range(n):
+        artist = rng.choice(artists)
+        title = f'{phrase(rng, 1, 4)} {i}'
+        kind = rng.random()
+        if kind < 0.15:
+            data = []  # missing
+        elif kind < 0.55:
+            # ambiguous: covers and near-misses, none clearly the one asked for
+            data = [{'SNG_ID': str(rng.randrange(10 ** 9)), 'SNG_TITLE': f'{title.split()[0]} {phrase(rng, 1, 2)} {i}',
+                     'ART_NAME': rng.choice(artists), 'ALB_TITLE': rng.choice(albums[artist])}
+                    for _ in range(rng.randint(5, 10))]
+        else:
+            data = [{'SNG_ID': str(rng.randrange(10 ** 9)), 'SNG_TITLE': title + rng.choice(SUFFIXES[:3]),
+                     'ART_NAME': artist, 'ALB_TITLE': rng.choice(albums[artist])}]
+        rows.append(match_row(artist, title, parse_candidates({'data': data})))
+    return rows
+
+
+def fastapi_body(rows):
+    from fastapi.encoders import jsonable_encoder
+    import json
+    content = jsonable_encoder({'results': [payload.legacy_row(row) for row in rows]})
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, indent=None, separators=(',', ':')).encode('utf-8')
+
+
+MODES = {
+    'fastapi': fastapi_body,
+    'rows': lambda rows: payload.dumps({'results': [payload.legacy_row(row) for row in rows]}),
+    'compact': lambda rows: payload.dumps({'results': payload.pack_results(rows)}),
+}
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument('--rows', type=int, default=500)
+    ap.add_argument('--repeat', type=int, default=50)
+    ap.add_argument('--seed', type=int, default=42)
+    args = ap.parse_args()
+
+    rows = make_rows(random.Random(args.seed), args.rows)
+    counts = {s: sum(r['status'] == s for r in rows) for s in payload.STATUSES}
+    print(f'{args.rows} rows {counts}, encoder: {"orjson" if payload.orjson else "json"}')
+    print(f'{"mode":<8} {"bytes":>9} {"gzip":>8} {"ms":>8}')
+    for name, encode in MODES.items():
+        body = encode(rows)
+        t0 = time.perf_counter()
+        for _ in range(args.repeat):
+            encode(rows)
+        elapsed = (time.perf_counter() - t0) / args.repeat
+        print(f'{name:<8} {len(body):>9,} {len(gzip.compress(body)):>8,} {elapsed * 1000:>8.2f}')
+
+    candidates = [c for row in rows for c in row.get('candidates', ())]
+    # Containers only: the strings are shared either way
+    as_dicts = sum(sys.getsizeof(payload.candidate_dict(c)) for c in candidates)
+    as_tuples = sum(sys.getsizeof(c) for c in candidates)
+    print(f'{len(candidates)} candidates: {as_dicts:,} bytes as dicts, {as_tuples:,} bytes as Candidate tuples')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+"""
+Benchmark /api/prepare track resolution against the local fake gw-light server.
+Prints wall time vs. track count and concurrency.
+
+    python benchmarks/bench_prepare.py --tracks 25 50 150 --concurrency 1 4 8 16 --latency 0.05
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fake_gw import start_fake_gw
+
+
+def make_songs(count):
+    """A realistic mix: clean matches, suspicious artists, titles only, and misses."""
+    songs = []
+    for i in range(count):
+        kind = i % 10
+        if kind < 6:
+            songs.append({'artist': f'Artist{i}', 'title': f'Song number {i}'})
+        elif kind < 8:
+            songs.append({'artist': '8', 'title': f'Short artist {i}'})
+        elif kind < 9:
+            songs.append({'artist': '', 'title': f'Untitled intro {i}'})
+        else:
+            songs.append({'artist': f'Artist{i}', 'title': f'missing track {i}'})
+    return songs
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument('--tracks', type=int, nargs='+', default=[25, 50, 150])
+    ap.add_argument('--concurrency', type=int, nargs='+', default=[1, 4, 8, 16])
+    ap.add_argument('--latency', type=float, default=0.05, help='fake gw-light seconds per call')
+    args = ap.parse_args()
+
+    server = start_fake_gw(latency=args.latency)
+    os.environ['DEEZER_GW_URL'] = server.url
+    os.environ['TRACK_INDEX_PATH'] = ''  # don't learn fake tracks into the real index
+    # Measure resolution itself, not the production rate limits (rate_limit.py)
+    for name in ('GW_RATE', 'GW_BURST', 'GW_ARL_RATE', 'GW_ARL_BURST'):
+        os.environ.setdefault(name, '100000')
+    os.environ['RESOLVE_PER_ARL_LIMIT'] = str(max(args.concurrency))
+
+    asyncio.run(run(server, args))
+    server.shutdown()
+
+
+async def run(server, args):
+    from deezer_gw_async import AsyncDeezerGWClient
+    from resolver import resolve_songs
+
+    client = await AsyncDeezerGWClient.connect('bench-arl')
+    client.search_cache = None  # measure the network path, not the cache
+    client.track_index = None
+
+    print(f'fake gw-light latency: {args.latency * 1000:.0f} ms/call')
+    print(f"{'tracks':>7} {'workers':>8} {'calls':>6} {'wall (s)':>9} {'tracks/s':>9} {'speedup':>8}")
+    for count in args.tracks:
+        songs = make_songs(count)
+        serial = None
+        for workers in args.concurrency:
+            server.calls.clear()
+            t0 = time.perf_counter()
+            results = await resolve_songs(client, songs, concurrency=workers)
+            wall = time.perf_counter() - t0
+            assert len(results) == count
+            serial = serial or wall
+            print(f'{count:>7} {workers:>8} {sum(server.calls.values()):>6} {wall:>9.2f} '
+                  f'{count / wall:>9.1f} {serial / wall:>7.1f}x')
+
+    await client.aclose()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+"""
+Round trips for a 100-song /api/prepare: the old one-song-at-a-time loop vs.
+resolver.resolve_songs (two rounds of AsyncDeezerGWClient.search_many).
+The fake gw-light server counts HTTP requests and TCP connections.
+
+    python benchmarks/bench_search_many.py --tracks 100 --latency 0.05 --concurrency 100
+
+"round trips" is wall time divided by the fake per-call latency, i.e. how many
+upstream latencies the user waits for. gw-light has no batch method, so the
+request count only drops through de-duplication; the waiting drops because
+search_many keeps many requests in flight on the same keep-alive connection(s).
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fake_gw import start_fake_gw
+from bench_prepare import make_songs
+
+
+def with_repeats(songs, every=5):
+    """Mixes reprise tracks, like DJ sets: every `every`-th row repeats an earlier one."""
+    return [songs[i // 2] if i and i % every == 0 else song for i, song in enumerate(songs)]
+
+
+async def run(server, args):
+    from deezer_gw_async import AsyncDeezerGWClient
+    from resolver import resolve_song, resolve_songs
+
+    client = await AsyncDeezerGWClient.connect('bench-arl')
+    client.search_cache = None  # count real upstream calls
+    client.track_index = None
+    songs = with_repeats(make_songs(args.tracks))
+
+    async def serial():
+        return [await resolve_song(client, s['artist'], s['title']) for s in songs]
+
+    async def batched():
+        return await resolve_songs(client, songs, concurrency=args.concurrency)
+
+    print(f'{len(songs)} songs, fake gw-light latency {args.latency * 1000:.0f} ms/call')
+    print(f"{'strategy':<26} {'requests':>9} {'conns':>6} {'wall (s)':>9} {'round trips':>12}")
+    outputs = []
+    for name, fn in (('serial (per song)', serial), ('search_many (2 rounds)', batched)):
+        server.calls.clear()
+        conns = server.connections
+        t0 = time.perf_counter()
+        outputs.append(await fn())
+        wall = time.perf_counter() - t0
+        print(f'{name:<26} {server.calls["search.music"]:>9} {server.connections - conns:>6} '
+              f'{wall:>9.2f} {wall / args.latency:>12.1f}')
+
+    # Both strategies must agree row for row
+    assert outputs[0] == outputs[1], 'search_many resolution differs from per-song resolution'
+    await client.aclose()
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument('--tracks', type=int, default=100)
+    ap.add_argument('--latency', type=float, default=0.05)
+    ap.add_argument('--concurrency', type=int, default=100, help='in-flight requests per search_many round')
+    args = ap.parse_args()
+
+    server = start_fake_gw(latency=args.latency)
+    os.environ['DEEZER_GW_URL'] = server.url
+    os.environ['TRACK_INDEX_PATH'] = ''  # don't learn fake tracks into the real index
+    # Measure resolution itself, not the production rate limits (rate_limit.py)
+    for name in ('GW_RATE', 'GW_BURST', 'GW_ARL_RATE', 'GW_ARL_BURST'):
+        os.environ.setdefault(name, '100000')
+    os.environ['RESOLVE_PER_ARL_LIMIT'] = str(args.concurrency)
+    # The fake speaks HTTP/1.1, so each in-flight request needs its own connection here;
+    # against Deezer's HTTP/2 endpoint they are multiplexed over one.
+    os.environ['GW_MAX_CONNECTIONS'] = str(args.concurrency)
+    asyncio.run(run(server, args))
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+"""
+Refine-box type-ahead benchmark: users type "artist title" of a catalog track one character
+at a time, and every prefix (2+ characters) is looked up, as the debounced box does.
+
+The fake gw-light searches a synthetic catalog (every typed word must start a word of
+the track), with --latency per call. Compared:
+  direct:  client.search_candidates(query, 10) per keystroke (the old refine endpoint)
+  suggest: suggest.CandidateCache.search, which filters cached prefixes locally
+Reports gw-light calls and per-keystroke latency (p50/p95). Both share a memory-only
+search cache, so exact repeats are free either way.
+
+    python benchmarks/bench_suggest.py --tracks 20000 --users 50 --latency 0.05
+"""
+import argparse
+import asyncio
+import os
+import random
+import re
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fake_gw import FakeGW
+from bench_track_index import make_vocab, make_tracks
+
+WORD_RE = re.compile(r'\w+')
+
+
+class CatalogGW(FakeGW):
+    """search.music over a fixed catalog instead of echoing the query back."""
+    catalog = []
+
+    def handle_method(self, method, params):
+        if method != 'search.music':
+            return super().handle_method(method, params)
+        words = WORD_RE.findall(params.get('query', '').lower())
+        nb = int(params.get('nb', 1))
+        hits = [t for t in self.catalog if all(any(h.startswith(w) for h in t[4]) for w in words)] if words else []
+        data = [{'SNG_ID': str(tid), 'SNG_TITLE': title, 'ART_NAME': artist, 'ALB_TITLE': album}
+                for tid, artist, title, album, _ in hits[:nb]]
+        return {'data': data, 'total': len(hits)}
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))] if values else 0.0
+
+
+async def run(args, server, typed):
+    from deezer_gw_async import AsyncDeezerGWClient
+    from search_cache import SearchCache
+    from suggest import CandidateCache
+
+    print(f'{len(typed)} users typing, {sum(len(q) - 1 for q in typed)} keystrokes, '
+          f'{len(CatalogGW.catalog):,}-track catalog, fake gw-light latency {args.latency * 1000:.0f} ms')
+    print(f'{"mode":<8} {"gw calls":>9} {"p50 ms":>8} {"p95 ms":>8} {"local answers":>14}')
+    for mode in ('direct', 'suggest'):
+        client = AsyncDeezerGWClient('bench-arl', cache=SearchCache(path=''), index=None)
+        await client._init_session()
+        cache = CandidateCache()
+        server.calls.clear()
+        latencies = []
+        local = 0
+        for query in typed:
+            for end in range(2, len(query) + 1):
+                t0 = time.perf_counter()
+                if mode == 'direct':
+                    await client.search_candidates(query[:end], limit=10)
+                else:
+                    _, source = await cache.search(client, query[:end], limit=10)
+                    local += source != 'network'
+                latencies.append(time.perf_counter() - t0)
+        ratio = f'{local / len(latencies):.0%}' if mode == 'suggest' else '-'
+        print(f'{mode:<8} {server.calls["search.music"]:>9} {percentile(latencies, 0.5) * 1000:>8.1f} '
+              f'{percentile(latencies, 0.95) * 1000:>8.1f} {ratio:>14}')
+        await client.aclose()
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument('--tracks', type=int, default=20000)
+    ap.add_argument('--users', type=int, default=50)
+    ap.add_argument('--latency', type=float, default=0.05)
+    ap.add_argument('--seed', type=int, default=42)
+    args = ap.parse_args()
+
+    rng = random.Random(args.seed)
+    tracks = make_tracks(rng, args.tracks, make_vocab(rng, 3000))
+    CatalogGW.catalog = [(tid, artist, title, album, WORD_RE.findall(f'{artist} {title} {album}'.lower()))
+                         for tid, artist, title, album in tracks]
+    typed = [f'{artist} {title}' for _, artist, title, _ in rng.sample(tracks, args.users)]
+
+    # Before deezer_gw is imported: it reads these at import time
+    server = CatalogGW(('127.0.0.1', 0), latency=args.latency)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    os.environ['DEEZER_GW_URL'] = server.url
+    for name in ('GW_RATE', 'GW_BURST', 'GW_ARL_RATE', 'GW_ARL_BURST'):
+        os.environ.setdefault(name, '100000')
+
+    asyncio.run(run(args, server, typed))
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
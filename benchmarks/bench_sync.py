@@ -0,0 +1,101 @@
+"""
+Playlist sync benchmark: a daily-refreshed playlist where a few rows change each day.
+
+For each day, apply --changes random edits (replace, insert, remove, move) to the desired
+track list, then bring the playlist on the fake gw-light up to date two ways:
+  rebuild: create a new playlist and upload every track (what /api/create does)
+  sync:    AsyncDeezerGWClient.sync_playlist on the same playlist (only the difference)
+and compare gw-light calls and wall time. The synced playlist is checked against the
+desired list after every day.
+
+    python benchmarks/bench_sync.py --tracks 500 --changes 1 5 20 100 --days 10
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fake_gw import start_fake_gw
+
+
+def mutate(rng, tracks, changes, next_id):
+    tracks = list(tracks)
+    for _ in range(changes):
+        kind = rng.choice(('replace', 'insert', 'remove', 'move'))
+        i = rng.randrange(len(tracks))
+        if kind == 'replace':
+            tracks[i] = next_id()
+        elif kind == 'insert':
+            tracks.insert(i, next_id())
+        elif kind == 'remove' and len(tracks) > 1:
+            del tracks[i]
+        elif kind == 'move':
+            tracks.insert(rng.randrange(len(tracks)), tracks.pop(i))
+    return tracks
+
+
+async def run(args, server):
+    from deezer_gw_async import AsyncDeezerGWClient
+    from uploader import upload_tracks
+
+    client = AsyncDeezerGWClient('bench-arl', cache=None, index=None)
+    await client._init_session()
+
+    print(f'{args.tracks}-track playlist, {args.days} days, fake gw-light latency {args.latency * 1000:.0f} ms')
+    print(f'{"changes/day":>11} {"rebuild calls":>14} {"sync calls":>11} {"rebuild (s)":>12} {"sync (s)":>9}')
+    for changes in args.changes:
+        rng = random.Random(args.seed)
+        counter = iter(range(10_000_000, 20_000_000))
+        tracks = list(range(1, args.tracks + 1))
+        playlist_id = await client.create_playlist('bench', tracks)
+
+        totals = {'rebuild': [0, 0.0], 'sync': [0, 0.0]}
+        for _ in range(args.days):
+            tracks = mutate(rng, tracks, changes, lambda: next(counter))
+
+            server.calls.clear()
+            t0 = time.perf_counter()
+            fresh = await client.create_playlist('bench (rebuilt)')
+            await upload_tracks(client, fresh, tracks)
+            totals['rebuild'][1] += time.perf_counter() - t0
+            totals['rebuild'][0] += sum(server.calls.values())
+
+            server.calls.clear()
+            t0 = time.perf_counter()
+            await client.sync_playlist(playlist_id, tracks)
+            totals['sync'][1] += time.perf_counter() - t0
+            totals['sync'][0] += sum(server.calls.values())
+
+            assert server.playlists[playlist_id] == list(dict.fromkeys(tracks)), 'sync diverged'
+
+        days = args.days
+        print(f'{changes:>11} {totals["rebuild"][0] / days:>14.1f} {totals["sync"][0] / days:>11.1f} '
+              f'{totals["rebuild"][1] / days:>12.3f} {totals["sync"][1] / days:>9.3f}')
+    await client.aclose()
+    server.shutdown()
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument('--tracks', type=int, default=500)
+    ap.add_argument('--changes', type=int, nargs='+', default=[1, 5, 20, 100])
+    ap.add_argument('--days', type=int, default=10)
+    ap.add_argument('--latency', type=float, default=0.02)
+    ap.add_argument('--seed', type=int, default=42)
+    args = ap.parse_args()
+
+    # Before deezer_gw is imported: it reads these at import time
+    server = start_fake_gw(args.latency)
+    os.environ['DEEZER_GW_URL'] = server.url
+    for name in ('GW_RATE', 'GW_BURST', 'GW_ARL_RATE', 'GW_ARL_BURST'):
+        os.environ.setdefault(name, '100000')
+
+    asyncio.run(run(args, server))
+
+
+if __name__ == '__main__':
+    main()
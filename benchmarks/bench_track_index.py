@@ -0,0 +1,126 @@
+"""
+Offline track index benchmark.
+
+1. Build a base file of --tracks synthetic tracks: build time and on-disk size.
+2. Open it (memory-mapped) and run --queries lookups of known tracks, in strict and
+   free-text form: queries/sec and how many were answered confidently.
+3. Resolve a Zipf-distributed workload (a few popular songs requested over and over)
+   through resolver.resolve_songs against the fake gw-light, with the search cache off,
+   with and without a (memory-only) index that learns from earlier results:
+   search.music calls avoided.
+
+    python benchmarks/bench_track_index.py --tracks 300000 --queries 20000 --requests 40
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fake_gw import start_fake_gw
+
+SYLLABLES = ['ka', 'lo', 'mi', 'ra', 'ne', 'to', 'su', 'vi', 'da', 'or', 'el', 'an', 'bé', 'qu', 'zo', 'ry']
+
+
+def make_vocab(rng, size):
+    vocab = set()
+    while len(vocab) < size:
+        vocab.add(''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))).capitalize())
+    return sorted(vocab)
+
+
+def make_tracks(rng, count, vocab):
+    tracks = []
+    for n in range(count):
+        artist = ' '.join(rng.choice(vocab) for _ in range(rng.randint(1, 2)))
+        title = ' '.join(rng.choice(vocab) for _ in range(rng.randint(1, 4)))
+        tracks.append((n + 1, artist, title, f'{title} (Album)'))
+    return tracks
+
+
+def bench_index(args, rng):
+    from track_index import TrackIndex, write_base
+    from deezer_gw import strict_query, loose_query
+
+    vocab = make_vocab(rng, 20000)
+    tracks = make_tracks(rng, args.tracks, vocab)
+    path = os.path.join(tempfile.mkdtemp(), 'bench_index.bin')
+
+    t0 = time.perf_counter()
+    write_base(path, tracks)
+    build = time.perf_counter() - t0
+    size = os.path.getsize(path)
+    print(f'build: {args.tracks:,} tracks in {build:.1f}s, {size / 1e6:.1f} MB ({size / args.tracks:.0f} bytes/track)')
+
+    t0 = time.perf_counter()
+    index = TrackIndex(path)
+    print(f'open (mmap): {(time.perf_counter() - t0) * 1000:.1f} ms')
+
+    sample = [rng.choice(tracks) for _ in range(args.queries)]
+    # First pass faults the mmapped pages in and fills matching's feature caches
+    for name, make_query in (('strict', strict_query), ('free text', loose_query)):
+        queries = [make_query(artist, title) for _, artist, title, _ in sample]
+        for run in ('1st pass', '2nd pass'):
+            t0 = time.perf_counter()
+            hits = sum(index.search_results(q, 10) is not None for q in queries)
+            elapsed = time.perf_counter() - t0
+            print(f'{name:<10} {run}  {len(queries) / elapsed:>10,.0f} queries/s  '
+                  f'{hits / len(queries):6.1%} answered locally')
+    os.unlink(path)
+
+
+async def bench_network(args, rng, server):
+    from deezer_gw_async import AsyncDeezerGWClient
+    from track_index import TrackIndex
+    from resolver import resolve_songs
+
+    # Zipf-ish popularity: song k is requested ~1/k as often
+    popular = [{'artist': f'Artist{k}', 'title': f'Song {k}'} for k in range(1, args.popular + 1)]
+    weights = [1 / k for k in range(1, args.popular + 1)]
+    requests = [rng.choices(popular, weights, k=args.songs) for _ in range(args.requests)]
+
+    print(f'\n{args.requests} requests x {args.songs} songs, {args.popular} distinct songs (Zipf), '
+          f'fake gw-light latency {args.latency * 1000:.0f} ms, search cache off')
+    print(f'{"index":<10} {"search.music":>12} {"wall (s)":>9} {"index hit ratio":>16}')
+    for label, index in (('off', None), ('on', TrackIndex(''))):
+        client = AsyncDeezerGWClient('bench-arl', cache=None, index=index)
+        await client._init_session()
+        server.calls.clear()
+        t0 = time.perf_counter()
+        for songs in requests:
+            await resolve_songs(client, songs)
+        elapsed = time.perf_counter() - t0
+        ratio = f"{index.stats()['hit_ratio']:.1%}" if index else '-'
+        print(f'{label:<10} {server.calls["search.music"]:>12} {elapsed:>9.2f} {ratio:>16}')
+        await client.aclose()
+    server.shutdown()
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument('--tracks', type=int, default=300000)
+    ap.add_argument('--queries', type=int, default=20000)
+    ap.add_argument('--requests', type=int, default=40, help='resolve_songs calls in the network part')
+    ap.add_argument('--songs', type=int, default=50, help='songs per request')
+    ap.add_argument('--popular', type=int, default=500, help='distinct songs in the workload')
+    ap.add_argument('--latency', type=float, default=0.02)
+    ap.add_argument('--seed', type=int, default=42)
+    args = ap.parse_args()
+
+    # Before deezer_gw is imported: it reads these at import time
+    server = start_fake_gw(args.latency)
+    os.environ['DEEZER_GW_URL'] = server.url
+    for name in ('GW_RATE', 'GW_BURST', 'GW_ARL_RATE', 'GW_ARL_BURST'):
+        os.environ.setdefault(name, '100000')
+
+    rng = random.Random(args.seed)
+    bench_index(args, rng)
+    asyncio.run(bench_network(args, rng, server))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,205 @@
+"""
+Browser benchmark for the matching table (static/app.js): in headless Chromium, parse N
+songs and stream N compact result rows (60% found, 25% ambiguous with 5 candidates, 15%
+missing), then report
+
+  tti      ms from clicking "Find Matches" until the last row is in and the main thread
+           is free again (a frame and a task both get through within 50 ms)
+  heap     JS heap after a forced GC, MB
+  nodes    DOM nodes
+  scroll   average and worst frame while scrolling the whole list, one screen per frame
+
+The page is static/index.html with fetch() stubbed (no server, no Deezer), so runs are
+reproducible. --rev also runs app.js / style.css from a git revision, for before/after.
+Needs Playwright and its Chromium:
+
+    pip install playwright && playwright install chromium
+    python benchmarks/bench_ui.py --rows 100 1000 5000 --rev HEAD~1
+"""
+import argparse
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASE = 'http://bench.local'
+
+# Runs before app.js: stubs the API the page talks to
+STUB = r"""
+localStorage.setItem('deezer_arl', 'bench-arl');
+window.__benchRows = 0;
+
+function jsonResponse(obj) {
+    return new Response(JSON.stringify(obj), { headers: { 'Content-Type': 'application/json' } });
+}
+
+// Compact NDJSON events (see payload.py), 100 rows per chunk
+function matchEvents(n) {
+    const lines = [JSON.stringify({ type: 'start', total: n, format: 'compact', statuses: ['found', 'ambiguous', 'missing'] })];
+    let artists = 0, albums = 0;
+    for (let i = 0; i < n; i++) {
+        const kind = i % 20;
+        const t = { a: [`Artist ${i}`], b: [] };
+        const artist = artists++;
+        let row;
+        if (kind < 12) {
+            row = [0, 0.95, artist, `Song ${i}`, 3000000 + i, null];
+        } else if (kind < 17) {
+            const candidates = [];
+            for (let c = 0; c < 5; c++) {
+                t.a.push(`Other artist ${i}.${c}`);
+                t.b.push(`Album ${i}.${c}`);
+                candidates.push([4000000 + i * 10 + c, `Song ${i} (version ${c})`, artists++, albums++, 0.6 - c / 20]);
+            }
+            row = [1, 0.6, artist, `Song ${i}`, null, candidates];
+        } else {
+            row = [2, 0.1, artist, `Song ${i}`, null, null];
+        }
+        lines.push(JSON.stringify({ type: 'row', index: i, r: row, t: t, done: i + 1, total: n }));
+    }
+    lines.push(JSON.stringify({ type: 'done', total: n }));
+    const chunks = [];
+    for (let i = 0; i < lines.length; i += 100) chunks.push(lines.slice(i, i + 100).join('\n') + '\n');
+    return chunks;
+}
+
+window.fetch = async (url, options) => {
+    if (url === '/api/auth/check') return jsonResponse({ status: 'ok', user_id: 1 });
+    if (url === '/api/parse') {
+        const songs = [];
+        for (let i = 0; i < window.__benchRows; i++) songs.push({ artist: `Artist ${i}`, title: `Song ${i}` });
+        return jsonResponse({ songs: songs });
+    }
+    if (url === '/api/prepare/stream') {
+        const chunks = matchEvents(window.__benchRows);
+        const encoder = new TextEncoder();
+        return new Response(new ReadableStream({
+            pull(controller) {
+                if (chunks.length) controller.enqueue(encoder.encode(chunks.shift()));
+                else controller.close();
+            }
+        }));
+    }
+    if (url === '/api/suggest') return jsonResponse({ q: JSON.parse(options.body).query, src: 'exact', c: [] });
+    throw new Error(`bench: unexpected fetch ${url}`);
+};
+"""
+
+# Runs in the page: returns tti and scroll frame times
+MEASURE = r"""
+async (n) => {
+    const $ = id => document.getElementById(id);
+    const sleep = ms => new Promise(resolve => setTimeout(resolve, ms));
+    const frame = () => new Promise(resolve => requestAnimationFrame(resolve));
+    async function settle() {
+        while (true) {
+            const start = performance.now();
+            await frame();
+            await sleep(0);
+            if (performance.now() - start < 50) return;
+        }
+    }
+
+    window.__benchRows = n;
+    await settle();
+    $('descriptionInput').value = 'bench';
+    $('btnParse').click();
+    while (!$('songsCount').textContent.includes(`(${n})`)) await sleep(5);
+    await settle();
+
+    const t0 = performance.now();
+    $('btnMatch').click();
+    await sleep(0);
+    while ($('btnMatch').textContent !== '2. Find Matches') await sleep(1);
+    await settle();
+    const tti = performance.now() - t0;
+
+    const list = $('songList');
+    const frames = [];
+    let last = performance.now();
+    while (list.scrollTop + list.clientHeight < list.scrollHeight - 1) {
+        list.scrollTop += list.clientHeight;
+        await frame();
+        const now = performance.now();
+        frames.push(now - last);
+        last = now;
+    }
+    return { tti: tti, frames: frames };
+}
+"""
+
+
+def git_file(rev, path):
+    return subprocess.run(['git', 'show', f'{rev}:{path}'], cwd=ROOT, check=True, capture_output=True).stdout
+
+
+def local_file(path):
+    with open(os.path.join(ROOT, path), 'rb') as f:
+        return f.read()
+
+
+def measure(browser, files, rows):
+    page = browser.new_page(viewport={'width': 1280, 'height': 900})
+    types = {'.html': 'text/html', '.js': 'application/javascript', '.css': 'text/css'}
+
+    def serve(route):
+        path = route.request.url[len(BASE):].split('?')[0]
+        path = 'static/index.html' if path in ('', '/') else path.lstrip('/')
+        if path in files:
+            route.fulfill(status=200, body=files[path], content_type=types[os.path.splitext(path)[1]])
+        else:
+            route.fulfill(status=404, body='')
+
+    page.route('**/*', serve)
+    page.add_init_script(STUB)
+    page.goto(BASE + '/')
+    result = page.evaluate(MEASURE, rows)
+
+    cdp = page.context.new_cdp_session(page)
+    cdp.send('HeapProfiler.collectGarbage')
+    cdp.send('Performance.enable')
+    metrics = {m['name']: m['value'] for m in cdp.send('Performance.getMetrics')['metrics']}
+    page.close()
+    frames = result['frames'] or [0.0]
+    return {
+        'tti': result['tti'],
+        'heap': metrics['JSHeapUsedSize'] / 1e6,
+        'nodes': int(metrics['Nodes']),
+        'scroll_avg': sum(frames) / len(frames),
+        'scroll_max': max(frames),
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument('--rows', type=int, nargs='+', default=[100, 1000, 5000])
+    ap.add_argument('--rev', help='also measure static/ from this git revision (e.g. HEAD~1)')
+    args = ap.parse_args()
+
+    try:
+        from playwright.sync_api import sync_playwright
+    except ImportError:
+        print("Needs Playwright: pip install playwright && playwright install chromium", file=sys.stderr)
+        return 1
+
+    versions = [('working tree', local_file)]
+    if args.rev:
+        versions.insert(0, (args.rev, lambda path: git_file(args.rev, path)))
+
+    print(f'{"static/":<14} {"rows":>6} {"tti ms":>9} {"heap MB":>8} {"nodes":>8} {"scroll avg ms":>14} {"max ms":>8}')
+    with sync_playwright() as p:
+        browser = p.chromium.launch()
+        try:
+            for name, read in versions:
+                files = {path: read(path) for path in ('static/index.html', 'static/app.js', 'static/style.css')}
+                for rows in args.rows:
+                    r = measure(browser, files, rows)
+                    print(f'{name:<14} {rows:>6} {r["tti"]:>9.0f} {r["heap"]:>8.1f} {r["nodes"]:>8} '
+                          f'{r["scroll_avg"]:>14.1f} {r["scroll_max"]:>8.1f}')
+        finally:
+            browser.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,426 @@
+"""
+Local stand-in for Deezer's gw-light.php, for benchmarks and load tests.
+Answers deezer.getUserData, search.music and the playlist methods (create, addSongs,
+deleteSongs, getSongs, with playlists kept in memory), and counts requests per method
+and TCP connections. GET /search answers like the public API's search (counted and timed
+as the method "api.search"; point DEEZER_API_URL at .api_url).
+
+Latency is a fixed number of seconds or a distribution, globally or per method:
+    0.05                  fixed
+    uniform:0.02:0.2      uniform between the two
+    lognormal:0.05:0.6    median 50 ms, sigma 0.6 (long right tail, like the real thing)
+
+Faults can be injected at random (--errors 500=0.01,429=0.02,quota=0.01,stale=0.005) or by
+load (--max-rps 40: anything above 40 calls in the same second gets a 429). deezer.getUserData
+is never faulted, so clients can always log in.
+
+Record/replay: with --upstream (the real gw-light URL) and --record FILE, calls are forwarded
+under the ARL in DEEZER_ARL (or --arl) and each response is appended to FILE as JSON lines
+(user data is scrubbed down to a user ID). --replay FILE answers matching calls (same
+method and params) from a recording, cycling through repeats, and falls back to the
+synthetic answers.
+
+Run standalone:  python benchmarks/fake_gw.py --port 8765 --latency lognormal:0.05:0.6
+Then point the clients at it:  DEEZER_GW_URL=http://127.0.0.1:8765/ajax/gw-light.php
+"""
+import argparse
+import json
+import math
+import os
+import random
+import re
+import sys
+import threading
+import time
+import zlib
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+STRICT_RE = re.compile(r'artist:"(.*)" track:"(.*)"')
+REAL_GW_URL = 'https://www.deezer.com/ajax/gw-light.php'
+
+
+def fake_track(artist, title, rank=0):
+    tid = zlib.crc32(f'{artist}|{title}|{rank}'.encode('utf-8')) or 1
+    return {
+        'SNG_ID': str(tid),
+        'SNG_TITLE': title,
+        'ART_NAME': artist or 'Unknown Artist',
+        'ALB_TITLE': f'{title} (Single)',
+    }
+
+
+def search_results(query, nb):
+    """Deterministic fake search. Queries containing 'missing' find nothing."""
+    if 'missing' in query.lower():
+        return {'data': [], 'total': 0}
+    match = STRICT_RE.match(query)
+    if match:
+        artist, title = match.groups()
+    else:
+        words = query.split()
+        artist, title = ' '.join(words[:1]), ' '.join(words[1:]) or query
+    data = [fake_track(artist, title, rank) for rank in range(max(1, int(nb)))]
+    return {'data': data, 'total': len(data)}
+
+
+class Latency:
+    """A latency distribution, from a number or a 'kind:a:b' spec (see the module docstring)."""
+
+    def __init__(self, spec=0.0):
+        if isinstance(spec, Latency):
+            spec = spec.spec
+        self.spec = str(spec)
+        kind, *args = self.spec.split(':') if ':' in self.spec else ('fixed', self.spec)
+        self.kind = kind
+        self.args = [float(a) for a in args]
+        if kind not in ('fixed', 'uniform', 'lognormal') or len(self.args) != (1 if kind == 'fixed' else 2):
+            raise ValueError(f'bad latency spec {spec!r}')
+
+    def sample(self, rng):
+        if self.kind == 'fixed':
+            return self.args[0]
+        if self.kind == 'uniform':
+            return rng.uniform(*self.args)
+        median, sigma = self.args
+        return rng.lognormvariate(math.log(median), sigma) if median > 0 else 0.0
+
+    @property
+    def median(self):
+        """For reports: the typical value in seconds."""
+        if self.kind == 'uniform':
+            return sum(self.args) / 2
+        return self.args[0]
+
+
+def parse_errors(spec):
+    """'500=0.01,429=0.02,quota=0.01,stale=0.005' -> {'500': 0.01, ...}"""
+    rates = {}
+    for part in filter(None, (spec or '').split(',')):
+        kind, _, rate = part.partition('=')
+        if kind not in FAULTS:
+            raise ValueError(f'unknown fault {kind!r} (one of {", ".join(FAULTS)})')
+        rates[kind] = float(rate)
+    return rates
+
+
+# Injected faults: (HTTP status, gw-light error payload or None, extra headers)
+FAULTS = {
+    '500': (500, None, {}),
+    '503': (503, None, {}),
+    '429': (429, None, {'Retry-After': '1'}),
+    'quota': (200, {'QUOTA_ERROR': 'Quota limit exceeded'}, {}),
+    'stale': (200, {'VALID_TOKEN_REQUIRED': 'Invalid CSRF token'}, {}),
+}
+
+
+def params_key(method, params):
+    return f'{method}|{json.dumps(params, sort_keys=True)}'
+
+
+def scrub(method, payload):
+    """Keep the shape of a recorded response, not the account behind it."""
+    if method == 'deezer.getUserData' and isinstance(payload.get('results'), dict):
+        user_id = (payload['results'].get('USER') or {}).get('USER_ID', 4242)
+        payload = dict(payload, results={'checkForm': 'fake-token', 'USER': {'USER_ID': user_id}})
+    return payload
+
+
+class FakeGW(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 256  # the default backlog of 5 drops bursts of new connections
+
+    def __init__(self, address, latency=0.0, method_latency=None, errors=None, max_rps=None,
+                 seed=0, replay=None, record=None, upstream=None, arl=None):
+        super().__init__(address, FakeGWHandler)
+        self.latency = Latency(latency)
+        self.method_latency = {m: Latency(spec) for m, spec in (method_latency or {}).items()}
+        self.errors = dict(errors or {})
+        self.max_rps = max_rps
+        self.rng = random.Random(seed)
+        self.calls = Counter()
+        self.faults = Counter()  # injected fault kind -> count
+        self.connections = 0
+        self.lock = threading.Lock()
+        self.next_playlist_id = 1000
+        self.playlists = {}  # playlist_id -> [track ids]
+        self._second = (0, 0)  # (current second, calls in it) for max_rps
+
+        self.upstream = upstream
+        self.arl = arl
+        self._upstream_session = None
+        self.record_file = open(record, 'a', encoding='utf-8') if record else None
+        self.recorded = {}  # params_key -> [payloads]
+        self.replay_hits = Counter()
+        self.replayed = 0
+        if replay:
+            self.load_recording(replay)
+
+    def handle_error(self, request, client_address):
+        if isinstance(sys.exc_info()[1], ConnectionError):
+            return  # a client closed the connection under us (cancelled request): not an error
+        super().handle_error(request, client_address)
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f'http://{host}:{port}/ajax/gw-light.php'
+
+    @property
+    def api_url(self):
+        host, port = self.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def load_recording(self, path):
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    self.recorded.setdefault(params_key(entry['method'], entry['params']), []).append(entry['response'])
+
+    def delay(self, method):
+        latency = self.method_latency.get(method, self.latency)
+        with self.lock:
+            return latency.sample(self.rng)
+
+    def fault(self, method):
+        """Name of the fault to inject for this call, or None."""
+        if method == 'deezer.getUserData':
+            return None
+        with self.lock:
+            if self.max_rps:
+                now = int(time.monotonic())
+                second, count = self._second
+                count = count + 1 if second == now else 1
+                self._second = (now, count)
+                if count > self.max_rps:
+                    self.faults['429'] += 1
+                    return '429'
+            for kind, rate in self.errors.items():
+                if self.rng.random() < rate:
+                    self.faults[kind] += 1
+                    return kind
+        return None
+
+    def replay(self, method, params):
+        key = params_key(method, params)
+        responses = self.recorded.get(key)
+        if not responses:
+            return None
+        with self.lock:
+            n = self.replay_hits[key]
+            self.replay_hits[key] += 1
+            self.replayed += 1
+        return responses[n % len(responses)]
+
+    def upstream_session(self):
+        # Logged in as the ARL's account, keeping Deezer's session cookies between calls
+        with self.lock:
+            if self._upstream_session is None:
+                import requests  # only needed when recording
+                sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+                from deezer_gw import BROWSER_HEADERS
+
+                session = requests.Session()
+                session.headers.update(BROWSER_HEADERS)
+                if self.arl:
+                    session.cookies.set('arl', self.arl, domain='.deezer.com')
+                self._upstream_session = session
+            return self._upstream_session
+
+    def record(self, method, params, payload):
+        line = json.dumps({'method': method, 'params': params, 'response': scrub(method, payload)})
+        with self.lock:
+            self.record_file.write(line + '\n')
+            self.record_file.flush()
+
+    def handle_method(self, method, params):
+        if method == 'deezer.getUserData':
+            return {'checkForm': 'fake-token', 'USER': {'USER_ID': 4242}}
+        if method == 'search.music':
+            return search_results(params.get('query', ''), params.get('nb', 1))
+        if method == 'playlist.create':
+            with self.lock:
+                self.next_playlist_id += 1
+                self.playlists[self.next_playlist_id] = [int(s[0]) for s in params.get('songs') or []]
+                return self.next_playlist_id
+        if method == 'playlist.addSongs':
+            with self.lock:
+                tracks = self.playlists.setdefault(int(params['playlist_id']), [])
+                ids = [int(s[0]) for s in params.get('songs') or [] if int(s[0]) not in tracks]
+                offset = int(params.get('offset', -1))
+                if offset < 0:
+                    offset = len(tracks)
+                tracks[offset:offset] = ids
+            return True
+        if method == 'playlist.deleteSongs':
+            with self.lock:
+                tracks = self.playlists.setdefault(int(params['playlist_id']), [])
+                gone = {int(s[0]) for s in params.get('songs') or []}
+                tracks[:] = [tid for tid in tracks if tid not in gone]
+            return True
+        if method == 'playlist.getSongs':
+            with self.lock:
+                tracks = self.playlists.get(int(params['playlist_id']), [])
+                start = int(params.get('start', 0))
+                page = tracks[start:start + int(params.get('nb', 1000))]
+                return {'data': [{'SNG_ID': str(tid)} for tid in page], 'count': len(page), 'total': len(tracks)}
+        raise KeyError(method)
+
+    def stats(self):
+        return {
+            'calls': dict(self.calls),
+            'faults': dict(self.faults),
+            'connections': self.connections,
+            'replayed': self.replayed,
+        }
+
+
+class FakeGWHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # keep-alive, like the real endpoint
+    disable_nagle_algorithm = True  # headers and body go out as separate writes
+
+    def setup(self):
+        super().setup()
+        with self.server.lock:
+            self.server.connections += 1
+
+    def do_POST(self):
+        server = self.server
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length) if length else b''
+        query = parse_qs(urlparse(self.path).query)
+        method = query.get('method', [''])[0]
+        try:
+            params = json.loads(body or b'{}')
+        except ValueError:
+            params = {}
+
+        with server.lock:
+            server.calls[method] += 1
+
+        if server.upstream:
+            return self.forward(method, params, body)
+
+        latency = server.delay(method)
+        if latency:
+            time.sleep(latency)
+
+        fault = server.fault(method)
+        if fault:
+            status, error, headers = FAULTS[fault]
+            return self.reply(status, {'error': error or {}, 'results': {}}, headers)
+
+        payload = server.replay(method, params)
+        if payload is None:
+            try:
+                payload = {'error': [], 'results': server.handle_method(method, params)}
+            except KeyError:
+                payload = {'error': {'GATEWAY_ERROR': f'unknown method {method}'}, 'results': {}}
+        self.reply(200, payload)
+
+    def do_GET(self):
+        """Public API search (api.deezer.com/search): same fake catalog, public field names."""
+        server = self.server
+        url = urlparse(self.path)
+        if url.path != '/search':
+            return self.reply(404, {'error': {'type': 'DataException', 'message': 'no data', 'code': 800}})
+        query = parse_qs(url.query)
+        with server.lock:
+            server.calls['api.search'] += 1
+        latency = server.delay('api.search')
+        if latency:
+            time.sleep(latency)
+        fault = server.fault('api.search')
+        if fault in ('429', 'quota'):
+            # The public API reports its quota in the body, with a 200
+            return self.reply(200, {'error': {'type': 'Exception', 'message': 'Quota limit exceeded', 'code': 4}})
+        if fault in ('500', '503'):
+            return self.reply(FAULTS[fault][0], {})
+        # (no CSRF token here, so 'stale' doesn't apply)
+        results = search_results(query.get('q', [''])[0], query.get('limit', ['25'])[0])
+        data = [{'id': int(item['SNG_ID']), 'title': item['SNG_TITLE'], 'artist': {'name': item['ART_NAME']},
+                 'album': {'title': item['ALB_TITLE']}, 'type': 'track'} for item in results['data']]
+        self.reply(200, {'data': data, 'total': results['total']})
+
+    def forward(self, method, params, body):
+        """Record mode: pass the call on to the real gw-light and keep its answer."""
+        response = self.server.upstream_session().post(
+            f'{self.server.upstream}?{urlparse(self.path).query}', data=body,
+            headers={'Content-Type': 'application/json'}, timeout=30)
+        try:
+            payload = response.json()
+        except ValueError:
+            return self.reply(response.status_code, {'error': {'UPSTREAM': response.text[:200]}, 'results': {}})
+        if response.status_code == 200:
+            self.server.record(method, params, payload)
+        self.reply(response.status_code, payload)
+
+    def reply(self, status, payload, headers=None):
+        data = json.dumps(payload).encode('utf-8')
+        try:
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(data)
+        except (BrokenPipeError, ConnectionResetError):
+            # The client gave up on this request (an aborted stream)
+            self.close_connection = True
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_fake_gw(latency=0.0, host='127.0.0.1', port=0, **options):
+    """Start a FakeGW in a background thread. Returns the server (see .url, .calls, .stats())."""
+    server = FakeGW((host, port), latency=latency, **options)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def add_arguments(ap):
+    """Fake gw-light options, shared with the load test."""
+    ap.add_argument('--latency', default='0.05', help='seconds per call, or a distribution spec')
+    ap.add_argument('--method-latency', action='append', default=[], metavar='METHOD=SPEC',
+                    help='latency for one method, e.g. search.music=lognormal:0.08:0.5')
+    ap.add_argument('--errors', default='', help='fault rates, e.g. 500=0.01,429=0.02,quota=0.01,stale=0.005')
+    ap.add_argument('--max-rps', type=int, default=None, help='answer 429 above this many calls per second')
+    ap.add_argument('--replay', default=None, help='answer from a recording (JSON lines)')
+    ap.add_argument('--seed', type=int, default=0)
+
+
+def options_from(args):
+    return {
+        'method_latency': dict(spec.split('=', 1) for spec in args.method_latency),
+        'errors': parse_errors(args.errors),
+        'max_rps': args.max_rps,
+        'replay': args.replay,
+        'seed': args.seed,
+    }
+
+
+if __name__ == '__main__':
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument('--host', default='127.0.0.1')
+    ap.add_argument('--port', type=int, default=8765)
+    add_arguments(ap)
+    ap.add_argument('--record', default=None, help='append responses from --upstream to this file')
+    ap.add_argument('--upstream', default=None, nargs='?', const=REAL_GW_URL,
+                    help=f'forward calls here instead of answering them (default {REAL_GW_URL})')
+    ap.add_argument('--arl', default=os.getenv('DEEZER_ARL'), help='account to record with (default $DEEZER_ARL)')
+    args = ap.parse_args()
+    if args.record and not args.upstream:
+        ap.error('--record needs --upstream')
+    server = FakeGW((args.host, args.port), latency=args.latency, record=args.record,
+                    upstream=args.upstream, arl=args.arl, **options_from(args))
+    mode = f'forwarding to {args.upstream}' if args.upstream else f'latency {server.latency.spec}'
+    print(f'Fake gw-light listening on {server.url} ({mode})')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    print(json.dumps(server.stats()))
@@ -0,0 +1,251 @@
+"""
+End-to-end load test: the real server (uvicorn, in-process) in front of the fake gw-light.
+
+Drives /api/prepare, /api/search_candidates and /api/create (queued, then polled until the
+job is done) with a closed loop of N virtual users per level, for --duration seconds each,
+at rising concurrency. Reports throughput, p50/p95/p99 latency, errors and gw-light calls
+per request, and can save the results or compare them to a saved baseline:
+
+    python benchmarks/load_test.py --out benchmarks/baselines/load_test.json
+    python benchmarks/load_test.py --compare benchmarks/baselines/load_test.json
+
+A comparison fails (exit 1) when a scenario makes more gw-light calls per request than
+the baseline, or its p95 latency / throughput get worse by more than --tolerance. Latency
+depends on the machine; call counts don't, so those are the sharpest check.
+
+Every virtual user searches songs nobody searched before, and the search cache, track index
+and job store are memory-only, so each run measures cold lookups. The fake gw-light options
+(--latency, --errors, --max-rps, --replay, ...) are the same as fake_gw.py's.
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import platform
+import socket
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fake_gw import start_fake_gw, add_arguments, options_from
+
+SCENARIOS = ('prepare', 'search_candidates', 'create')
+
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def start_server(port):
+    """server:app under uvicorn in a background thread. Returns the uvicorn.Server."""
+    import uvicorn
+
+    config = uvicorn.Config('server:app', host='127.0.0.1', port=port, log_level='warning', lifespan='on')
+    server = uvicorn.Server(config)
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return server
+
+
+class Workload:
+    """Unique request bodies for each scenario, so nothing is answered from a cache."""
+
+    def __init__(self, args):
+        self.args = args
+        self.counter = itertools.count()
+
+    def arl(self, user):
+        return f'load-arl-{user % self.args.arls}'
+
+    def songs(self):
+        songs = []
+        for _ in range(self.args.songs):
+            i = next(self.counter)
+            kind = i % 10
+            if kind < 6:
+                songs.append({'artist': f'Artist{i}', 'title': f'Song number {i}'})
+            elif kind < 8:
+                songs.append({'artist': '8', 'title': f'Short artist {i}'})
+            elif kind < 9:
+                songs.append({'artist': '', 'title': f'Untitled intro {i}'})
+            else:
+                songs.append({'artist': f'Artist{i}', 'title': f'missing track {i}'})
+        return songs
+
+    async def prepare(self, http, user):
+        r = await http.post('/api/prepare', json={'arl': self.arl(user), 'songs': self.songs()})
+        return r.status_code == 200 and 'results' in r.json()
+
+    async def search_candidates(self, http, user):
+        query = f'Artist{next(self.counter)} Refined title'
+        r = await http.post('/api/search_candidates', json={'arl': self.arl(user), 'query': query})
+        return r.status_code == 200 and 'candidates' in r.json()
+
+    async def create(self, http, user):
+        start = next(self.counter) * self.args.create_tracks
+        track_ids = list(range(start + 1, start + self.args.create_tracks + 1))
+        r = await http.post('/api/create', json={
+            'arl': self.arl(user), 'playlist_name': f'Load {start}', 'track_ids': track_ids})
+        data = r.json()
+        if data.get('status') != 'queued':
+            return False
+        while True:
+            await asyncio.sleep(self.args.poll)
+            job = (await http.get(f"/api/jobs/{data['job_id']}")).json()
+            if job['status'] in ('done', 'failed'):
+                return job['status'] == 'done' and job['added'] == len(track_ids)
+
+
+async def run_level(http, workload, scenario, users, duration):
+    latencies = []
+    errors = 0
+    call = getattr(workload, scenario)
+    deadline = time.perf_counter() + duration
+
+    async def user(n):
+        nonlocal errors
+        while time.perf_counter() < deadline:
+            t0 = time.perf_counter()
+            try:
+                ok = await call(http, n)
+            except Exception:
+                ok = False
+            latencies.append(time.perf_counter() - t0)
+            errors += not ok
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(user(n) for n in range(users)))
+    return latencies, errors, time.perf_counter() - t0
+
+
+async def run(args, gw, port):
+    import httpx
+
+    workload = Workload(args)
+    results = []
+    limits = httpx.Limits(max_connections=max(args.concurrency) * 2)
+    async with httpx.AsyncClient(base_url=f'http://127.0.0.1:{port}', timeout=300, limits=limits) as http:
+        # Log the ARLs in first, so the first level doesn't measure logins
+        for user in range(args.arls):
+            await http.post('/api/auth/check', json={'arl': workload.arl(user)})
+
+        print(f"{'scenario':<18} {'users':>5} {'requests':>8} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} "
+              f"{'p99 ms':>8} {'errors':>6} {'gw calls/req':>12}")
+        for scenario in args.scenarios:
+            for users in args.concurrency:
+                gw.calls.clear()
+                latencies, errors, wall = await run_level(http, workload, scenario, users, args.duration)
+                latencies.sort()
+                calls = dict(gw.calls)
+                row = {
+                    'scenario': scenario,
+                    'users': users,
+                    'requests': len(latencies),
+                    'throughput': round(len(latencies) / wall, 2),
+                    'p50_ms': round(percentile(latencies, 0.50) * 1000, 1),
+                    'p95_ms': round(percentile(latencies, 0.95) * 1000, 1),
+                    'p99_ms': round(percentile(latencies, 0.99) * 1000, 1),
+                    'errors': errors,
+                    'gw_calls_per_request': round(sum(calls.values()) / max(1, len(latencies)), 2),
+                    'gw_calls': calls,
+                }
+                results.append(row)
+                print(f"{scenario:<18} {users:>5} {row['requests']:>8} {row['throughput']:>8.1f} "
+                      f"{row['p50_ms']:>8.1f} {row['p95_ms']:>8.1f} {row['p99_ms']:>8.1f} "
+                      f"{errors:>6} {row['gw_calls_per_request']:>12.2f}")
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """Regression messages: more gw-light calls, or p95 / throughput worse than tolerance."""
+    previous = {(r['scenario'], r['users']): r for r in baseline['results']}
+    problems = []
+    for row in results:
+        old = previous.get((row['scenario'], row['users']))
+        if old is None:
+            continue
+        name = f"{row['scenario']} x{row['users']}"
+        if row['gw_calls_per_request'] > old['gw_calls_per_request'] * 1.05 + 0.01:
+            problems.append(f"{name}: gw calls/request {old['gw_calls_per_request']} -> {row['gw_calls_per_request']}")
+        if row['p95_ms'] > old['p95_ms'] * (1 + tolerance):
+            problems.append(f"{name}: p95 {old['p95_ms']} ms -> {row['p95_ms']} ms")
+        if row['throughput'] < old['throughput'] * (1 - tolerance):
+            problems.append(f"{name}: throughput {old['throughput']} -> {row['throughput']} req/s")
+        if row['errors'] > old['errors']:
+            problems.append(f"{name}: errors {old['errors']} -> {row['errors']}")
+    return problems
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument('--scenarios', nargs='+', choices=SCENARIOS, default=list(SCENARIOS))
+    ap.add_argument('--concurrency', type=int, nargs='+', default=[1, 4, 16, 64], help='virtual users per level')
+    ap.add_argument('--duration', type=float, default=3.0, help='seconds per level')
+    ap.add_argument('--songs', type=int, default=20, help='songs per /api/prepare request')
+    ap.add_argument('--create-tracks', type=int, default=200, help='tracks per /api/create request')
+    ap.add_argument('--arls', type=int, default=8, help='distinct accounts the virtual users share')
+    ap.add_argument('--poll', type=float, default=0.02, help='seconds between job status polls')
+    ap.add_argument('--prod-limits', action='store_true',
+                    help="keep the production gw-light rate limits (otherwise they're lifted)")
+    ap.add_argument('--out', help='save results as JSON (e.g. a new baseline)')
+    ap.add_argument('--compare', help='baseline JSON to check for regressions')
+    ap.add_argument('--tolerance', type=float, default=0.5, help='allowed p95/throughput change vs baseline')
+    add_arguments(ap)
+    args = ap.parse_args()
+
+    # Before the server is imported: config and deezer_gw read these at import time
+    gw = start_fake_gw(args.latency, **options_from(args))
+    os.environ['DEEZER_GW_URL'] = gw.url
+    os.environ.update({'SEARCH_CACHE_DB': '', 'TRACK_INDEX_PATH': '', 'JOBS_DB': ''})
+    os.environ.setdefault('LOG_LEVEL', 'WARNING')
+    if not args.prod_limits:
+        for name in ('GW_RATE', 'GW_BURST', 'GW_ARL_RATE', 'GW_ARL_BURST'):
+            os.environ.setdefault(name, '100000')
+    os.chdir(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # server serves ./static
+
+    port = free_port()
+    server = start_server(port)
+    print(f'fake gw-light latency {gw.latency.spec}, faults {args.errors or "none"}, '
+          f'{args.duration:.0f}s per level')
+    try:
+        results = asyncio.run(run(args, gw, port))
+    finally:
+        server.should_exit = True
+        gw.shutdown()
+
+    if gw.faults:
+        print(f'injected faults: {dict(gw.faults)}')
+    report = {
+        'settings': {k: v for k, v in vars(args).items() if k not in ('out', 'compare')},
+        'machine': {'python': platform.python_version(), 'cpus': os.cpu_count(), 'platform': platform.platform()},
+        'results': results,
+    }
+    if args.out:
+        with open(args.out, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+            f.write('\n')
+        print(f'saved {args.out}')
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            problems = compare(results, json.load(f), args.tolerance)
+        for problem in problems:
+            print(f'REGRESSION {problem}')
+        if problems:
+            sys.exit(1)
+        print(f'no regressions against {args.compare}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,198 @@
+"""
+Bulk import: many named tracklists in one submission (POST /api/bulk, main.py --bulk).
+
+Every list is parsed, the distinct songs across all of them are resolved in one pass
+(through the coordinator, so a song on ten lists is searched once and the searches of
+different lists overlap), then one playlist job per list is queued on the job queue
+(jobs.py). The report has per-list counts, the songs that need a look, and the job IDs;
+finish_report() waits for the jobs and adds their outcome.
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+import config
+import metrics
+from coordinator import coordinator, song_key
+from parser import parse_description
+from tracing import tracer
+
+# Same histogram the server's other stages use (registration is by name)
+STAGE_SECONDS = metrics.histogram(
+    'stage_seconds', 'Time spent per pipeline stage (parse, resolve, create, upload, sync)', ('stage',))
+
+
+def parse_lists(lists):
+    """[{'name', 'text'}] -> [{'name', 'songs': [{'artist', 'title'}, ...]}], in order."""
+    return [{'name': item['name'], 'songs': [{'artist': a, 'title': t} for a, t in parse_description(item['text'])]}
+            for item in lists]
+
+
+def playlist_ids(rows, include_ambiguous=False):
+    """Track IDs for a playlist: found rows, plus the preselected candidate of ambiguous ones if asked."""
+    ids = []
+    for row in rows:
+        if row['status'] == 'found':
+            ids.append(row['id'])
+        elif include_ambiguous and row['status'] == 'ambiguous':
+            ids.append(row['selected_id'])
+    return ids
+
+
+async def bulk_import(client, arl, lists, queue, include_ambiguous=False, concurrency=None):
+    """
+    Parse `lists` ([{'name', 'text'}]), resolve their union of songs once and queue one
+    playlist per list on `queue` (a JobQueue). Lists with no tracks get no playlist.
+    Returns the report: {'lists': [...], 'totals': {...}}.
+    """
+    start = time.perf_counter()
+    with STAGE_SECONDS.time(stage='parse'), tracer.span('parse', lists=len(lists)):
+        parsed = parse_lists(lists)
+    parse_seconds = time.perf_counter() - start
+
+    songs = [song for item in parsed for song in item['songs']]
+    with STAGE_SECONDS.time(stage='resolve'), tracer.span('resolve', songs=len(songs)):
+        rows = await coordinator.resolve(client, songs, concurrency)
+    resolve_seconds = time.perf_counter() - start - parse_seconds
+
+    report = []
+    totals = {'lists': len(parsed), 'songs': len(songs), 'unique_songs': len({
+        song_key(song['artist'], song['title']) for song in songs}), 'found': 0, 'ambiguous': 0, 'missing': 0,
+        'tracks_queued': 0, 'playlists_queued': 0}
+    offset = 0
+    for item in parsed:
+        list_rows = rows[offset:offset + len(item['songs'])]
+        offset += len(item['songs'])
+        counts = {'found': 0, 'ambiguous': 0, 'missing': 0}
+        for row in list_rows:
+            counts[row['status']] += 1
+            totals[row['status']] += 1
+        track_ids = playlist_ids(list_rows, include_ambiguous)
+        job_id = queue.submit(arl, item['name'], track_ids) if track_ids else None
+        if job_id:
+            totals['tracks_queued'] += len(track_ids)
+            totals['playlists_queued'] += 1
+        report.append({
+            'name': item['name'],
+            'songs': len(list_rows),
+            **counts,
+            'tracks': len(track_ids),
+            'job_id': job_id,
+            'status': 'queued' if job_id else 'skipped',
+            # What a person should look at: everything that wasn't matched outright
+            'unmatched': [{'n': n, 'artist': row['artist'], 'title': row['title'], 'status': row['status'],
+                           'selected_id': row.get('selected_id')}
+                          for n, row in enumerate(list_rows) if row['status'] != 'found'],
+        })
+    totals['parse_seconds'] = round(parse_seconds, 3)
+    totals['resolve_seconds'] = round(resolve_seconds, 3)
+    return {'lists': report, 'totals': totals}
+
+
+async def finish_report(report, queue):
+    """Wait for the report's playlist jobs and fill in playlist_id, added, failed_ids and status."""
+    start = time.perf_counter()
+    await queue.wait([item['job_id'] for item in report['lists'] if item['job_id']])
+    totals = report['totals']
+    totals['tracks_added'] = 0
+    totals['playlists_created'] = 0
+    for item in report['lists']:
+        if not item['job_id']:
+            continue
+        job = queue.store.view(item['job_id'])
+        item.update(status=job['status'], playlist_id=job['playlist_id'], added=job['added'],
+                    failed_ids=job['failed_ids'], message=job['message'])
+        totals['tracks_added'] += job['added']
+        totals['playlists_created'] += job['status'] == 'done'
+    totals['create_seconds'] = round(time.perf_counter() - start, 3)
+    return report
+
+
+def read_lists(paths):
+    """One tracklist per input file, named after the file (without extension)."""
+    from batch import iter_sources
+
+    lists = []
+    for path in iter_sources(paths):
+        try:
+            with open(path, 'r', encoding='utf-8', errors='replace') as f:
+                text = f.read()
+        except OSError as e:
+            print(f"Skipping {path}: {e}", file=sys.stderr)
+            continue
+        lists.append({'name': os.path.splitext(os.path.basename(path))[0], 'text': text})
+    return lists
+
+
+async def amain(args):
+    from jobs import JobQueue, JobStore
+    from session_pool import pool
+
+    if not config.ARL:
+        print("Error: bulk mode needs DEEZER_ARL in .env", file=sys.stderr)
+        return 1
+    lists = read_lists(args.paths)
+    if not lists:
+        print("No tracklists found.", file=sys.stderr)
+        return 1
+
+    start = time.perf_counter()
+    queue = JobQueue(JobStore(path=''), workers=args.workers)
+    try:
+        async with pool.use(config.ARL) as client:
+            report = await bulk_import(client, config.ARL, lists, queue, args.ambiguous, args.concurrency)
+        totals = report['totals']
+        print(f"{totals['lists']} lists, {totals['songs']} songs ({totals['unique_songs']} distinct): "
+              f"{totals['found']} found, {totals['ambiguous']} ambiguous, {totals['missing']} missing "
+              f"in {totals['resolve_seconds']:.1f}s", file=sys.stderr)
+        await finish_report(report, queue)
+    finally:
+        await queue.aclose()
+        await pool.aclose()
+    totals['seconds'] = round(time.perf_counter() - start, 3)
+
+    for item in report['lists']:
+        if item['job_id']:
+            print(f"{item['name']}: {item['message']}", file=sys.stderr)
+        else:
+            print(f"{item['name']}: no tracks found, playlist skipped", file=sys.stderr)
+    print(f"{totals['playlists_created']} playlists, {totals['tracks_added']} tracks added in "
+          f"{totals['seconds']:.1f}s", file=sys.stderr)
+
+    output = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output == '-':
+        print(output)
+    else:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output + '\n')
+    failed = [item for item in report['lists'] if item['status'] == 'failed']
+    return 1 if failed else 0
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(
+        prog='main.py --bulk',
+        description="Create one playlist per tracklist file (named after the file), resolving "
+                    "the songs of all lists together. Writes a JSON report.")
+    ap.add_argument('paths', nargs='+', help="tracklist files or directories of them")
+    ap.add_argument('-o', '--output', default='-', help="JSON report file; '-' = stdout")
+    ap.add_argument('--ambiguous', action='store_true',
+                    help="also add the best candidate of ambiguous songs (default: found songs only)")
+    ap.add_argument('-c', '--concurrency', type=int, default=None,
+                    help=f"songs searched at once (default RESOLVE_CONCURRENCY={config.RESOLVE_CONCURRENCY})")
+    ap.add_argument('-w', '--workers', type=int, default=None,
+                    help=f"playlists built at once (default JOB_WORKERS={config.JOB_WORKERS})")
+    args = ap.parse_args(argv)
+    config.setup_logging()
+    try:
+        return asyncio.run(amain(args))
+    except KeyboardInterrupt:
+        print("Interrupted.", file=sys.stderr)
+        return 130
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,4 +1,6 @@
+import logging
 import os
+import tempfile
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -13,3 +15,101 @@ ACCESS_TOKEN = os.getenv('DEEZER_ACCESS_TOKEN')
 APP_ID = os.getenv('DEEZER_APP_ID')
 APP_SECRET = os.getenv('DEEZER_APP_SECRET')
 REDIRECT_URI = os.getenv('DEEZER_REDIRECT_URI', 'http://localhost:8080/callback')
+
+# Logging: DEBUG shows every gw-light call and payload; the default keeps the hot path quiet
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO').upper()
+
+
+def setup_logging(format='%(message)s'):
+    """Configure the root logger for an entry point (server, CLI). Libraries only log."""
+    logging.basicConfig(level=LOG_LEVEL, format=format)
+    if LOG_LEVEL != 'DEBUG':
+        # httpx logs every request at INFO
+        logging.getLogger('httpx').setLevel(logging.WARNING)
+
+# Server: pool of logged-in gw-light sessions (see session_pool.py)
+SESSION_POOL_SIZE = int(os.getenv('SESSION_POOL_SIZE', '128'))
+SESSION_TOKEN_TTL = int(os.getenv('SESSION_TOKEN_TTL', '3600'))  # seconds before checkForm is refreshed
+
+# Server: parallel track resolution in /api/prepare (see resolver.py)
+RESOLVE_CONCURRENCY = int(os.getenv('RESOLVE_CONCURRENCY', '8'))  # workers per prepare request
+RESOLVE_PER_ARL_LIMIT = int(os.getenv('RESOLVE_PER_ARL_LIMIT', '8'))  # in-flight songs per ARL, across requests
+
+# Local candidate ranking (see matching.py)
+MATCH_CANDIDATES = int(os.getenv('MATCH_CANDIDATES', '10'))  # top-N fetched per search and scored locally
+MATCH_FOUND_SCORE = float(os.getenv('MATCH_FOUND_SCORE', '0.8'))  # confidence to auto-pick a track
+MATCH_MIN_SCORE = float(os.getenv('MATCH_MIN_SCORE', '0.35'))  # below this a candidate isn't offered
+
+# Server: shared async HTTP client to gw-light (see deezer_gw_async.py)
+GW_MAX_CONNECTIONS = int(os.getenv('GW_MAX_CONNECTIONS', '20'))  # per pooled session; HTTP/2 multiplexes over one
+GW_TIMEOUT = float(os.getenv('GW_TIMEOUT', '15'))  # seconds
+
+# search.music result cache (see search_cache.py). Set SEARCH_CACHE_DB to '' for memory-only.
+SEARCH_CACHE_DB = os.getenv('SEARCH_CACHE_DB', os.path.join(tempfile.gettempdir(), 'deezer_search_cache.sqlite3'))
+SEARCH_CACHE_SIZE = int(os.getenv('SEARCH_CACHE_SIZE', '5000'))  # in-memory entries
+SEARCH_CACHE_TTL = int(os.getenv('SEARCH_CACHE_TTL', str(7 * 24 * 3600)))  # seconds
+SEARCH_CACHE_NEGATIVE_TTL = int(os.getenv('SEARCH_CACHE_NEGATIVE_TTL', '3600'))  # seconds, for "no results"
+
+# Offline track index consulted before search.music (see track_index.py). Set TRACK_INDEX_PATH to '' for memory-only.
+TRACK_INDEX_PATH = os.getenv('TRACK_INDEX_PATH', os.path.join(tempfile.gettempdir(), 'deezer_track_index.bin'))
+TRACK_INDEX_MIN_SCORE = float(os.getenv('TRACK_INDEX_MIN_SCORE', '0.9'))  # confidence to answer without Deezer
+TRACK_INDEX_MAX_POSTINGS = int(os.getenv('TRACK_INDEX_MAX_POSTINGS', '20000'))  # skip tokens more common than this
+TRACK_INDEX_COMPACT_EVERY = int(os.getenv('TRACK_INDEX_COMPACT_EVERY', '100000'))  # log size that triggers compaction at startup
+
+# Refine-box type-ahead (see suggest.py)
+SUGGEST_POOL = int(os.getenv('SUGGEST_POOL', '50'))  # results fetched per network lookup, filtered locally as the user types
+SUGGEST_CACHE_SIZE = int(os.getenv('SUGGEST_CACHE_SIZE', '2000'))  # queries kept
+SUGGEST_TTL = int(os.getenv('SUGGEST_TTL', '600'))  # seconds
+
+# Static files from the app itself; off on Vercel, whose CDN serves static/ (see vercel.json)
+SERVE_STATIC = os.getenv('SERVE_STATIC', '0' if os.getenv('VERCEL') else '1') == '1'
+
+# Search backends (see backends.py): 'gw' (gw-light, under the user's ARL) and/or 'api'
+# (the public API, no ARL). Searches go to whichever is fastest and has quota to spare.
+SEARCH_BACKENDS = [name.strip() for name in os.getenv('SEARCH_BACKENDS', 'gw').split(',') if name.strip()]
+DEEZER_API_URL = os.getenv('DEEZER_API_URL', 'https://api.deezer.com')
+API_RATE = float(os.getenv('API_RATE', '10'))  # requests/s; Deezer allows 50 per 5 s per IP
+API_BURST = float(os.getenv('API_BURST', '50'))
+GW_SEARCH_RESERVE = float(os.getenv('GW_SEARCH_RESERVE', '10'))  # gw-light tokens searches leave for playlist writes
+SEARCH_GW_COST = float(os.getenv('SEARCH_GW_COST', '1.5'))  # gw-light searches spend account quota: weigh them up
+SEARCH_PROBE_INTERVAL = float(os.getenv('SEARCH_PROBE_INTERVAL', '2'))  # seconds; an idle backend gets a search to re-measure it
+
+# Request tracing (see tracing.py): share of requests traced, 0 = off. A request sent with
+# an "X-Trace: 1" header is always traced; its trace ID comes back in X-Trace-Id
+TRACE_SAMPLE = float(os.getenv('TRACE_SAMPLE', '0'))
+TRACE_KEEP = int(os.getenv('TRACE_KEEP', '200'))  # recent traces kept for /api/traces
+TRACE_FILE = os.getenv('TRACE_FILE', '')  # append each trace as a JSON line of Zipkin v2 spans
+TRACE_COLLECTOR_URL = os.getenv('TRACE_COLLECTOR_URL', '')  # e.g. http://localhost:9411/api/v2/spans (Zipkin, Jaeger, OTel collector)
+
+# Admin endpoints (/api/traces, /api/admin/profile): disabled unless ADMIN_TOKEN is set; send it as X-Admin-Token
+ADMIN_TOKEN = os.getenv('ADMIN_TOKEN', '')
+PROFILE_MAX_SECONDS = float(os.getenv('PROFILE_MAX_SECONDS', '60'))
+
+PREPARE_HEARTBEAT = float(os.getenv('PREPARE_HEARTBEAT', '10'))  # seconds between keep-alive events on /api/prepare/stream
+
+# gw-light rate limiting, retries and circuit breaker (see rate_limit.py)
+GW_RATE = float(os.getenv('GW_RATE', '50'))  # requests/s for the whole process
+GW_BURST = float(os.getenv('GW_BURST', '100'))
+GW_ARL_RATE = float(os.getenv('GW_ARL_RATE', '20'))  # requests/s per Deezer account
+GW_ARL_BURST = float(os.getenv('GW_ARL_BURST', '50'))
+GW_MIN_RATE = float(os.getenv('GW_MIN_RATE', '0.5'))  # floor when backing off
+GW_MAX_RATE_FACTOR = float(os.getenv('GW_MAX_RATE_FACTOR', '2'))  # ceiling = initial rate x factor
+GW_MAX_RETRIES = int(os.getenv('GW_MAX_RETRIES', '3'))
+GW_BACKOFF_BASE = float(os.getenv('GW_BACKOFF_BASE', '0.5'))  # seconds
+GW_BACKOFF_CAP = float(os.getenv('GW_BACKOFF_CAP', '8'))  # seconds
+GW_BREAKER_THRESHOLD = int(os.getenv('GW_BREAKER_THRESHOLD', '5'))  # consecutive failures
+GW_BREAKER_COOLDOWN = float(os.getenv('GW_BREAKER_COOLDOWN', '30'))  # seconds
+
+# Server: playlist.addSongs upload engine (see uploader.py)
+UPLOAD_CHUNK_SIZE = int(os.getenv('UPLOAD_CHUNK_SIZE', '20'))  # first chunk
+UPLOAD_MAX_CHUNK = int(os.getenv('UPLOAD_MAX_CHUNK', '100'))
+UPLOAD_PARALLELISM = int(os.getenv('UPLOAD_PARALLELISM', '3'))  # only when order doesn't matter
+UPLOAD_RETRY_ROUNDS = int(os.getenv('UPLOAD_RETRY_ROUNDS', '2'))
+SYNC_MERGE_GAP = int(os.getenv('SYNC_MERGE_GAP', '25'))  # playlist sync: rewrite up to this many tracks to save a call
+
+# Server: background playlist creation jobs (see jobs.py). Set JOBS_DB to '' for memory-only.
+# Off on Vercel: work left running after a response is frozen, and /tmp is per instance, so
+# /api/create builds the playlist within the request instead.
+JOB_QUEUE = os.getenv('JOB_QUEUE', '0' if os.getenv('VERCEL') else '1') == '1'
+JOBS_DB = os.getenv('JOBS_DB', os.path.join(tempfile.gettempdir(), 'deezer_jobs.sqlite3'))
+JOB_WORKERS = int(os.getenv('JOB_WORKERS', '2'))  # playlists built at the same time
@@ -0,0 +1,166 @@
+import asyncio
+
+from matching import fold, TOKEN_RE
+from resolver import resolve_song, resolve_songs, iter_resolved
+
+
+def song_key(artist, title):
+    """Canonical (artist, title): case, accents, punctuation and spacing don't matter."""
+    return (' '.join(TOKEN_RE.findall(fold(artist or ''))), ' '.join(TOKEN_RE.findall(fold(title or ''))))
+
+
+def fan_out(row, song):
+    """Copy of a shared result row for one input row; non-found rows echo that row's own text."""
+    row = dict(row)
+    if row['status'] != 'found':
+        row['artist'] = song['artist']
+        row['title'] = song['title']
+    return row
+
+
+class ResolutionCoordinator:
+    """
+    Sits in front of the resolver so each distinct song is searched once:
+    duplicate rows inside a request (reprised tracks, repeated "Intro" lines) are merged,
+    and a song already being resolved for another request is awaited instead of searched
+    again. Results are fanned back out to every row, in input order.
+    Used from the server's event loop only.
+    """
+
+    def __init__(self):
+        self._inflight = {}  # song_key -> Future of the result row
+
+        self.rows = 0
+        self.merged = 0  # duplicate rows inside a request
+        self.coalesced = 0  # songs another request was already resolving
+        self.resolved = 0  # songs actually searched
+
+    def _group(self, songs):
+        """Unique songs (first occurrence wins) and the row indexes each one covers."""
+        unique = []
+        indexes = {}
+        for i, song in enumerate(songs):
+            key = song_key(song['artist'], song['title'])
+            if key not in indexes:
+                indexes[key] = []
+                unique.append((key, song))
+            indexes[key].append(i)
+        self.rows += len(songs)
+        self.merged += len(songs) - len(unique)
+        return unique, indexes
+
+    async def _follow(self, key, pending, retry):
+        self.coalesced += 1
+        try:
+            return await asyncio.shield(pending)
+        except asyncio.CancelledError:
+            if not pending.cancelled():
+                raise
+        # The request that owned it went away, not us: resolve it ourselves
+        return await retry()
+
+    def _lead(self, keys):
+        futures = {}
+        loop = asyncio.get_running_loop()
+        for key in keys:
+            futures[key] = self._inflight[key] = loop.create_future()
+        self.resolved += len(keys)
+        return futures
+
+    def _settle(self, futures, rows=None, error=None):
+        for key, future in futures.items():
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
+            if future.done():
+                continue
+            if rows is not None:
+                future.set_result(rows[key])
+            elif isinstance(error, asyncio.CancelledError):
+                future.cancel()
+            else:
+                future.set_exception(error)
+                future.exception()  # mark retrieved when nobody else was waiting
+
+    async def resolve_one(self, client, artist, title):
+        """resolve_song, but a song already being resolved (by anyone) is awaited, not searched."""
+        key = song_key(artist, title)
+        pending = self._inflight.get(key)
+        if pending is not None:
+            return await self._follow(key, pending, lambda: self.resolve_one(client, artist, title))
+
+        futures = self._lead([key])
+        try:
+            row = await resolve_song(client, artist, title)
+        except BaseException as e:
+            self._settle(futures, error=e)
+            raise
+        self._settle(futures, rows={key: row})
+        return row
+
+    async def resolve(self, client, songs, concurrency=None):
+        """resolve_songs with duplicates merged and in-flight songs shared. Rows in input order."""
+        unique, indexes = self._group(songs)
+        rows = {}
+        followed = {}
+        own = []
+        for key, song in unique:
+            pending = self._inflight.get(key)
+            if pending is not None:
+                followed[key] = self._follow(
+                    key, pending, lambda song=song: self.resolve_one(client, song['artist'], song['title']))
+            else:
+                own.append((key, song))
+
+        futures = self._lead([key for key, _ in own])
+        try:
+            resolved = await resolve_songs(client, [song for _, song in own], concurrency)
+        except BaseException as e:
+            self._settle(futures, error=e)
+            for waiter in followed.values():
+                waiter.close()
+            raise
+        rows.update(zip((key for key, _ in own), resolved))
+        self._settle(futures, rows=rows)
+
+        if followed:
+            rows.update(zip(followed, await asyncio.gather(*followed.values())))
+
+        results = [None] * len(songs)
+        for key, song in unique:
+            for i in indexes[key]:
+                results[i] = fan_out(rows[key], songs[i])
+        return results
+
+    async def iter_resolved(self, client, songs, concurrency=None, heartbeat=None):
+        """
+        resolver.iter_resolved with duplicates merged and in-flight songs shared: yields
+        (index, row) for every input row (duplicates together, in input order), or None
+        on heartbeat. Closing it cancels the searches still outstanding.
+        """
+        unique, indexes = self._group(songs)
+        unique_songs = [song for _, song in unique]
+        rows = iter_resolved(client, unique_songs, concurrency, heartbeat, resolve=self.resolve_one)
+        try:
+            async for item in rows:
+                if item is None:
+                    yield None
+                    continue
+                u, row = item
+                for i in indexes[unique[u][0]]:
+                    yield i, fan_out(row, songs[i])
+        finally:
+            await rows.aclose()
+
+    def stats(self):
+        return {
+            'rows': self.rows,
+            'merged_duplicates': self.merged,
+            'coalesced_in_flight': self.coalesced,
+            'resolved': self.resolved,
+            'in_flight': len(self._inflight),
+            'searches_saved_ratio': round((self.merged + self.coalesced) / self.rows, 4) if self.rows else 0.0,
+        }
+
+
+# Shared by every prepare request
+coordinator = ResolutionCoordinator()
@@ -1,224 +1,485 @@
-import requests
-import json
+import hashlib
+import logging
+import os
+import sys
 import time
+import threading
+
+from rate_limit import gw_limiters, CallGuard
+from matching import Candidate
+import config
+import metrics
+
+log = logging.getLogger(__name__)
+
+# Overridable so benchmarks can point at a local fake gw-light server
+GW_URL = os.getenv('DEEZER_GW_URL', "https://www.deezer.com/ajax/gw-light.php")
+
+# Pretend to be a browser
+BROWSER_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+    'Origin': 'https://www.deezer.com',
+    'Referer': 'https://www.deezer.com/en/',
+    'Accept-Language': 'en-US,en;q=0.9',
+    'X-Requested-With': 'XMLHttpRequest',
+}
+
+# DeezerGWClient's default cache / index: the process-wide ones (None turns them off)
+SHARED = object()
+
+# Error keys gw-light returns when the checkForm (api_token) has expired
+STALE_TOKEN_ERRORS = ('VALID_TOKEN_REQUIRED', 'NEED_API_AUTH_REQUIRED')
+# Error keys that mean "slow down" rather than "bad request"
+RATE_LIMIT_ERRORS = ('QUOTA_ERROR', 'RATE_LIMIT_EXCEEDED', 'TOO_MANY_REQUESTS')
+
+# Shared by both clients (see metrics.py, served at GET /metrics)
+GW_CALL_SECONDS = metrics.histogram(
+    'deezer_gw_call_seconds', 'gw-light HTTP round trip per attempt', ('method',))
+GW_CALLS = metrics.counter(
+    'deezer_gw_calls_total', 'gw-light attempts by outcome (ok, retry, failed, api_error, stale_token)',
+    ('method', 'outcome'))
+SEARCH_SOURCE = metrics.counter(
+    'deezer_search_lookups_total', 'search.music lookups by where the answer came from (index, cache, network)',
+    ('source',))
+SEARCH_TRACK = metrics.counter(
+    'deezer_search_track_total', 'search_track results by strategy (strict, loose, miss)', ('strategy',))
+SEARCH_CANDIDATES = metrics.counter(
+    'deezer_search_candidates_total', 'search_candidates calls with and without results (hit, empty)', ('result',))
+
+
+def observe_call(method, start, outcome):
+    end = time.perf_counter()
+    GW_CALL_SECONDS.observe(end - start, method=method)
+    GW_CALLS.inc(method=method, outcome=outcome)
+    from tracing import tracer
+    tracer.record(f'gw {method}', start, end, outcome=outcome)
+
+
+def arl_key(arl):
+    """Key for per-account state (session pool, rate limits). We never keep the raw cookie as a dict key."""
+    return hashlib.sha256(arl.encode('utf-8')).hexdigest()
+
+
+class DeezerAPIError(Exception):
+    """gw-light answered with an 'error' payload."""
+
+    def __init__(self, method, error):
+        super().__init__(f"API Error in {method}: {error}")
+        self.method = method
+        self.error = error
+
+    @property
+    def is_stale_token(self):
+        return isinstance(self.error, dict) and any(key in self.error for key in STALE_TOKEN_ERRORS)
+
+    @property
+    def is_rate_limited(self):
+        return isinstance(self.error, dict) and any(key in self.error for key in RATE_LIMIT_ERRORS)
+
+
+class RetryableError(Exception):
+    """Transient gw-light failure (429, 5xx, rate-limit payload): worth retrying after a backoff."""
+
+    def __init__(self, message, throttled=False, retry_after=None):
+        super().__init__(message)
+        self.throttled = throttled
+        self.retry_after = retry_after
+
+
+# --- Request/response helpers shared by DeezerGWClient and AsyncDeezerGWClient ---
+
+def gw_query_params(method, api_token):
+    return {
+        'method': method,
+        'api_version': '1.0',
+        'api_token': api_token,
+        'input': '3'
+    }
+
+
+def parse_gw_response(method, res_json):
+    """Return the 'results' of a decoded gw-light response, or raise DeezerAPIError."""
+    if 'error' in res_json and res_json['error']:
+        # Sometimes empty list [] is not an error but "no data"
+        if not (isinstance(res_json['error'], list) and not res_json['error']):
+            raise DeezerAPIError(method, res_json['error'])
+    return res_json.get('results')
+
+
+def check_gw_response(method, response):
+    """
+    Results of a gw-light HTTP response (requests or httpx, they share this interface).
+    Raises RetryableError for throttling/server errors and DeezerAPIError for other API errors.
+    """
+    if response.status_code == 429 or response.status_code >= 500:
+        retry_after = response.headers.get('Retry-After')
+        raise RetryableError(
+            f"HTTP {response.status_code} from {method}",
+            throttled=response.status_code == 429,
+            retry_after=float(retry_after) if retry_after and retry_after.isdigit() else None,
+        )
+
+    try:
+        res_json = response.json()
+    except Exception:
+        log.debug("Failed raw response from %s: %.500s", method, response.text)
+        raise Exception(f"Failed to parse JSON response from {method}")
+
+    try:
+        return parse_gw_response(method, res_json)
+    except DeezerAPIError as e:
+        if e.is_rate_limited:
+            raise RetryableError(str(e), throttled=True)
+        raise
+
+
+def parse_user_data(data):
+    """Validate deezer.getUserData results. Returns (api_token, user_id)."""
+    if not data:
+        raise Exception("Failed to get user data. Is the ARL cookie valid?")
+
+    api_token = data.get('checkForm')
+    user_id = data.get('USER', {}).get('USER_ID')
+
+    if not api_token:
+        raise Exception("Could not find api_token (checkForm) in response.")
+
+    log.info("Successfully connected as User ID: %s", user_id)
+
+    if str(user_id) == '0':
+        log.warning(
+            "You are connected as Guest (User ID 0). This means your ARL cookie is invalid, "
+            "expired, or not recognized. Playlist creation WILL fail. Please double-check your "
+            "'DEEZER_ARL' in .env. Make sure you copied the full 192-character string without extra spaces."
+        )
+        # We raise error here to stop early
+        raise Exception("Invalid ARL Cookie (Guest Session)")
+
+    return api_token, user_id
+
+
+def search_params(query, nb):
+    return {
+        'query': query,
+        'filter': 'ALL',
+        'output': 'TRACK',
+        'start': 0,
+        'nb': nb
+    }
+
+
+def strict_query(artist, title):
+    return f'artist:"{artist}" track:"{title}"'
+
+
+def loose_query(artist, title):
+    return f'{artist} {title}'.strip()
+
+
+def track_meta(item):
+    """Extract {id, artist, title, album} from a search item, or None if it has no ID.
+    API keys vary (SNG_TITLE vs title, ART_NAME vs artist.name)."""
+    tid = None
+    for key in ['id', 'SNG_ID', 'TRACK_ID', 'ID']:
+        if key in item:
+            tid = item[key]
+            break
+    if not tid:
+        return None
+
+    # Title
+    title = item.get('SNG_TITLE', item.get('title', 'Unknown'))
+
+    # Artist
+    artist_name = item.get('ART_NAME')
+    if not artist_name and 'artist' in item:
+        artist_name = item['artist'].get('name')
+    if not artist_name:
+        artist_name = "Unknown"
+
+    # Album
+    album_title = item.get('ALB_TITLE')
+    if not album_title and 'album' in item:
+        album_title = item['album'].get('title')
+
+    return {'id': tid, 'title': title, 'artist': artist_name, 'album': album_title}
+
+
+def first_track(results):
+    """search_track result: {id, artist, title} of the top hit, or None."""
+    if results and 'data' in results and len(results['data']) > 0:
+        meta = track_meta(results['data'][0])
+        if meta:
+            return {'id': meta['id'], 'artist': meta['artist'], 'title': meta['title']}
+    return None
+
+
+def _intern(text):
+    # The same artist/album names come back in result after result
+    return sys.intern(text) if isinstance(text, str) else text
+
+
+def parse_candidates(results):
+    """search_candidates result: list of Candidate(id, title, artist, album)."""
+    candidates = []
+    if results and 'data' in results:
+        for item in results['data']:
+            meta = track_meta(item)
+            if meta:
+                tid = meta['id']
+                candidates.append(Candidate(
+                    int(tid) if str(tid).isdigit() else tid,
+                    meta['title'], _intern(meta['artist']), _intern(meta['album'])))
+    return candidates
+
+
+def songs_payload(track_ids):
+    # Format: [[id, 0], [id, 0]]
+    return [[int(tid), 0] for tid in track_ids]
+
+
+def create_playlist_params(title, track_ids=None):
+    return {
+        'title': title,
+        'status': 0,
+        'description': 'Created with Python',
+        # Try list of lists format for creation
+        'songs': songs_payload(track_ids) if track_ids else []
+    }
+
+
+def add_songs_params(playlist_id, track_ids, offset=-1):
+    return {
+        'playlist_id': playlist_id,
+        'songs': songs_payload(track_ids),
+        'offset': offset
+    }
+
+
+def delete_songs_params(playlist_id, track_ids):
+    return {'playlist_id': playlist_id, 'songs': songs_payload(track_ids)}
+
+
+# playlist.getSongs page size
+PLAYLIST_PAGE = 1000
+
+
+def playlist_songs_params(playlist_id, start, nb=PLAYLIST_PAGE):
+    return {'playlist_id': playlist_id, 'start': start, 'nb': nb}
+
+
+def parse_playlist_songs(results):
+    """playlist.getSongs page: (track IDs in playlist order, total tracks in the playlist)."""
+    data = (results or {}).get('data') or []
+    ids = [int(item['SNG_ID']) for item in data if item.get('SNG_ID')]
+    return ids, int((results or {}).get('total') or 0)
+
 
 class DeezerGWClient:
     """
     Unofficial Deezer Client that uses the 'arl' cookie and the internal 'gw-light.php' API.
     Bypasses the need for an App ID/Secret.
+    Blocking (requests); the server uses AsyncDeezerGWClient from deezer_gw_async.py.
     """
-    GW_URL = "https://www.deezer.com/ajax/gw-light.php"
-    
-    def __init__(self, arl):
+    GW_URL = GW_URL
+    # Keep-alive connections per host; worker threads can share one session
+    POOL_MAXSIZE = 32
+
+    def __init__(self, arl, cache=SHARED, index=SHARED):
         self.arl = arl
+        self.account_key = arl_key(arl)
+        # Imported here, not at the top: the helpers below (query building, parsing) are used
+        # without a client, and importing this module shouldn't open the cache or the index
+        if cache is SHARED:
+            from search_cache import search_cache as cache
+        if index is SHARED:
+            from track_index import track_index as index
+        self.search_cache = cache
+        self.track_index = index
+        # requests is imported here, not at the top: the server only uses the async client
+        # and shouldn't pay for it at cold start
+        import requests
+        from requests.adapters import HTTPAdapter
+        self._retry_errors = (requests.RequestException, RetryableError)
         self.session = requests.Session()
-        # Pretend to be a browser
-        self.session.headers.update({
-            'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-            'Origin': 'https://www.deezer.com',
-            'Referer': 'https://www.deezer.com/en/',
-            'Accept-Language': 'en-US,en;q=0.9',
-            'X-Requested-With': 'XMLHttpRequest',
-        })
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.POOL_MAXSIZE)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.session.headers.update(BROWSER_HEADERS)
         self.session.cookies.set('arl', arl, domain='.deezer.com')
         self.api_token = 'null' # Initial token
         self.user_id = None
-        
+        self.authenticated_at = 0
+        self._auth_lock = threading.Lock()
+
         # Initialize session and get real CSRF token
         self._init_session()
 
     def _init_session(self):
         """Get the api_token (CSRF) from getUserData"""
-        print("Connecting to Deezer (gw-light)...")
+        log.info("Connecting to Deezer (gw-light)...")
         data = self._call('deezer.getUserData')
+        self.api_token, self.user_id = parse_user_data(data)
+        self.authenticated_at = time.time()
+
+    def refresh_session(self, stale_token=None):
+        """Re-run getUserData to get a fresh checkForm.
+        If stale_token is given, skip when another thread already refreshed it."""
+        with self._auth_lock:
+            if stale_token is not None and self.api_token != stale_token:
+                return
+            self.api_token = 'null'
+            self._init_session()
 
-        if not data:
-            raise Exception("Failed to get user data. Is the ARL cookie valid?")
-        
-        self.api_token = data.get('checkForm')
-        self.user_id = data.get('USER', {}).get('USER_ID')
-        
-        if not self.api_token:
-            raise Exception("Could not find api_token (checkForm) in response.")
-            
-        print(f"Successfully connected as User ID: {self.user_id}")
-        
-        if str(self.user_id) == '0':
-            print("\n[WARNING] You are connected as Guest (User ID 0).")
-            print("This means your ARL cookie is invalid, expired, or not recognized.")
-            print("Playlist creation WILL fail.")
-            print("Please double-check your 'DEEZER_ARL' in .env")
-            print("Make sure you copied the full 192-character string without extra spaces.\n")
-            # We raise error here to stop early
-            raise Exception("Invalid ARL Cookie (Guest Session)")
-
-    def _call(self, method, params=None):
-        """Generic call to gw-light.php"""
+    def _call(self, method, params=None, retry_auth=True):
+        """Generic call to gw-light.php, rate limited and retried with backoff (see rate_limit.py)"""
         if params is None:
             params = {}
-            
-        query_params = {
-            'method': method,
-            'api_version': '1.0',
-            'api_token': self.api_token,
-            'input': '3'
-        }
-        
-        # Requests sometimes wants json dump in body
-        response = self.session.post(self.GW_URL, params=query_params, json=params)
-        
+
+        api_token = self.api_token
+        guard = CallGuard(gw_limiters, self.account_key)
         try:
-            res_json = response.json()
-        except Exception:
-            print(f"DEBUG: Failed Raw Response: {response.text[:500]}...")
-            raise Exception(f"Failed to parse JSON response from {method}")
-            
-        if 'error' in res_json and res_json['error']:
-            # Sometimes empty list [] is not an error but "no data"
-            if isinstance(res_json['error'], list) and not res_json['error']:
-                pass
-            else:
-                raise Exception(f"API Error in {method}: {res_json['error']}")
-                
-        return res_json.get('results')
+            while True:
+                delay = guard.before()
+                if delay:
+                    time.sleep(delay)
+                start = time.perf_counter()
+                try:
+                    # Requests sometimes wants json dump in body
+                    response = self.session.post(self.GW_URL, params=gw_query_params(method, api_token), json=params)
+                    results = check_gw_response(method, response)
+                except self._retry_errors as e:
+                    delay = guard.retry(getattr(e, 'throttled', False), getattr(e, 'retry_after', None))
+                    observe_call(method, start, 'failed' if delay is None else 'retry')
+                    if delay is None:
+                        raise
+                    log.debug("%s failed (%s), retrying in %.1fs", method, e, delay)
+                    time.sleep(delay)
+                    continue
+                except DeezerAPIError as e:
+                    observe_call(method, start, 'stale_token' if e.is_stale_token else 'api_error')
+                    guard.success()  # Deezer answered fine, the request itself was wrong
+                    if not (retry_auth and e.is_stale_token and method != 'deezer.getUserData'):
+                        raise
+                    break
+                observe_call(method, start, 'ok')
+                guard.success()
+                return results
+        finally:
+            guard.abort()  # cancelled or an unexpected error: don't leave a half-open probe held
+
+        # checkForm expired (long-lived pooled session): log in again and retry once
+        log.debug("Stale api_token on %s, re-authenticating...", method)
+        self.refresh_session(stale_token=api_token)
+        return self._call(method, params, retry_auth=False)
+
+    def _search(self, query, nb):
+        """search.music: offline track index first, then the shared result cache / network."""
+        if self.track_index is not None:
+            results = self.track_index.search_results(query, nb)
+            if results is not None:
+                SEARCH_SOURCE.inc(source='index')
+                return results
+
+        fetched = []
+
+        def call():
+            fetched.append(True)
+            results = self._call('search.music', search_params(query, nb))
+            if self.track_index is not None:
+                self.track_index.add(parse_candidates(results))
+            return results
+
+        if self.search_cache is None:
+            results = call()
+        else:
+            from search_cache import cache_key
+            results = self.search_cache.fetch(cache_key(query, 'TRACK', nb), call)
+        SEARCH_SOURCE.inc(source='network' if fetched else 'cache')
+        return results
 
     def search_track(self, artist, title):
-        """Search for a track. Returns ID."""
-        query = f'artist:"{artist}" track:"{title}"'
-        # The internal search method might be different, let's use public search API 
-        # or the internal 'search.music'
-        
-        # For robustness, we can typically AUTHENTICATED users can call the public API too?
         """Search for a track. Returns dict {id, artist, title} or None."""
-        # Helper to extract Metadata
-        def get_meta(item):
-            tid = None
-            for key in ['id', 'SNG_ID', 'TRACK_ID', 'ID']:
-                if key in item:
-                    tid = item[key]
-                    break
-            if not tid: return None
-            
-            # Artist
-            art = item.get('ART_NAME')
-            if not art and 'artist' in item: art = item['artist'].get('name')
-            if not art: art = "Unknown"
-            
-            # Title
-            ttl = item.get('SNG_TITLE', item.get('title', 'Unknown'))
-            
-            return {'id': tid, 'artist': art, 'title': ttl}
-
-        params = {
-            'query': '',
-            'filter': 'ALL',
-            'output': 'TRACK',
-            'start': 0,
-            'nb': 1
-        }
-        
         # Strategy 1: Strict Metadata Search
         if artist:
-            # Reconstruct params for specific call if needed, but search.music takes 'query'
-            # We can try to use advanced query syntax if gw-light supports it
-            params['query'] = f'artist:"{artist}" track:"{title}"'
-            results = self._call('search.music', params)
-            if results and 'data' in results and len(results['data']) > 0:
-                print(f"DEBUG: Found '{title}' via strict search.")
-                return get_meta(results['data'][0])
-        
+            # search.music takes 'query'; gw-light understands the advanced query syntax
+            results = self._search(strict_query(artist, title), 1)
+            found = first_track(results)
+            if found:
+                log.debug("Found '%s' via strict search.", title)
+                SEARCH_TRACK.inc(strategy='strict')
+                return found
+
         # Strategy 2: Loose Search (Artist + Title)
-        loose_query = f'{artist} {title}'.strip()
-        print(f"DEBUG: Trying loose search for '{loose_query}'...", end='\r')
-        params['query'] = loose_query
-        results = self._call('search.music', params)
-        if results and 'data' in results and len(results['data']) > 0:
-            return get_meta(results['data'][0])
-
-        # Strategy 3: REMOVED. 
-        # We prefer to return None and let the upper layer (server) decide 
+        query = loose_query(artist, title)
+        log.debug("Trying loose search for '%s'...", query)
+        found = first_track(self._search(query, 1))
+        if found:
+            SEARCH_TRACK.inc(strategy='loose')
+            return found
+
+        # Strategy 3: REMOVED.
+        # We prefer to return None and let the upper layer (server) decide
         # (e.g. show candidates dropdown instead of auto-picking).
-            
+
+        SEARCH_TRACK.inc(strategy='miss')
         return None
 
     def search_candidates(self, query, limit=5):
         """Search for candidates and return metadata list."""
-        params = {
-            'query': query,
-            'filter': 'ALL',
-            'output': 'TRACK',
-            'start': 0,
-            'nb': limit
-        }
-        results = self._call('search.music', params)
-        candidates = []
-        
-        if results and 'data' in results:
-            for item in results['data']:
-                # Extract ID
-                tid = None
-                for key in ['id', 'SNG_ID', 'TRACK_ID', 'ID']:
-                    if key in item:
-                        tid = item[key]
-                        break
-                if not tid: continue
-                
-                # Extract Metadata
-                # API keys vary (SNG_TITLE vs title, ART_NAME vs artist.name)
-                title = item.get('SNG_TITLE', item.get('title', 'Unknown'))
-                
-                # Artist
-                artist_name = item.get('ART_NAME')
-                if not artist_name and 'artist' in item:
-                    artist_name = item['artist'].get('name')
-                if not artist_name: artist_name = "Unknown"
-                
-                # Album
-                album_title = item.get('ALB_TITLE')
-                if not album_title and 'album' in item:
-                    album_title = item['album'].get('title')
-                
-                candidates.append({
-                    'id': tid,
-                    'title': title,
-                    'artist': artist_name,
-                    'album': album_title
-                })
+        results = self._search(query, limit)
+        candidates = parse_candidates(results)
+        SEARCH_CANDIDATES.inc(result='hit' if candidates else 'empty')
         return candidates
-        
+
     def create_playlist(self, title, track_ids=None):
         """Creates a playlist and optionally adds tracks."""
-        songs_payload = []
-        if track_ids:
-            # Try list of lists format for creation
-            songs_payload = [[int(tid), 0] for tid in track_ids]
-            
-        params = {
-            'title': title,
-            'status': 0,
-            'description': 'Created with Python',
-            'songs': songs_payload
-        }
-        print(f"DEBUG: Creating playlist with params: {json.dumps(params)}")
+        params = create_playlist_params(title, track_ids)
+        log.debug("Creating playlist with params: %s", params)
         result = self._call('playlist.create', params)
         return result
 
-    def add_tracks_to_playlist(self, playlist_id, track_ids):
+    def add_tracks_to_playlist(self, playlist_id, track_ids, offset=-1):
         """Adds tracks using playlist.addSongs with [[id, 0]] format."""
-        # Format: [[id, 0], [id, 0]]
-        formatted_songs = [[int(tid), 0] for tid in track_ids]
-            
-        params = {
-            'playlist_id': playlist_id,
-            'songs': formatted_songs,
-            'offset': -1
-        }
-        print(f"DEBUG: Adding tracks with params (playlist.addSongs + list): {json.dumps(params)}")
-        
+        params = add_songs_params(playlist_id, track_ids, offset)
+        log.debug("Adding tracks with params (playlist.addSongs + list): %s", params)
+
         # We need to handle potential JSON parse errors if the endpoint returns HTML
         try:
-            result = self._call('playlist.addSongs', params)
+            self._call('playlist.addSongs', params)
             return True
         except Exception as e:
-            print(f"DEBUG: add_tracks failed: {e}")
+            log.debug("add_tracks failed: %s", e)
             raise e
+
+    def get_playlist_tracks(self, playlist_id):
+        """Track IDs of an existing playlist, in order."""
+        track_ids = []
+        while True:
+            ids, total = parse_playlist_songs(
+                self._call('playlist.getSongs', playlist_songs_params(playlist_id, len(track_ids))))
+            track_ids.extend(ids)
+            if not ids or len(track_ids) >= total:
+                return track_ids
+
+    def remove_tracks_from_playlist(self, playlist_id, track_ids):
+        self._call('playlist.deleteSongs', delete_songs_params(playlist_id, track_ids))
+        return True
+
+    def sync_playlist(self, playlist_id, track_ids):
+        """
+        Make an existing playlist hold exactly track_ids, in order, sending only the difference
+        (see playlist_sync.PlaylistDiff). Returns counts of unchanged/added/removed/moved tracks.
+        """
+        from playlist_sync import PlaylistDiff, chunks
+        current = self.get_playlist_tracks(playlist_id)
+        diff = PlaylistDiff(current, track_ids)
+        calls = max(1, -(-len(current) // PLAYLIST_PAGE))  # getSongs pages
+        for _, chunk in chunks(diff.deletes, config.UPLOAD_MAX_CHUNK):
+            self.remove_tracks_from_playlist(playlist_id, chunk)
+            calls += 1
+        for offset, run in diff.inserts:
+            for start, chunk in chunks(run, config.UPLOAD_MAX_CHUNK):
+                self.add_tracks_to_playlist(playlist_id, chunk, offset=offset + start)
+                calls += 1
+        return diff.report(playlist_id, calls)
@@ -0,0 +1,260 @@
+import asyncio
+import logging
+import time
+
+import config
+from search_cache import search_cache, cache_key
+from track_index import track_index
+from rate_limit import gw_limiters, CallGuard
+from playlist_sync import PlaylistDiff, chunks
+from backends import search_router
+from tracing import tracer
+from deezer_gw import (
+    GW_URL, BROWSER_HEADERS, DeezerAPIError, RetryableError, arl_key,
+    gw_query_params, check_gw_response, parse_user_data,
+    search_params, strict_query, loose_query, first_track, parse_candidates,
+    create_playlist_params, add_songs_params, delete_songs_params,
+    PLAYLIST_PAGE, playlist_songs_params, parse_playlist_songs,
+    observe_call, SEARCH_SOURCE, SEARCH_TRACK, SEARCH_CANDIDATES,
+)
+
+log = logging.getLogger(__name__)
+
+
+class AsyncDeezerGWClient:
+    """
+    asyncio twin of DeezerGWClient for the server: same gw-light calls and the same
+    response normalisation (from deezer_gw), on a pooled httpx client with HTTP/2 keep-alive.
+    Create with `await AsyncDeezerGWClient.connect(arl)`.
+    """
+    GW_URL = GW_URL
+
+    def __init__(self, arl, http=None, cache=search_cache, index=track_index):
+        self.arl = arl
+        self.account_key = arl_key(arl)
+        self.search_cache = cache
+        self.track_index = index
+        # Imported on first connect rather than with the module (cold start, see api/index.py)
+        import httpx
+        self._retry_errors = (httpx.TransportError, RetryableError)
+        self.http = http or httpx.AsyncClient(
+            http2=True,
+            headers=BROWSER_HEADERS,
+            timeout=config.GW_TIMEOUT,
+            limits=httpx.Limits(
+                max_connections=config.GW_MAX_CONNECTIONS,
+                max_keepalive_connections=config.GW_MAX_CONNECTIONS,
+            ),
+        )
+        self.http.cookies.set('arl', arl, domain='.deezer.com')
+        self.api_token = 'null' # Initial token
+        self.user_id = None
+        self.authenticated_at = 0
+        self._auth_lock = asyncio.Lock()
+        # One pooled client per ARL, so this caps in-flight searches per account across requests
+        self._search_slots = asyncio.Semaphore(config.RESOLVE_PER_ARL_LIMIT)
+
+    @classmethod
+    async def connect(cls, arl):
+        """Create a client and log in (raises on invalid ARL)."""
+        client = cls(arl)
+        try:
+            await client._init_session()
+        except Exception:
+            await client.aclose()
+            raise
+        return client
+
+    async def aclose(self):
+        await self.http.aclose()
+
+    async def _init_session(self):
+        """Get the api_token (CSRF) from getUserData"""
+        log.info("Connecting to Deezer (gw-light)...")
+        with tracer.span('session.login'):
+            data = await self._call('deezer.getUserData')
+        self.api_token, self.user_id = parse_user_data(data)
+        self.authenticated_at = time.time()
+
+    async def refresh_session(self, stale_token=None):
+        """Re-run getUserData to get a fresh checkForm.
+        If stale_token is given, skip when another task already refreshed it."""
+        async with self._auth_lock:
+            if stale_token is not None and self.api_token != stale_token:
+                return
+            self.api_token = 'null'
+            await self._init_session()
+
+    async def _call(self, method, params=None, retry_auth=True):
+        """Generic call to gw-light.php, rate limited and retried with backoff (see rate_limit.py)"""
+        if params is None:
+            params = {}
+
+        api_token = self.api_token
+        guard = CallGuard(gw_limiters, self.account_key)
+        try:
+            while True:
+                delay = guard.before()
+                if delay:
+                    await asyncio.sleep(delay)
+                start = time.perf_counter()
+                try:
+                    response = await self.http.post(self.GW_URL, params=gw_query_params(method, api_token), json=params)
+                    results = check_gw_response(method, response)
+                except self._retry_errors as e:
+                    delay = guard.retry(getattr(e, 'throttled', False), getattr(e, 'retry_after', None))
+                    observe_call(method, start, 'failed' if delay is None else 'retry')
+                    if delay is None:
+                        raise
+                    log.debug("%s failed (%s), retrying in %.1fs", method, e, delay)
+                    await asyncio.sleep(delay)
+                    continue
+                except DeezerAPIError as e:
+                    observe_call(method, start, 'stale_token' if e.is_stale_token else 'api_error')
+                    guard.success()  # Deezer answered fine, the request itself was wrong
+                    if not (retry_auth and e.is_stale_token and method != 'deezer.getUserData'):
+                        raise
+                    break
+                observe_call(method, start, 'ok')
+                guard.success()
+                return results
+        finally:
+            guard.abort()  # cancelled or an unexpected error: don't leave a half-open probe held
+
+        # checkForm expired (long-lived pooled session): log in again and retry once
+        log.debug("Stale api_token on %s, re-authenticating...", method)
+        await self.refresh_session(stale_token=api_token)
+        return await self._call(method, params, retry_auth=False)
+
+    async def _search(self, query, nb):
+        """search.music: offline track index first, then the shared result cache / network."""
+        with tracer.span('search', query=query, nb=nb) as span:
+            if self.track_index is not None:
+                results = self.track_index.search_results(query, nb)
+                if results is not None:
+                    SEARCH_SOURCE.inc(source='index')
+                    if span:
+                        span.set(source='index')
+                    return results
+
+            fetched = []
+
+            async def call():
+                fetched.append(True)
+                async with self._search_slots:
+                    results = await search_router.search(self, query, nb)
+                if self.track_index is not None:
+                    self.track_index.add(parse_candidates(results))
+                return results
+
+            if self.search_cache is None:
+                results = await call()
+            else:
+                results = await self.search_cache.afetch(cache_key(query, 'TRACK', nb), call)
+            source = 'network' if fetched else 'cache'
+            SEARCH_SOURCE.inc(source=source)
+            if span:
+                span.set(source=source)
+            return results
+
+    async def search_track(self, artist, title):
+        """Search for a track. Returns dict {id, artist, title} or None."""
+        # Strategy 1: Strict Metadata Search
+        if artist:
+            with tracer.span('search.strict'):
+                results = await self._search(strict_query(artist, title), 1)
+            found = first_track(results)
+            if found:
+                log.debug("Found '%s' via strict search.", title)
+                SEARCH_TRACK.inc(strategy='strict')
+                return found
+
+        # Strategy 2: Loose Search (Artist + Title)
+        query = loose_query(artist, title)
+        with tracer.span('search.loose'):
+            found = first_track(await self._search(query, 1))
+        SEARCH_TRACK.inc(strategy='loose' if found else 'miss')
+        return found
+
+    async def search_candidates(self, query, limit=5):
+        """Search for candidates and return metadata list."""
+        with tracer.span('search_candidates', query=query, limit=limit) as span:
+            results = await self._search(query, limit)
+            candidates = parse_candidates(results)
+            if span:
+                span.set(candidates=len(candidates))
+        SEARCH_CANDIDATES.inc(result='hit' if candidates else 'empty')
+        return candidates
+
+    async def search_many(self, queries, limit=5, concurrency=None):
+        """
+        Run several search.music lookups and return one entry per query, in order:
+        its candidates list, or the Exception it raised (one failure doesn't affect the others).
+        gw-light has no batch method, so duplicate and cached queries are answered locally and
+        the rest are sent concurrently over this client's keep-alive (HTTP/2: multiplexed) connection.
+        """
+        unique = {}
+        for query in queries:
+            unique.setdefault(cache_key(query, 'TRACK', limit), query)
+
+        workers = asyncio.Semaphore(max(1, concurrency or config.RESOLVE_CONCURRENCY))
+
+        async def one(query):
+            async with workers:
+                candidates = parse_candidates(await self._search(query, limit))
+            SEARCH_CANDIDATES.inc(result='hit' if candidates else 'empty')
+            return candidates
+
+        keys = list(unique)
+        outcomes = await asyncio.gather(*(one(unique[key]) for key in keys), return_exceptions=True)
+        by_key = dict(zip(keys, outcomes))
+        return [by_key[cache_key(query, 'TRACK', limit)] for query in queries]
+
+    async def create_playlist(self, title, track_ids=None):
+        """Creates a playlist and optionally adds tracks."""
+        params = create_playlist_params(title, track_ids)
+        log.debug("Creating playlist with params: %s", params)
+        return await self._call('playlist.create', params)
+
+    async def add_tracks_to_playlist(self, playlist_id, track_ids, offset=-1):
+        """Adds tracks using playlist.addSongs with [[id, 0]] format."""
+        params = add_songs_params(playlist_id, track_ids, offset)
+        log.debug("Adding tracks with params (playlist.addSongs + list): %s", params)
+        try:
+            await self._call('playlist.addSongs', params)
+            return True
+        except Exception as e:
+            log.debug("add_tracks failed: %s", e)
+            raise e
+
+    async def get_playlist_tracks(self, playlist_id):
+        """Track IDs of an existing playlist, in order."""
+        track_ids = []
+        while True:
+            ids, total = parse_playlist_songs(
+                await self._call('playlist.getSongs', playlist_songs_params(playlist_id, len(track_ids))))
+            track_ids.extend(ids)
+            if not ids or len(track_ids) >= total:
+                return track_ids
+
+    async def remove_tracks_from_playlist(self, playlist_id, track_ids):
+        await self._call('playlist.deleteSongs', delete_songs_params(playlist_id, track_ids))
+        return True
+
+    async def sync_playlist(self, playlist_id, track_ids):
+        """
+        Make an existing playlist hold exactly track_ids, in order, sending only the difference
+        (see playlist_sync.PlaylistDiff). Returns counts of unchanged/added/removed/moved tracks.
+        """
+        current = await self.get_playlist_tracks(playlist_id)
+        diff = PlaylistDiff(current, track_ids)
+        calls = max(1, -(-len(current) // PLAYLIST_PAGE))  # getSongs pages
+        # Inserts depend on the deletes (and on each other) having landed: one call at a time
+        for _, chunk in chunks(diff.deletes, config.UPLOAD_MAX_CHUNK):
+            await self.remove_tracks_from_playlist(playlist_id, chunk)
+            calls += 1
+        for offset, run in diff.inserts:
+            for start, chunk in chunks(run, config.UPLOAD_MAX_CHUNK):
+                await self.add_tracks_to_playlist(playlist_id, chunk, offset=offset + start)
+                calls += 1
+        return diff.report(playlist_id, calls)
@@ -0,0 +1,365 @@
+import asyncio
+import json
+import logging
+import sqlite3
+import threading
+import time
+import uuid
+
+import config
+import metrics
+from deezer_gw import arl_key
+from session_pool import pool
+from uploader import upload_tracks
+
+log = logging.getLogger(__name__)
+
+# Same histogram the server's other stages use (registration is by name)
+STAGE_SECONDS = metrics.histogram(
+    'stage_seconds', 'Time spent per pipeline stage (parse, resolve, create, upload, sync)', ('stage',))
+
+# queued -> creating -> uploading -> done / failed
+UNFINISHED = ('queued', 'creating', 'uploading')
+
+
+def pending_runs(n, added):
+    """Contiguous runs (start, end) of indexes in range(n) that are not in `added`."""
+    runs = []
+    start = None
+    for i in range(n):
+        if i in added:
+            if start is not None:
+                runs.append((start, i))
+                start = None
+        elif start is None:
+            start = i
+    if start is not None:
+        runs.append((start, n))
+    return runs
+
+
+class JobStore:
+    """
+    Playlist creation jobs in SQLite: the job itself, plus one row per playlist.addSongs
+    chunk as it is confirmed, so an interrupted job knows exactly which tracks already landed.
+    Set JOBS_DB to '' for memory-only (jobs then don't survive a restart).
+    The ARL is never written: jobs hold its arl_key, JobQueue keeps the ARL itself in memory.
+    """
+
+    def __init__(self, path=None):
+        path = config.JOBS_DB if path is None else path
+        self._lock = threading.Lock()
+        try:
+            self._db = sqlite3.connect(path or ':memory:', check_same_thread=False, isolation_level=None)
+        except sqlite3.Error as e:
+            # e.g. read-only filesystem on serverless
+            log.warning("Jobs: SQLite file disabled (%s), jobs won't survive a restart", e)
+            self._db = sqlite3.connect(':memory:', check_same_thread=False, isolation_level=None)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute(
+            'CREATE TABLE IF NOT EXISTS jobs (id TEXT PRIMARY KEY, status TEXT, playlist_name TEXT, '
+            'arl_key TEXT, track_ids TEXT, playlist_id INTEGER, error TEXT, resumed INTEGER DEFAULT 0, '
+            'created REAL, updated REAL)'
+        )
+        columns = [row[1] for row in self._db.execute('PRAGMA table_info(jobs)')]
+        if 'arl' in columns:
+            # Files from before ARLs were kept out of the store: key the jobs, drop the cookies
+            if 'arl_key' not in columns:
+                self._db.execute('ALTER TABLE jobs ADD COLUMN arl_key TEXT')
+            for job_id, arl in self._db.execute('SELECT id, arl FROM jobs WHERE arl IS NOT NULL').fetchall():
+                self._db.execute('UPDATE jobs SET arl_key = ?, arl = NULL WHERE id = ?', (arl_key(arl), job_id))
+            self._db.execute('VACUUM')
+            self._db.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+        self._db.execute(
+            'CREATE TABLE IF NOT EXISTS job_chunks (job_id TEXT, start INTEGER, status TEXT, '
+            'attempts INTEGER, error TEXT, track_ids TEXT, created REAL)'
+        )
+        self._db.execute('CREATE INDEX IF NOT EXISTS job_chunks_job ON job_chunks (job_id)')
+
+    def create(self, key, playlist_name, track_ids):
+        """New queued job for the account with arl_key `key`."""
+        job_id = uuid.uuid4().hex  # unguessable: knowing the ID is what lets you read the job
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                'INSERT INTO jobs (id, status, playlist_name, arl_key, track_ids, created, updated) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (job_id, 'queued', playlist_name, key, json.dumps(track_ids), now, now)
+            )
+        return job_id
+
+    def update(self, job_id, **fields):
+        fields['updated'] = time.time()
+        columns = ', '.join(f'{name} = ?' for name in fields)
+        with self._lock:
+            self._db.execute(f'UPDATE jobs SET {columns} WHERE id = ?', (*fields.values(), job_id))
+
+    def record_chunk(self, job_id, start, status, attempts, track_ids, error=None):
+        with self._lock:
+            self._db.execute(
+                'INSERT INTO job_chunks (job_id, start, status, attempts, error, track_ids, created) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (job_id, start, status, attempts, error, json.dumps(track_ids), time.time())
+            )
+            self._db.execute('UPDATE jobs SET updated = ? WHERE id = ?', (time.time(), job_id))
+
+    def load(self, job_id):
+        """The job row as a dict, or None."""
+        with self._lock:
+            cursor = self._db.execute('SELECT * FROM jobs WHERE id = ?', (job_id,))
+            row = cursor.fetchone()
+            if row is None:
+                return None
+            job = dict(zip((c[0] for c in cursor.description), row))
+        job['track_ids'] = json.loads(job['track_ids'])
+        return job
+
+    def chunks(self, job_id):
+        with self._lock:
+            rows = self._db.execute(
+                'SELECT start, status, attempts, error, track_ids FROM job_chunks WHERE job_id = ? ORDER BY rowid',
+                (job_id,)
+            ).fetchall()
+        return [{'start': start, 'status': status, 'attempts': attempts, 'error': error,
+                 'count': len(json.loads(ids))} for start, status, attempts, error, ids in rows]
+
+    def added_indexes(self, job_id):
+        """Indexes into the job's track_ids that Deezer confirmed."""
+        added = set()
+        for chunk in self.chunks(job_id):
+            if chunk['status'] == 'added':
+                added.update(range(chunk['start'], chunk['start'] + chunk['count']))
+        return added
+
+    def unfinished(self):
+        with self._lock:
+            rows = self._db.execute(
+                f'SELECT id FROM jobs WHERE status IN ({", ".join("?" * len(UNFINISHED))}) ORDER BY created',
+                UNFINISHED
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def counts(self):
+        with self._lock:
+            return dict(self._db.execute('SELECT status, COUNT(*) FROM jobs GROUP BY status').fetchall())
+
+    def view(self, job_id):
+        """What GET /api/jobs/{id} returns: progress, added count, failures. None if unknown."""
+        job = self.load(job_id)
+        if job is None:
+            return None
+        chunks = self.chunks(job_id)
+        added = self.added_indexes(job_id)
+        attempted = set()
+        for chunk in chunks:
+            attempted.update(range(chunk['start'], chunk['start'] + chunk['count']))
+        track_ids = job['track_ids']
+        failed_ids = [track_ids[i] for i in sorted(attempted - added)]
+        errors = [c['error'] for c in chunks if c['status'] == 'failed' and c['error']]
+        return {
+            'id': job['id'],
+            'status': job['status'],
+            'playlist_name': job['playlist_name'],
+            'playlist_id': job['playlist_id'],
+            'requested': len(track_ids),
+            'added': len(added),
+            'failed_ids': failed_ids,
+            'chunks': len(chunks),
+            'failed_chunks': len([c for c in chunks if c['status'] == 'failed']),
+            'errors': errors[-5:],
+            'error': job['error'],
+            'resumed': job['resumed'],
+            'message': job_message(job, len(added), len(failed_ids)),
+            'created': job['created'],
+            'updated': job['updated'],
+        }
+
+
+def job_message(job, added, failed):
+    name = job['playlist_name']
+    status = job['status']
+    if status == 'done':
+        msg = f"Playlist '{name}' created with {added} of {len(job['track_ids'])} songs."
+        if failed:
+            msg += f" {failed} could not be added."
+        return msg
+    if status == 'failed':
+        return f"Playlist '{name}' failed: {job['error']}"
+    if status == 'queued':
+        return f"Playlist '{name}' is queued."
+    return f"Playlist '{name}': {added} of {len(job['track_ids'])} songs added..."
+
+
+class JobQueue:
+    """
+    Runs playlist creation in the background: submit() returns a job ID straight away and
+    JOB_WORKERS tasks work through the queue with the same strategy /api/create used inline
+    (one create_playlist call with every track, else an empty playlist filled in chunks).
+
+    Every confirmed chunk is written to the store, so jobs interrupted by a restart are picked
+    up again by start() and only the tracks Deezer hasn't confirmed are sent, each at its
+    original position. (A crash between Deezer creating the playlist and us recording its ID
+    can't be told apart from it never being created; that job starts over with a new playlist.)
+
+    ARLs are only kept in memory, until the job finishes. A job interrupted by a restart
+    waits for its account to come back (resume(), called on every submit and auth check).
+    """
+
+    def __init__(self, store=None, workers=None):
+        self.store = store or JobStore()
+        self.workers = max(1, workers or config.JOB_WORKERS)
+        self._queue = None
+        self._tasks = []
+        self.completed = 0
+        self.failed = 0
+        self._finished = {}  # job_id -> Future, for wait()
+        self._arls = {}  # job_id -> ARL, never persisted
+        self._parked = {}  # arl_key -> [job_id], interrupted jobs waiting for their ARL
+
+    def start(self):
+        """Start the workers (idempotent) and re-queue jobs a previous process didn't finish."""
+        if self._tasks:
+            return
+        self._queue = asyncio.Queue()
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        for job_id in self.store.unfinished():
+            if job_id not in self._arls:
+                self._park(job_id)
+
+    def _park(self, job_id):
+        job = self.store.load(job_id)
+        self.store.update(job_id, status='queued')  # not running; playlist_id and chunks are kept
+        self._parked.setdefault(job['arl_key'], []).append(job_id)
+        log.info("Job %s (%s) waits for its account to resume", job_id, job['status'])
+
+    def resume(self, arl):
+        """Re-queue the interrupted jobs of this account now that we have its ARL again."""
+        self.start()
+        for job_id in self._parked.pop(arl_key(arl), ()):
+            job = self.store.load(job_id)
+            self._arls[job_id] = arl
+            self.store.update(job_id, resumed=job['resumed'] + 1)
+            log.info("Resuming job %s (%s)", job_id, job['status'])
+            self._queue.put_nowait(job_id)
+
+    async def aclose(self):
+        # Unfinished jobs stay in the store and resume on the next start()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def submit(self, arl, playlist_name, track_ids):
+        self.resume(arl)
+        job_id = self.store.create(arl_key(arl), playlist_name, list(track_ids))
+        self._arls[job_id] = arl
+        self._queue.put_nowait(job_id)
+        return job_id
+
+    async def wait(self, job_ids):
+        """Wait until these submitted jobs have finished (done or failed)."""
+        loop = asyncio.get_running_loop()
+        futures = []
+        for job_id in job_ids:
+            job = self.store.load(job_id)
+            if job is not None and job['status'] in UNFINISHED:
+                futures.append(self._finished.setdefault(job_id, loop.create_future()))
+        if futures:
+            await asyncio.wait(futures)
+
+    async def create_now(self, arl, playlist_name, track_ids):
+        """Build the playlist within the caller's request (no background work); returns view()."""
+        job_id = self.store.create(arl_key(arl), playlist_name, list(track_ids))
+        self._arls[job_id] = arl
+        await self._execute(job_id)
+        return self.store.view(job_id)
+
+    async def _worker(self):
+        while True:
+            job_id = await self._queue.get()
+            try:
+                await self._execute(job_id)
+            finally:
+                self._queue.task_done()
+                waiter = self._finished.pop(job_id, None)
+                if waiter is not None and not waiter.done():
+                    waiter.set_result(None)
+
+    async def _execute(self, job_id):
+        try:
+            await self.run(job_id)
+        except Exception as e:
+            log.warning("Job %s failed: %s", job_id, e)
+            self.store.update(job_id, status='failed', error=str(e))
+            self.failed += 1
+        finally:
+            job = self.store.load(job_id)
+            if job is None or job['status'] not in UNFINISHED:
+                self._arls.pop(job_id, None)
+
+    async def run(self, job_id):
+        job = self.store.load(job_id)
+        if job is None or job['status'] not in UNFINISHED:
+            return
+        arl = self._arls.get(job_id)
+        if arl is None:
+            self._park(job_id)
+            return
+        async with pool.use(arl) as client:
+            await self._build(job, client)
+
+    async def _build(self, job, client):
+        job_id = job['id']
+        track_ids = job['track_ids']
+
+        if job['playlist_id'] is None:
+            self.store.update(job_id, status='creating')
+            try:
+                # Try to create with ALL tracks first
+                with STAGE_SECONDS.time(stage='create'):
+                    playlist_id = await client.create_playlist(job['playlist_name'], track_ids)
+            except Exception as e:
+                log.info("Job %s: creation with tracks failed (%s). Trying chunked strategy...", job_id, e)
+                with STAGE_SECONDS.time(stage='create'):
+                    playlist_id = await client.create_playlist(job['playlist_name'])  # Empty
+                self.store.update(job_id, status='uploading', playlist_id=playlist_id)
+            else:
+                self.store.record_chunk(job_id, 0, 'added', 1, track_ids)
+                self.store.update(job_id, status='done', playlist_id=playlist_id)
+                self.completed += 1
+                return
+        else:
+            self.store.update(job_id, status='uploading')
+            playlist_id = job['playlist_id']
+
+        # Only what Deezer hasn't confirmed, one contiguous run at a time so every
+        # track lands where it belongs between the ones already in the playlist
+        for start, end in pending_runs(len(track_ids), self.store.added_indexes(job_id)):
+            base_offset = len([i for i in self.store.added_indexes(job_id) if i < start])
+
+            def on_chunk(chunk, upload, start=start):
+                ids = chunk.get('added_ids') or chunk.get('failed_ids')
+                self.store.record_chunk(job_id, start + chunk['start'], chunk['status'],
+                                        chunk['attempts'], ids, chunk.get('error'))
+
+            with STAGE_SECONDS.time(stage='upload'):
+                await upload_tracks(client, playlist_id, track_ids[start:end],
+                                    on_chunk=on_chunk, base_offset=base_offset)
+
+        self.store.update(job_id, status='done')
+        self.completed += 1
+
+    def stats(self):
+        counts = self.store.counts()
+        return {
+            'workers': len(self._tasks),
+            'queued': self._queue.qsize() if self._queue else 0,
+            'running': counts.get('creating', 0) + counts.get('uploading', 0),
+            'waiting_for_account': sum(len(ids) for ids in self._parked.values()),
+            'completed': self.completed,
+            'failed': self.failed,
+        }
+
+
+# Shared by the server
+job_queue = JobQueue()
@@ -3,9 +3,32 @@ from urllib.parse import urlparse, parse_qs
 from parser import parse_description
 from deezer_client import DeezerClient
 from deezer_gw import DeezerGWClient
+from playlist_sync import parse_playlist_id
 import config
 
 def main():
+    config.setup_logging()
+
+    # Streaming batch mode: python main.py --batch [files/dirs/-] -o results.jsonl
+    if len(sys.argv) > 1 and sys.argv[1] == '--batch':
+        import batch
+        sys.exit(batch.main(sys.argv[2:]))
+
+    # Many tracklists at once, one playlist per file: python main.py --bulk [files/dirs] -o report.json
+    if len(sys.argv) > 1 and sys.argv[1] == '--bulk':
+        import bulk
+        sys.exit(bulk.main(sys.argv[2:]))
+
+    # Update an existing playlist instead of creating one: --sync <playlist ID or link>
+    sync_id = None
+    if '--sync' in sys.argv:
+        i = sys.argv.index('--sync')
+        sync_id = parse_playlist_id(sys.argv[i + 1]) if i + 1 < len(sys.argv) else None
+        if sync_id is None:
+            print("--sync needs a playlist ID or link.")
+            return
+        del sys.argv[i:i + 2]
+
     client = None
     
     # Priority 1: ARL Cookie (Most robust if no App ID)
@@ -134,6 +157,19 @@ def main():
         print("No tracks found on Deezer to add.")
         return
 
+    # 5a. Sync: send only what changed
+    if sync_id is not None:
+        if not isinstance(client, DeezerGWClient):
+            print("--sync needs DEEZER_ARL.")
+            return
+        try:
+            report = client.sync_playlist(sync_id, track_ids)
+            print(f"Playlist {sync_id} synced: {report['added']} added, {report['removed']} removed, "
+                  f"{report['moved']} moved, {report['unchanged']} unchanged ({report['calls']} Deezer calls).")
+        except Exception as e:
+            print(f"An error occurred: {e}")
+        return
+
     # 5. Create Playlist AND Add Tracks
     playlist_name = input("\nEnter a name for the new playlist: ")
     try:
@@ -0,0 +1,205 @@
+import re
+import unicodedata
+from collections import namedtuple
+from functools import lru_cache
+
+import config
+
+# Featured artists: "(feat. X)", "[ft X]", "(with X)" anywhere, or a bare "feat. X" up to the end
+FEAT_BRACKET_RE = re.compile(r'[\(\[]\s*(?:feat|ft|featuring|with)\b\.?\s*([^\)\]]*)[\)\]]')
+FEAT_TAIL_RE = re.compile(r'\s(?:feat|ft|featuring)\b\.?\s*(.*)$')
+# Other bracketed parts, e.g. "(Remastered 2011)", "[Official Video]", "(I Can't Get No)"
+BRACKET_RE = re.compile(r'[\(\[][^\)\]]*[\)\]]')
+# Collaborations in artist fields: "A & B", "A, B", "A x B", "A vs. B", "A and B"
+ARTIST_SPLIT_RE = re.compile(r'\s*(?:&|,|\+|/|\bx\b|\bvs\b\.?|\band\b)\s*')
+TOKEN_RE = re.compile(r'[^\W_]+')
+
+# Words that make a recording a different version. A remix is not the song you asked for,
+# unless you asked for the remix.
+VERSION_TAGS = {
+    'remix': 'remix', 'rmx': 'remix', 'mix': 'remix', 'bootleg': 'remix', 'flip': 'remix', 'vip': 'remix',
+    'live': 'live', 'acoustic': 'acoustic', 'unplugged': 'acoustic',
+    'instrumental': 'instrumental', 'karaoke': 'karaoke', 'cover': 'cover', 'demo': 'demo',
+    'extended': 'extended', 'sped': 'speed', 'slowed': 'speed', 'nightcore': 'speed',
+}
+# Harmless suffixes Deezer puts after " - " ("Song - Remastered 2009", "Song - Radio Edit")
+NEUTRAL_WORDS = {'remaster', 'remastered', 'version', 'edit', 'radio', 'mono', 'stereo', 'single', 'original', 'deluxe',
+                 'mix'}
+# "<word> Mix" that is just the track as released, not someone's remix ("Original Mix" on DJ tracklists)
+NEUTRAL_MIXES = {'original', 'extended', 'club', 'radio', 'album', 'main'}
+STOPWORDS = frozenset({'the', 'and'})
+
+# One search result. A plain tuple: small, quick to build, and packs straight into compact
+# payloads (payload.py). score is set once the resolver has ranked it.
+Candidate = namedtuple('Candidate', 'id title artist album score', defaults=(None,))
+
+VERSION_FACTOR = 0.7  # per version tag present on one side only: a perfect title can't reach "found"
+SWAP_FACTOR = 0.95  # "Title - Artist" is less likely than "Artist - Title"
+TITLE_ONLY_FACTOR = 0.75  # no artist to confirm a title-only match: never "found" on its own
+
+
+def fold(text):
+    """Lowercase, strip diacritics and apostrophes: "Beyoncé" -> "beyonce", "Don't" -> "dont"."""
+    text = text.casefold()
+    if not text.isascii():
+        text = unicodedata.normalize('NFKD', text)
+        text = ''.join(ch for ch in text if not unicodedata.combining(ch))
+    return text.replace("'", '').replace('’', '')
+
+
+def tokens(text):
+    words = TOKEN_RE.findall(text)
+    kept = frozenset(w for w in words if w not in STOPWORDS)
+    return kept or frozenset(words)
+
+
+def bigrams(words):
+    """Character bigrams of each word (padded), for typo/spacing-tolerant similarity."""
+    grams = set()
+    for word in words:
+        padded = f' {word} '
+        grams.update(padded[i:i + 2] for i in range(len(padded) - 1))
+    return frozenset(grams)
+
+
+class Features:
+    """Pre-processed side of a comparison: core tokens, their bigrams, featured artists, version tags."""
+    __slots__ = ('words', 'grams', 'featured', 'tags')
+
+    def __init__(self, words, featured=frozenset(), tags=frozenset()):
+        self.words = words
+        self.grams = bigrams(words)
+        self.featured = featured
+        self.tags = tags
+
+
+def _split_feat(text):
+    """Return (text without featuring parts, tokens of the featured artists)."""
+    featured = set()
+    for part in FEAT_BRACKET_RE.findall(text):
+        featured |= tokens(part)
+    text = FEAT_BRACKET_RE.sub(' ', text)
+    tail = FEAT_TAIL_RE.search(text)
+    if tail:
+        featured |= tokens(tail.group(1))
+        text = text[:tail.start()]
+    return text, frozenset(featured)
+
+
+def _version_tags(words):
+    tags = set()
+    for i, word in enumerate(words):
+        if word not in VERSION_TAGS:
+            continue
+        if word == 'mix' and i and words[i - 1] in NEUTRAL_MIXES:
+            continue
+        if word in NEUTRAL_MIXES and words[i + 1:i + 2] == ['mix']:
+            continue  # "Extended Mix"
+        tags.add(VERSION_TAGS[word])
+    return frozenset(tags)
+
+
+@lru_cache(maxsize=50000)
+def title_features(title):
+    """Features of a track title: brackets and version suffixes don't count as title words."""
+    text, featured = _split_feat(fold(title))
+    tags = set()
+    for part in BRACKET_RE.findall(text):
+        tags |= _version_tags(TOKEN_RE.findall(part))
+    core = BRACKET_RE.sub(' ', text)
+    if not TOKEN_RE.search(core):
+        core = text  # the whole title is in brackets
+    # "Song - Live at Wembley", "Song - 2011 Remaster"
+    head, sep, tail = core.rpartition(' - ')
+    if sep and TOKEN_RE.search(head):
+        tail_words = TOKEN_RE.findall(tail)
+        tail_tags = _version_tags(tail_words)
+        if tail_tags or any(w in NEUTRAL_WORDS for w in tail_words):
+            tags |= tail_tags
+            core = head
+    return Features(tokens(core), featured, frozenset(tags))
+
+
+@lru_cache(maxsize=50000)
+def artist_features(artist):
+    """Features of an artist field; collaborators and featured artists go to .featured."""
+    text, featured = _split_feat(fold(artist))
+    names = [name for name in ARTIST_SPLIT_RE.split(text) if name.strip()]
+    main = tokens(names[0]) if names else frozenset()
+    rest = set(featured)
+    for name in names[1:]:
+        rest |= tokens(name)
+    return Features(main, frozenset(rest))
+
+
+def _dice(a, b):
+    if not a or not b:
+        return 0.0
+    return 2.0 * len(a & b) / (len(a) + len(b))
+
+
+def similarity(a, b):
+    """Token-set similarity in [0, 1], falling back to bigrams for typos ("ACDC" vs "AC/DC")."""
+    return max(_dice(a.words, b.words), 0.9 * _dice(a.grams, b.grams))
+
+
+def artist_similarity(q, c):
+    """Like similarity(), but "Queen" also matches "Queen & David Bowie" and featured artists count."""
+    score = similarity(q, c)
+    q_all = q.words | q.featured
+    c_all = c.words | c.featured
+    if q.words and c.words and (q.words <= c_all or c.words <= q_all):
+        score = max(score, 0.9)
+    return score
+
+
+def version_factor(q, c):
+    return VERSION_FACTOR ** len(q.tags ^ c.tags)
+
+
+class Query:
+    """One parsed song, pre-processed once so scoring many candidates only does set operations."""
+
+    def __init__(self, artist, title):
+        self.artist = artist_features(artist) if artist else None
+        self.title = title_features(title)
+        if self.artist:
+            # For "Title - Artist" lines
+            self.swapped_artist = artist_features(title)
+            self.swapped_title = title_features(artist)
+        else:
+            # "Artist Title" with no dash: compare against the candidate's artist + title words
+            self.title_all = self.title.words | self.title.featured
+
+    def score(self, candidate):
+        c_artist = artist_features(candidate.artist or '')
+        c_title = title_features(candidate.title or '')
+
+        if not self.artist:
+            combined = _dice(self.title_all, c_title.words | c_artist.words | c_title.featured)
+            score = TITLE_ONLY_FACTOR * max(similarity(self.title, c_title), combined)
+            return score * version_factor(self.title, c_title)
+
+        direct = 0.55 * similarity(self.title, c_title) + 0.45 * artist_similarity(self.artist, c_artist)
+        swapped = SWAP_FACTOR * (0.55 * similarity(self.swapped_title, c_title)
+                                 + 0.45 * artist_similarity(self.swapped_artist, c_artist))
+        if swapped > direct:
+            return swapped * version_factor(self.swapped_title, c_title)
+        return direct * version_factor(self.title, c_title)
+
+
+def rank(artist, title, candidates):
+    """[(score, Candidate)] best first; ties keep Deezer's order."""
+    query = Query(artist, title)
+    scored = [(query.score(c), i, c) for i, c in enumerate(candidates)]
+    scored.sort(key=lambda s: (-s[0], s[1]))
+    return [(round(score, 3), c) for score, _, c in scored]
+
+
+def classify(score):
+    """'found' / 'ambiguous' / 'missing' for a best-candidate confidence."""
+    if score >= config.MATCH_FOUND_SCORE:
+        return 'found'
+    if score >= config.MATCH_MIN_SCORE:
+        return 'ambiguous'
+    return 'missing'
@@ -1,60 +1,79 @@
 import re
-from typing import List, Tuple
+from typing import Iterable, Iterator, List, Optional, Tuple, Union
 
-def parse_description(text: str) -> List[Tuple[str, str]]:
+# Common patterns:
+# 1. timestamp Artist - Title (e.g. 02:30 The Beatles - Let It Be)
+# 2. Artist - Title (e.g. Queen - Bohemian Rhapsody)
+# 3. Number. Artist - Title (e.g. 1. Pink Floyd - Time)
+
+# Leading junk in one regex: timestamp (e.g., 00:00, 1:24:47, [03:45]; optional brackets,
+# optional hour (d:), min:sec) and then "1. " or "1) " or "1 " numbering
+PREFIX_RE = re.compile(r'(?:[\(\[]?(?:\d{1,2}:)?\d{1,2}:\d{2}[\)\]]?\s*)?(?:\d+[\.\)]?\s*)?')
+# Lines starting with anything but a digit or bracket can't have a prefix to strip
+BRACKETS = frozenset('([')
+
+
+def _iter_lines(text: str, block: int = 1 << 20) -> Iterator[str]:
+    """Lines of a big string, split ~1 MB at a time instead of building text.split('\n') whole."""
+    start = 0
+    size = len(text)
+    while start < size:
+        end = text.find('\n', start + block)
+        if end < 0:
+            break
+        yield from text[start:end].split('\n')
+        start = end + 1
+    yield from text[start:].split('\n')
+
+
+def iter_parse(stream: Union[str, Iterable[str]]) -> Iterator[Tuple[str, str]]:
     """
-    Parses a text block (YouTube description) and attempts to extract songs.
-    Returns a list of (Artist, Title) tuples.
+    Lazily parse songs from a string, a text file object or any iterable of lines.
+    Yields (Artist, Title) tuples; same results as parse_description.
     """
-    songs = []
-    
-    # Common patterns:
-    # 1. timestamp Artist - Title (e.g. 02:30 The Beatles - Let It Be)
-    # 2. Artist - Title (e.g. Queen - Bohemian Rhapsody)
-    # 3. Number. Artist - Title (e.g. 1. Pink Floyd - Time)
-    
-    # We will process line by line
-    lines = text.split('\n')
-    
+    lines = _iter_lines(stream) if isinstance(stream, str) else stream
+    prefix_match = PREFIX_RE.match
+
+    # One pass per line; hot loop, so everything is inlined
     for line in lines:
         line = line.strip()
         if not line:
             continue
-            
-        # Remove timestamps (e.g., 00:00, 1:24:47, [03:45])
-        # Regex: optional brackets, optional hour (d:), min:sec
-        line_clean = re.sub(r'^\s*[\(\[]?(\d{1,2}:)?\d{1,2}:\d{2}[\)\]]?\s*', '', line)
-        line_clean = re.sub(r'^\d+[\.\)]?\s*', '', line_clean) # Remove "1. " or "1) " or "1 " numbering
-        
-        # Normalize dashes (em-dash, en-dash) to simple hyphen
-        line_clean = line_clean.replace('—', '-').replace('–', '-')
-        
-        # Look for the dash separator
+
+        first = line[0]
+        if first in BRACKETS or first.isdecimal():
+            line = line[prefix_match(line).end():]
+        if '—' in line or '–' in line:
+            line = line.replace('—', '-').replace('–', '-')
 
         # We assume "Artist - Title" format which is most common
-        # But sometimes it might be "Title - Artist". 
-        # It's hard to distinguish programmatically without a database, 
+        # But sometimes it might be "Title - Artist".
+        # It's hard to distinguish programmatically without a database,
         # so we will default to Artist - Title and let the user correct if needed or search both.
-        
-        if ' - ' in line_clean:
-            parts = line_clean.split(' - ')
-            if len(parts) >= 2:
-                artist = parts[0].strip()
-                title = ' - '.join(parts[1:]).strip()
-                
-                # Case: "- Title" (Artist is empty)
-                if len(artist) == 0 and len(title) > 0:
-                     songs.append(("", title))
-                # Normal Case: "Artist - Title"
-                elif len(artist) > 0 and len(title) > 0:
-                    songs.append((artist, title))
-        else:
+        artist, sep, title = line.partition(' - ')
+        if sep:
+            title = title.strip()
+            # Case: "- Title" (Artist is empty) / Normal Case: "Artist - Title"
+            if title:
+                yield (artist.strip(), title)
+        elif len(line) > 3: # Arbitrary min length to avoid noise
             # No dash separator. Treat whole line as title if it's substantial
             # e.g. "Manhattan Project"
-            if len(line_clean) > 3: # Arbitrary min length to avoid noise
-                songs.append(("", line_clean))
-                    
-    return songs
+            yield ("", line)
+
+
+def parse_line(line: str) -> Optional[Tuple[str, str]]:
+    """Parse one line into (Artist, Title), or None if it doesn't look like a song."""
+    return next(iter_parse((line,)), None)
+
+
+def parse_description(text: str) -> List[Tuple[str, str]]:
+    """
+    Parses a text block (YouTube description) and attempts to extract songs.
+    Returns a list of (Artist, Title) tuples.
+    """
+    return list(iter_parse(text))
+
 
 if __name__ == "__main__":
     # Test
@@ -0,0 +1,96 @@
+"""
+JSON for match results, in two shapes:
+
+legacy   the original rows: {"status", "artist", "title", "id" | "candidates": [{id, title,
+         artist, album, score}], "selected_id", "confidence"}
+compact  rows as arrays, with artist and album names in shared tables referenced by index:
+           row       [status, confidence, artist, title, id, candidates]
+           candidate [id, title, artist, album, score]
+         status indexes STATUSES; id and candidates are null when there are none;
+         selected_id is the first candidate. static/app.js has the decoder (unpackRow).
+
+orjson is used when it is installed (it's several times faster); otherwise the stdlib
+encoder with compact separators.
+"""
+import json
+
+try:
+    import orjson
+except ImportError:  # optional
+    orjson = None
+
+STATUSES = ('found', 'ambiguous', 'missing')
+_STATUS_INDEX = {status: i for i, status in enumerate(STATUSES)}
+
+
+def dumps(obj):
+    """JSON as UTF-8 bytes."""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def candidate_dict(c):
+    d = {'id': c.id, 'title': c.title, 'artist': c.artist, 'album': c.album}
+    if c.score is not None:
+        d['score'] = c.score
+    return d
+
+
+def legacy_row(row):
+    """A result row with its Candidates as dicts, the way the API always returned them."""
+    if 'candidates' not in row:
+        return row
+    return dict(row, candidates=[candidate_dict(c) for c in row['candidates']])
+
+
+class Packer:
+    """
+    Packs rows into the compact shape. Keeps the artist/album tables, so a stream can send
+    only the entries that are new since the last row (see new_entries()).
+    """
+
+    def __init__(self):
+        self.artists = {}  # name -> index
+        self.albums = {}
+        # The same names in index order, append-only, so new_entries() slices just the new ones
+        self._artist_names = []
+        self._album_names = []
+        self._sent = (0, 0)
+
+    @staticmethod
+    def _ref(table, names, name):
+        i = table.get(name)
+        if i is None:
+            i = table[name] = len(names)
+            names.append(name)
+        return i
+
+    def pack(self, row):
+        ref = self._ref
+        artists, artist_names = self.artists, self._artist_names
+        albums, album_names = self.albums, self._album_names
+        candidates = row.get('candidates')
+        if candidates is not None:
+            candidates = [[c.id, c.title, ref(artists, artist_names, c.artist), ref(albums, album_names, c.album),
+                           c.score] for c in candidates]
+        return [_STATUS_INDEX[row['status']], row['confidence'], ref(artists, artist_names, row['artist']),
+                row['title'], row.get('id'), candidates]
+
+    def new_entries(self):
+        """Table entries added since the last call: {"a": [artists], "b": [albums]}, or None."""
+        sent_a, sent_b = self._sent
+        if sent_a == len(self._artist_names) and sent_b == len(self._album_names):
+            return None
+        self._sent = (len(self._artist_names), len(self._album_names))
+        return {'a': self._artist_names[sent_a:], 'b': self._album_names[sent_b:]}
+
+    def tables(self):
+        return {'artists': list(self._artist_names), 'albums': list(self._album_names)}
+
+
+def pack_results(rows):
+    """A whole /api/prepare response in the compact shape."""
+    packer = Packer()
+    packed = [packer.pack(row) for row in rows]
+    return {'format': 'compact', 'statuses': STATUSES, **packer.tables(), 'rows': packed}
@@ -0,0 +1,108 @@
+import re
+from bisect import bisect_left
+
+import config
+
+# "https://www.deezer.com/fr/playlist/1234567890", "deezer.com/playlist/123?utm=...", or just "123"
+PLAYLIST_URL_RE = re.compile(r'playlist/(\d+)')
+
+
+def parse_playlist_id(text):
+    """Playlist ID from a Deezer link or a bare number; None if there isn't one."""
+    text = str(text).strip()
+    if text.isdigit():
+        return int(text)
+    match = PLAYLIST_URL_RE.search(text)
+    return int(match.group(1)) if match else None
+
+
+def longest_increasing_subsequence(values):
+    """Indexes of one longest strictly increasing subsequence of `values`, O(n log n)."""
+    tails = []  # tails[k] = value ending the best run of length k + 1
+    tail_at = []  # index in `values` of tails[k]
+    previous = [-1] * len(values)
+    for i, value in enumerate(values):
+        k = bisect_left(tails, value)
+        if k == len(tails):
+            tails.append(value)
+            tail_at.append(i)
+        else:
+            tails[k] = value
+            tail_at[k] = i
+        previous[i] = tail_at[k - 1] if k else -1
+    run = []
+    i = tail_at[-1] if tail_at else -1
+    while i >= 0:
+        run.append(i)
+        i = previous[i]
+    return run[::-1]
+
+
+class PlaylistDiff:
+    """
+    The smallest change that turns `current` into `desired` with the calls gw-light has:
+    delete tracks by ID, insert tracks at an offset.
+
+    Tracks that are already in the right relative order (a longest increasing subsequence of
+    their desired positions) stay put. Everything else that has to move is deleted and
+    re-inserted with the new tracks, so the whole diff is one delete plus one insert per
+    contiguous run of desired positions that aren't in place yet.
+
+    Calls cost far more than track IDs, so two runs separated by at most `merge_gap` tracks
+    that are in place become one: those few tracks are deleted and re-inserted along with them.
+
+    A playlist holds each track once, so repeats in `desired` are dropped (first one wins).
+    """
+
+    def __init__(self, current, desired, merge_gap=None):
+        merge_gap = config.SYNC_MERGE_GAP if merge_gap is None else merge_gap
+        self.desired = list(dict.fromkeys(int(tid) for tid in desired))
+        current = [int(tid) for tid in current]
+        position = {tid: i for i, tid in enumerate(self.desired)}
+
+        counts = {}
+        for tid in current:
+            counts[tid] = counts.get(tid, 0) + 1
+        # Tracks listed twice in the playlist are deleted (all copies go) and re-added once
+        kept = [tid for tid in current if tid in position and counts[tid] == 1]
+        stay = {kept[i] for i in longest_increasing_subsequence([position[tid] for tid in kept])}
+
+        # Runs [start, end) of desired positions that aren't in place, merged across small gaps
+        runs = []
+        for i, tid in enumerate(self.desired):
+            if tid in stay:
+                continue
+            if runs and i - runs[-1][1] <= merge_gap:
+                stay.difference_update(self.desired[runs[-1][1]:i])
+                runs[-1][1] = i + 1
+            else:
+                runs.append([i, i + 1])
+
+        self.removed = [tid for tid in dict.fromkeys(current) if tid not in position]
+        self.moved = [tid for tid in dict.fromkeys(current) if tid in position and tid not in stay]
+        self.added = [tid for tid in self.desired if tid not in counts]
+        self.unchanged = len(stay)
+
+        # After the delete the playlist is exactly the `stay` tracks, in desired order.
+        # Filling the gaps front to back, each run goes right after the desired prefix.
+        self.inserts = [(start, self.desired[start:end]) for start, end in runs]  # [(offset, [track ids])]
+
+    @property
+    def deletes(self):
+        return self.removed + self.moved
+
+    def report(self, playlist_id, calls):
+        return {
+            'playlist_id': playlist_id,
+            'tracks': len(self.desired),
+            'unchanged': self.unchanged,
+            'added': len(self.added),
+            'removed': len(self.removed),
+            'moved': len(self.moved),
+            'calls': calls,
+        }
+
+
+def chunks(track_ids, size):
+    for start in range(0, len(track_ids), size):
+        yield start, track_ids[start:start + size]
@@ -0,0 +1,64 @@
+"""
+Sampling profiler for the live process (GET /api/admin/profile).
+
+A background thread snapshots every other thread's Python stack (sys._current_frames)
+every `interval` seconds and counts identical stacks. The result is in the "collapsed" /
+folded format flamegraph.pl, speedscope and inferno read: one line per distinct stack,
+root first, frames separated by ';', then the number of samples:
+
+    MainThread;server.py:main;...;resolver.py:resolve_songs 42
+
+No tracing hooks are installed, so the process runs at full speed between samples.
+Frames of the asyncio event loop waiting in select() show up as idle time.
+"""
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+_running = threading.Lock()  # one profile at a time
+
+
+class ProfilerBusy(Exception):
+    """Another profile is already running."""
+
+
+def frame_name(frame):
+    code = frame.f_code
+    return f'{os.path.basename(code.co_filename)}:{getattr(code, "co_qualname", code.co_name)}'
+
+
+def sample(seconds, interval=0.005, threads=None):
+    """
+    Sample stacks for `seconds`. Returns (Counter of folded stack -> samples, number of
+    snapshots taken). `threads` limits sampling to those thread idents.
+    """
+    if not _running.acquire(blocking=False):
+        raise ProfilerBusy("A profile is already running")
+    try:
+        own = threading.get_ident()
+        stacks = Counter()
+        snapshots = 0
+        deadline = time.perf_counter() + seconds
+        while time.perf_counter() < deadline:
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own or (threads is not None and ident not in threads):
+                    continue
+                frames = []
+                while frame is not None:
+                    frames.append(frame_name(frame))
+                    frame = frame.f_back
+                frames.append(names.get(ident, f'thread-{ident}'))
+                stacks[';'.join(reversed(frames))] += 1
+            snapshots += 1
+            time.sleep(interval)
+        return stacks, snapshots
+    finally:
+        _running.release()
+
+
+def folded(stacks):
+    """Collapsed-stack text, heaviest stacks first."""
+    return ''.join(f'{stack} {count}\n' for stack, count in stacks.most_common())
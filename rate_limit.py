@@ -0,0 +1,252 @@
+import random
+import threading
+import time
+from collections import OrderedDict
+
+import config
+
+
+class CircuitOpenError(Exception):
+    """Too many consecutive gw-light failures: calls are refused until the cooldown ends."""
+
+    def __init__(self, name, retry_in):
+        super().__init__(f"Deezer is rate limiting or failing ({name}); try again in {retry_in:.0f}s")
+        self.retry_in = retry_in
+
+
+class AdaptiveLimiter:
+    """
+    Token bucket whose rate adapts AIMD-style: it creeps up on success and halves when
+    Deezer throttles or errors, plus a circuit breaker that opens after
+    `breaker_threshold` consecutive failures and lets one probe call through after `cooldown`.
+    Thread-safe; reserve() never sleeps itself, it returns how long the caller must wait,
+    so blocking and asyncio clients can share one limiter.
+    """
+
+    def __init__(self, name, rate, burst, min_rate=None, max_rate=None,
+                 breaker_threshold=None, cooldown=None):
+        self.name = name
+        self.rate = float(rate)
+        self.initial_rate = float(rate)
+        self.min_rate = min_rate if min_rate is not None else config.GW_MIN_RATE
+        self.max_rate = max_rate if max_rate is not None else rate * config.GW_MAX_RATE_FACTOR
+        self.burst = float(burst)
+        self.breaker_threshold = breaker_threshold or config.GW_BREAKER_THRESHOLD
+        self.cooldown = cooldown if cooldown is not None else config.GW_BREAKER_COOLDOWN
+
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+        self._failures = 0  # consecutive
+        self._opened_at = None
+        self._probing = False
+
+        # Metrics
+        self.calls = 0
+        self.waits = 0
+        self.wait_seconds = 0.0
+        self.throttles = 0
+        self.failures = 0
+        self.breaker_opens = 0
+        self.rejected = 0
+
+    def _refill(self, now):
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def reserve(self):
+        """
+        Take a token. Returns (seconds to wait before calling, probe); raises CircuitOpenError.
+        `probe` is True for the one half-open call that decides the breaker: it must end in
+        on_success / on_throttle / on_failure, or in release(probe=True) if it never got an answer.
+        """
+        with self._lock:
+            now = time.monotonic()
+            probe = False
+            if self._opened_at is not None:
+                remaining = self._opened_at + self.cooldown - now
+                if remaining > 0 or self._probing:
+                    self.rejected += 1
+                    raise CircuitOpenError(self.name, max(remaining, 1))
+                self._probing = probe = True  # half-open: this call decides
+
+            self._refill(now)
+            self._tokens -= 1  # may go negative: later callers queue behind us
+            self.calls += 1
+            delay = 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+            if delay:
+                self.waits += 1
+                self.wait_seconds += delay
+            return delay, probe
+
+    def release(self, probe, refund=False):
+        """
+        A reserved call ended without a verdict (cancelled, unexpected error, or never made):
+        if it was the probe, the next call probes instead. `refund` gives the token back.
+        """
+        with self._lock:
+            if probe:
+                self._probing = False
+            if refund:
+                self._tokens = min(self.burst, self._tokens + 1)
+
+    def on_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._probing = False
+            # Additive increase: about +1 req/s for every second spent at full rate
+            self.rate = min(self.max_rate, self.rate + 1.0 / self.rate)
+
+    def on_throttle(self):
+        """Deezer said slow down (429 / rate-limit error): halve the rate."""
+        with self._lock:
+            self.throttles += 1
+            self.rate = max(self.min_rate, self.rate / 2)
+            self._fail()
+
+    def on_failure(self):
+        """5xx / network error: counts towards the breaker and backs the rate off."""
+        with self._lock:
+            self.failures += 1
+            self.rate = max(self.min_rate, self.rate * 0.75)
+            self._fail()
+
+    def _fail(self):
+        self._failures += 1
+        if self._probing or self._failures >= self.breaker_threshold:
+            if self._opened_at is None or self._probing:
+                self.breaker_opens += 1
+            self._opened_at = time.monotonic()
+            self._probing = False
+
+    def tokens(self):
+        """Tokens available right now, without taking one (negative: callers are queued)."""
+        with self._lock:
+            self._refill(time.monotonic())
+            return self._tokens
+
+    @property
+    def state(self):
+        if self._opened_at is None:
+            return 'closed'
+        if self._probing or time.monotonic() >= self._opened_at + self.cooldown:
+            return 'half-open'
+        return 'open'
+
+    def stats(self):
+        with self._lock:
+            self._refill(time.monotonic())
+            return {
+                'rate': round(self.rate, 3),
+                'initial_rate': self.initial_rate,
+                'tokens': round(self._tokens, 2),
+                'burst': self.burst,
+                'state': self.state,
+                'calls': self.calls,
+                'waits': self.waits,
+                'wait_seconds': round(self.wait_seconds, 3),
+                'throttles': self.throttles,
+                'failures': self.failures,
+                'breaker_opens': self.breaker_opens,
+                'rejected': self.rejected,
+            }
+
+
+def backoff_delay(attempt, retry_after=None):
+    """Exponential backoff with full jitter for retry number `attempt` (0-based)."""
+    if retry_after is not None:
+        return min(float(retry_after), config.GW_BACKOFF_CAP)
+    return random.uniform(0, min(config.GW_BACKOFF_CAP, config.GW_BACKOFF_BASE * (2 ** attempt)))
+
+
+class GWLimiters:
+    """The process-wide limiter (protects our IP) plus one per ARL (protects each account)."""
+
+    def __init__(self, max_accounts=None):
+        self.process = AdaptiveLimiter('process', config.GW_RATE, config.GW_BURST)
+        self.max_accounts = max_accounts or config.SESSION_POOL_SIZE
+        self._accounts = OrderedDict()  # arl_key -> AdaptiveLimiter
+        self._lock = threading.Lock()
+
+    def for_account(self, key):
+        with self._lock:
+            limiter = self._accounts.get(key)
+            if limiter is None:
+                limiter = self._accounts[key] = AdaptiveLimiter(
+                    f'account {key[:8]}', config.GW_ARL_RATE, config.GW_ARL_BURST)
+                while len(self._accounts) > self.max_accounts:
+                    self._accounts.popitem(last=False)
+            self._accounts.move_to_end(key)
+            return limiter
+
+    def stats(self):
+        with self._lock:
+            accounts = {key[:8]: limiter.stats() for key, limiter in self._accounts.items()}
+        return {'process': self.process.stats(), 'accounts': accounts}
+
+
+class CallGuard:
+    """
+    Rate limiting + retry bookkeeping for one gw-light call, used by both clients' _call:
+
+        guard = CallGuard(limiters, arl_key)
+        try:
+            while True:
+                sleep(guard.before())          # may raise CircuitOpenError
+                ... do the request ...
+                guard.success()  /  delay = guard.retry(throttled, retry_after)  # None -> give up
+        finally:
+            guard.abort()                      # cancelled / unexpected error: free the probe
+    """
+
+    def __init__(self, limiters, account_key):
+        self.limiters = (limiters.process, limiters.for_account(account_key))
+        self.attempt = 0
+        self._probes = []  # limiters whose half-open probe this attempt holds
+
+    def before(self):
+        """Reserve on every limiter, or on none: if one refuses, the others are rolled back."""
+        delay = 0.0
+        reserved = []
+        try:
+            for limiter in self.limiters:
+                wait, probe = limiter.reserve()
+                reserved.append((limiter, probe))
+                delay = max(delay, wait)
+        except CircuitOpenError:
+            for limiter, probe in reserved:
+                limiter.release(probe, refund=True)
+            raise
+        self._probes = [limiter for limiter, probe in reserved if probe]
+        return delay
+
+    def abort(self):
+        """The attempt ended without success() or retry(): release any probe it holds."""
+        for limiter in self._probes:
+            limiter.release(True)
+        self._probes = []
+
+    def success(self):
+        self._probes = []
+        for limiter in self.limiters:
+            limiter.on_success()
+
+    def retry(self, throttled, retry_after=None):
+        """Record a failed attempt. Returns the backoff delay, or None if out of retries."""
+        self._probes = []
+        for limiter in self.limiters:
+            if throttled:
+                limiter.on_throttle()
+            else:
+                limiter.on_failure()
+        if self.attempt >= config.GW_MAX_RETRIES:
+            return None
+        delay = backoff_delay(self.attempt, retry_after)
+        self.attempt += 1
+        return delay
+
+
+# Shared by DeezerGWClient and AsyncDeezerGWClient
+gw_limiters = GWLimiters()
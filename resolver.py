@@ -0,0 +1,136 @@
+import asyncio
+
+import config
+from deezer_gw import loose_query
+from matching import rank, classify
+
+
+def first_query(artist, title):
+    """The one search most songs need: artist and title as free text, ranked locally."""
+    return loose_query(artist, title) if artist else title
+
+
+def merge_candidates(*lists):
+    seen = set()
+    merged = []
+    for candidates in lists:
+        for c in candidates:
+            if c.id not in seen:
+                seen.add(c.id)
+                merged.append(c)
+    return merged
+
+
+def match_row(artist, title, candidates):
+    """
+    Score candidates locally (matching.py) and build the result row for the matching UI:
+    {'status': 'found' | 'ambiguous' | 'missing', 'confidence': best score, ...}
+    """
+    ranked = rank(artist, title, candidates)
+    best = ranked[0][0] if ranked else 0.0
+    status = classify(best)
+    if status == 'found':
+        top = ranked[0][1]
+        return {
+            "status": "found",
+            "artist": top.artist,
+            "title": top.title,
+            "id": top.id,
+            "confidence": best
+        }
+    offered = [c._replace(score=score) for score, c in ranked if score >= config.MATCH_MIN_SCORE][:5]
+    if offered:
+        return {
+            "status": "ambiguous",
+            "artist": artist,
+            "title": title,
+            "candidates": offered,
+            "selected_id": offered[0].id,
+            "confidence": best
+        }
+    return {"status": "missing", "artist": artist, "title": title, "confidence": best}
+
+
+async def resolve_song(client, artist, title):
+    """
+    Resolve one parsed song to a result row (see match_row).
+    One top-N search, scored locally; only if that isn't conclusive and we have an artist
+    (it may be wrong, or the line may be "Title - Artist") a title-only search is added.
+    """
+    limit = config.MATCH_CANDIDATES
+    candidates = await client.search_candidates(first_query(artist, title), limit=limit)
+    row = match_row(artist, title, candidates)
+    if row['status'] != 'found' and artist:
+        more = await client.search_candidates(title, limit=limit)
+        row = match_row(artist, title, merge_candidates(candidates, more))
+    return row
+
+
+def _raise_first_error(outcomes):
+    for outcome in outcomes:
+        if isinstance(outcome, Exception):
+            raise outcome
+
+
+async def resolve_songs(client, songs, concurrency=None):
+    """
+    Resolve a list of {'artist', 'title'} dicts, results in input order.
+    Same decisions as resolve_song, but run as (at most) two rounds of client.search_many
+    over all pending songs, so a whole tracklist costs two round-trip latencies rather
+    than two per song. Any search error is raised, like the serial loop did.
+    """
+    concurrency = concurrency or config.RESOLVE_CONCURRENCY
+    limit = config.MATCH_CANDIDATES
+
+    async def search(queries):
+        outcomes = await client.search_many(queries, limit=limit, concurrency=concurrency)
+        _raise_first_error(outcomes)
+        return outcomes
+
+    # Round 1: one top-N search per song
+    first = await search([first_query(song['artist'], song['title']) for song in songs])
+    results = [match_row(song['artist'], song['title'], candidates)
+               for song, candidates in zip(songs, first)]
+
+    # Round 2: title-only search where the artist didn't settle it
+    retry = [i for i, row in enumerate(results) if row['status'] != 'found' and songs[i]['artist']]
+    more = await search([songs[i]['title'] for i in retry])
+    for i, candidates in zip(retry, more):
+        results[i] = match_row(songs[i]['artist'], songs[i]['title'], merge_candidates(first[i], candidates))
+
+    return results
+
+
+def _start_tasks(client, songs, concurrency, resolve):
+    """One task per song, at most `concurrency` searching at once."""
+    workers = asyncio.Semaphore(max(1, concurrency or config.RESOLVE_CONCURRENCY))
+
+    async def run(song):
+        async with workers:
+            return await resolve(client, song['artist'], song['title'])
+
+    return [asyncio.ensure_future(run(song)) for song in songs]
+
+
+async def iter_resolved(client, songs, concurrency=None, heartbeat=None, resolve=resolve_song):
+    """
+    Async generator yielding (index, row) as each song resolves, in completion order.
+    If `heartbeat` is set, yields None whenever nothing finished for that many seconds.
+    Closing the generator (or an error) cancels the searches still outstanding.
+    `resolve(client, artist, title)` defaults to resolve_song.
+    """
+    tasks = _start_tasks(client, songs, concurrency, resolve)
+    index_of = {task: i for i, task in enumerate(tasks)}
+    pending = set(tasks)
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, timeout=heartbeat, return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                yield None
+                continue
+            # Keep input order among rows that finished together
+            for task in sorted(done, key=index_of.get):
+                yield index_of[task], task.result()
+    finally:
+        for task in pending:
+            task.cancel()
@@ -0,0 +1,225 @@
+import asyncio
+import json
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+import config
+
+log = logging.getLogger(__name__)
+
+
+def cache_key(query, output='TRACK', nb=1):
+    """Normalised key for a search.music lookup: case and whitespace don't matter."""
+    return f"{output}|{int(nb)}|{' '.join(query.casefold().split())}"
+
+
+def is_negative(results):
+    """True if a search.music result has no tracks."""
+    return not (results and results.get('data'))
+
+
+class _Flight:
+    """An upstream call other threads are waiting on."""
+    __slots__ = ('done', 'results', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.results = None
+        self.error = None
+
+
+class SearchCache:
+    """
+    Two-tier cache for search.music results: an in-memory LRU in front of a SQLite file.
+    Empty results are kept too, with a shorter TTL. Concurrent lookups of the same key
+    share one upstream call (single-flight), for both threads and asyncio tasks.
+
+    Use fetch(key, fn) from sync code and afetch(key, coro_fn) from async code.
+    """
+
+    def __init__(self, path=None, max_entries=None, ttl=None, negative_ttl=None):
+        self.max_entries = max_entries or config.SEARCH_CACHE_SIZE
+        self.ttl = ttl if ttl is not None else config.SEARCH_CACHE_TTL
+        self.negative_ttl = negative_ttl if negative_ttl is not None else config.SEARCH_CACHE_NEGATIVE_TTL
+
+        self._memory = OrderedDict()  # key -> (expires, results, latency)
+        self._lock = threading.Lock()
+        self._inflight = {}  # key -> _Flight (sync callers)
+        self._ainflight = {}  # key -> asyncio.Future (async callers)
+
+        self._db = None
+        self._puts = 0
+        path = config.SEARCH_CACHE_DB if path is None else path
+        if path:
+            try:
+                self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+                self._db.execute('PRAGMA journal_mode=WAL')
+                self._db.execute(
+                    'CREATE TABLE IF NOT EXISTS search_cache '
+                    '(key TEXT PRIMARY KEY, results TEXT, expires REAL, latency REAL)'
+                )
+            except sqlite3.Error as e:
+                # e.g. read-only filesystem on serverless: keep going memory-only
+                log.warning("Search cache: SQLite disabled (%s)", e)
+                self._db = None
+
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.saved_seconds = 0.0
+
+    # --- lookups ---
+
+    def get(self, key):
+        """Return (True, results) on a fresh hit, else (False, None)."""
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self._memory.move_to_end(key)
+                    self.memory_hits += 1
+                    self.saved_seconds += entry[2]
+                    return True, entry[1]
+                del self._memory[key]
+
+            if self._db is not None:
+                row = self._db.execute(
+                    'SELECT results, expires, latency FROM search_cache WHERE key = ? AND expires > ?',
+                    (key, now)
+                ).fetchone()
+                if row is not None:
+                    results = json.loads(row[0])
+                    self._remember(key, (row[1], results, row[2]))
+                    self.disk_hits += 1
+                    self.saved_seconds += row[2]
+                    return True, results
+
+            self.misses += 1
+            return False, None
+
+    def put(self, key, results, latency=0.0):
+        ttl = self.negative_ttl if is_negative(results) else self.ttl
+        if ttl <= 0:
+            return
+        expires = time.time() + ttl
+        with self._lock:
+            self._remember(key, (expires, results, latency))
+            if self._db is not None:
+                self._db.execute(
+                    'INSERT OR REPLACE INTO search_cache (key, results, expires, latency) VALUES (?, ?, ?, ?)',
+                    (key, json.dumps(results), expires, latency)
+                )
+                self._puts += 1
+                if self._puts % 1000 == 0:
+                    self._db.execute('DELETE FROM search_cache WHERE expires <= ?', (time.time(),))
+
+    def _remember(self, key, entry):
+        self._memory[key] = entry
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    # --- read-through with single-flight ---
+
+    def fetch(self, key, fn):
+        """Return cached results for key, or call fn() once (even across threads) and cache it."""
+        hit, results = self.get(key)
+        if hit:
+            return results
+
+        with self._lock:
+            flight = self._inflight.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._inflight[key] = _Flight()
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.results
+
+        try:
+            start = time.perf_counter()
+            flight.results = fn()
+            self.put(key, flight.results, time.perf_counter() - start)
+            return flight.results
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._inflight[key]
+            flight.done.set()
+
+    async def afetch(self, key, coro_fn):
+        """Async fetch(): concurrent tasks asking for the same key await one upstream call."""
+        hit, results = self.get(key)
+        if hit:
+            return results
+
+        pending = self._ainflight.get(key)
+        if pending is not None:
+            with self._lock:
+                self.coalesced += 1
+            try:
+                return await asyncio.shield(pending)
+            except asyncio.CancelledError:
+                if not pending.cancelled():
+                    raise
+            # The leading request was cancelled (client went away), not us: try again
+            return await self.afetch(key, coro_fn)
+
+        pending = asyncio.get_running_loop().create_future()
+        self._ainflight[key] = pending
+        try:
+            start = time.perf_counter()
+            results = await coro_fn()
+        except asyncio.CancelledError:
+            pending.cancel()
+            raise
+        except BaseException as e:
+            pending.set_exception(e)
+            pending.exception()  # mark retrieved when nobody else was waiting
+            raise
+        finally:
+            del self._ainflight[key]
+        self.put(key, results, time.perf_counter() - start)
+        pending.set_result(results)
+        return results
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            if self._db is not None:
+                self._db.execute('DELETE FROM search_cache')
+
+    def stats(self):
+        with self._lock:
+            # Coalesced lookups missed the cache but never reached Deezer either
+            served = self.memory_hits + self.disk_hits + self.coalesced
+            lookups = self.memory_hits + self.disk_hits + self.misses
+            return {
+                'memory_entries': len(self._memory),
+                'max_entries': self.max_entries,
+                'disk': self._db is not None,
+                'ttl': self.ttl,
+                'negative_ttl': self.negative_ttl,
+                'memory_hits': self.memory_hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'hit_ratio': round(served / lookups, 4) if lookups else 0.0,
+                'coalesced': self.coalesced,
+                'saved_latency_seconds': round(self.saved_seconds, 3),
+            }
+
+
+# Shared by DeezerGWClient and AsyncDeezerGWClient
+search_cache = SearchCache()
@@ -1,20 +1,105 @@
-from fastapi import FastAPI, HTTPException, Body
-from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+from fastapi import FastAPI, HTTPException, Body, Request
+from fastapi.responses import FileResponse, StreamingResponse, Response, PlainTextResponse
 from pydantic import BaseModel
 from typing import List, Optional
+from contextlib import asynccontextmanager
+import asyncio
+import hmac
+import logging
 import os
-import uvicorn
 import time
 
+import config
+import metrics
+
 # Import our existing logic
 from parser import parse_description
-from deezer_gw import DeezerGWClient
+from session_pool import pool
+from coordinator import coordinator
+from search_cache import search_cache
+from track_index import track_index
+from rate_limit import gw_limiters
+from jobs import job_queue
+from playlist_sync import parse_playlist_id
+from suggest import candidate_cache
+from backends import search_router
+from bulk import bulk_import, finish_report
+from tracing import tracer, waterfall
+from payload import dumps, legacy_row, candidate_dict, pack_results, Packer, STATUSES
+
+config.setup_logging('%(asctime)s %(levelname)s %(name)s: %(message)s')
+log = logging.getLogger('server')
+
+HTTP_SECONDS = metrics.histogram(
+    'http_request_duration_seconds', 'Time to produce a response (streaming bodies excluded)',
+    ('method', 'route', 'status'))
+HTTP_IN_FLIGHT = metrics.gauge('http_requests_in_flight', 'Requests being handled')
+STAGE_SECONDS = metrics.histogram(
+    'stage_seconds', 'Time spent per pipeline stage (parse, resolve, create, upload, sync)', ('stage',))
+
+@asynccontextmanager
+async def lifespan(app):
+    # Playlist jobs left unfinished by the previous process resume here
+    job_queue.start()
+    yield
+    await job_queue.aclose()
+    # Close pooled gw-light connections on shutdown
+    await pool.aclose()
+    await search_router.aclose()
+
+app = FastAPI(lifespan=lifespan)
+
+async def traced_body(body, root):
+    # Streamed responses keep working after call_next returns: the trace ends with the body
+    try:
+        async for chunk in body:
+            yield chunk
+    finally:
+        tracer.finish(root)
 
-app = FastAPI()
+@app.middleware("http")
+async def observe_requests(request: Request, call_next):
+    start = time.perf_counter()
+    status = 500
+    HTTP_IN_FLIGHT.inc()
+    root = tracer.start_trace(f"{request.method} {request.url.path}", force=request.headers.get("x-trace") == "1")
+    try:
+        if root is None:
+            response = await call_next(request)
+        else:
+            try:
+                with tracer.activate(root):
+                    response = await call_next(request)
+            except BaseException as e:
+                root.error = type(e).__name__
+                tracer.finish(root)
+                raise
+            root.set(status=response.status_code)
+            response.headers["X-Trace-Id"] = root.trace.trace_id
+            response.body_iterator = traced_body(response.body_iterator, root)
+        status = response.status_code
+        return response
+    finally:
+        HTTP_IN_FLIGHT.dec()
+        # Route template, not the raw path, so labels stay bounded
+        route = getattr(request.scope.get("route"), "path", "other")
+        HTTP_SECONDS.observe(time.perf_counter() - start, method=request.method, route=route, status=status)
+
+class FastJSONResponse(Response):
+    """JSONResponse with payload.dumps (orjson when installed, no whitespace either way)."""
+    media_type = "application/json"
 
-# Serve static files (CSS, JS, HTML)
-app.mount("/static", StaticFiles(directory="static"), name="static")
+    def render(self, content):
+        with tracer.span('serialize') as span:
+            body = dumps(content)
+            if span:
+                span.set(bytes=len(body))
+        return body
+
+# Serve static files (CSS, JS, HTML). On Vercel the CDN serves them (see vercel.json)
+if config.SERVE_STATIC:
+    from fastapi.staticfiles import StaticFiles
+    app.mount("/static", StaticFiles(directory="static"), name="static")
 
 class ParseRequest(BaseModel):
     text: str
@@ -22,16 +107,37 @@ class ParseRequest(BaseModel):
 class PrepareRequest(BaseModel):
     arl: str
     songs: List[dict] # [{'artist': '...', 'title': '...'}, ...]
+    format: str = 'rows' # 'rows' (dicts) or 'compact' (arrays + artist/album tables, see payload.py)
 
 class CreateRequest(BaseModel):
     arl: str
     playlist_name: str
     track_ids: List[int]
 
+class BulkList(BaseModel):
+    name: str
+    text: str # tracklist, as for /api/parse
+
+class BulkRequest(BaseModel):
+    arl: str
+    lists: List[BulkList]
+    include_ambiguous: bool = False # also add the preselected candidate of ambiguous songs
+    wait: bool = False # wait for the playlists and report their outcome, instead of job IDs to poll
+
+class SyncRequest(BaseModel):
+    arl: str
+    playlist: str # playlist ID or deezer.com link
+    track_ids: List[int]
+
 class SearchCandidatesRequest(BaseModel):
     arl: str
     query: str
 
+class SuggestRequest(BaseModel):
+    arl: str
+    query: str
+    limit: int = 10
+
 class AuthRequest(BaseModel):
     arl: str
 
@@ -42,13 +148,14 @@ async def read_root():
 @app.post("/api/auth/check")
 async def check_auth(request: AuthRequest):
     try:
-        # Try to initialize client with the provided ARL
+        # Get (or log in) a pooled client for the provided ARL
         # The constructor of DeezerGWClient validates the user_id > 0
-        client = DeezerGWClient(request.arl)
-        print(f"Auth check passed for User ID: {client.user_id}")
+        async with pool.use(request.arl) as client:
+            log.info("Auth check passed for User ID: %s", client.user_id)
+        job_queue.resume(request.arl)  # jobs of this account interrupted by a restart
         return {"status": "ok", "user_id": client.user_id}
     except Exception as e:
-        print(f"Auth check failed: {e}")
+        log.warning("Auth check failed: %s", e)
         return {"status": "error", "message": str(e)}
 
 @app.post("/api/parse")
@@ -56,7 +163,8 @@ async def parse_text(request: ParseRequest):
     # Reuse our parser logic
     # parse_description returns list of tuples (artist, title)
     try:
-        parsed = parse_description(request.text)
+        with STAGE_SECONDS.time(stage='parse'), tracer.span('parse'):
+            parsed = parse_description(request.text)
         # Convert to list of dicts for JSON
         songs_data = [{"artist": a, "title": t} for a, t in parsed]
         return {"songs": songs_data}
@@ -66,132 +174,291 @@ async def parse_text(request: ParseRequest):
 @app.post("/api/prepare")
 async def prepare_playlist(request: PrepareRequest):
     try:
-        client = DeezerGWClient(request.arl)
-        results = []
-        
-        for song in request.songs:
-            artist = song['artist']
-            title = song['title']
-            
-            # Helper to fallback
-            def add_ambiguous(candidates=None):
-                if not candidates:
-                    candidates = client.search_candidates(title, limit=5)
-                if candidates:
-                    results.append({
-                        "status": "ambiguous",
-                        "artist": artist,
-                        "title": title,
-                        "candidates": candidates,
-                        "selected_id": candidates[0]['id']
-                    })
-                else:
-                    results.append({"status": "missing", "artist": artist, "title": title})
-
-            if artist:
-                # Search returns dict {id, artist, title}
-                found = client.search_track(artist, title)
-                
-                if found:
-                    # VALIDATE ARTIST MATCH
-                    # If input artist was "8" and found "Ludwig", that's a bad match -> Ambiguous
-                    
-                    input_art = artist.lower().strip()
-                    found_art = found['artist'].lower().strip()
-                    
-                    # Simple heuristic: is input contained in found? or high similarity?
-                    # or if input is very short/numeric and found is different
-                    
-                    is_suspicious = False
-                    if len(input_art) < 3 and input_art != found_art:
-                        is_suspicious = True
-                    elif input_art not in found_art and found_art not in input_art:
-                        # e.g. "Pop" vs "Pop Mage" is OK. "8" vs "Ludwig" is NOT.
-                        # Calculate Levenshtein? Or just strict check?
-                        # Let's say if no substring match -> suspicious
-                         is_suspicious = True
-                    
-                    if is_suspicious:
-                        # It's ambiguous! found['id'] is just one candidate.
-                        # We want to show candidates, but ensure 'found' is in the list
-                        candidates = client.search_candidates(title, limit=5)
-                        add_ambiguous(candidates)
-                    else:
-                        # Good match
-                        results.append({
-                            "status": "found",
-                            "artist": found['artist'], 
-                            "title": found['title'], 
-                            "id": found['id']
-                        })
-                else:
-                    # Failed strict search -> Ambiguous fallback
-                    add_ambiguous()
-            else:
-                # No artist -> Ambiguous
-                add_ambiguous()
-                    
-        return {"results": results}
+        async with pool.use(request.arl) as client:
+            with STAGE_SECONDS.time(stage='resolve'), tracer.span('resolve', songs=len(request.songs)):
+                results = await coordinator.resolve(client, request.songs)
+        if request.format == 'compact':
+            return FastJSONResponse({"results": pack_results(results)})
+        return FastJSONResponse({"results": [legacy_row(row) for row in results]})
     except Exception as e:
-        print(f"Prepare failed: {e}")
+        log.warning("Prepare failed: %s", e)
         return {"status": "error", "message": str(e)}
 
+@app.post("/api/prepare/stream")
+async def prepare_playlist_stream(request: PrepareRequest, http_request: Request):
+    """
+    Same matching as /api/prepare, streamed as NDJSON (one JSON event per line):
+      {"type": "start", "total": N}
+      {"type": "row", "index": i, "row": {...}, "done": k, "total": N}  (in completion order)
+    With "format": "compact" the start event also carries "format" and "statuses", and row
+    events carry "r" (the packed row) instead of "row", plus "t": {"a": [...], "b": [...]}
+    with the artists/albums the row introduced, appended to the browser's tables in order.
+      {"type": "heartbeat", "done": k, "total": N}
+      {"type": "done", "total": N} or {"type": "error", "message": "..."}
+    If the client disconnects, outstanding searches are cancelled.
+    """
+    async def events():
+        total = len(request.songs)
+        done = 0
+        packer = Packer() if request.format == 'compact' else None
+        if packer:
+            yield {"type": "start", "total": total, "format": "compact", "statuses": STATUSES}
+        else:
+            yield {"type": "start", "total": total}
+        start = time.perf_counter()
+        try:
+            async with pool.use(request.arl) as client:
+                with tracer.span('resolve', songs=total):
+                    rows = coordinator.iter_resolved(client, request.songs, heartbeat=config.PREPARE_HEARTBEAT)
+                    try:
+                        async for item in rows:
+                            if item is None:
+                                if await http_request.is_disconnected():
+                                    log.info("Prepare stream: client went away, cancelling searches")
+                                    return
+                                yield {"type": "heartbeat", "done": done, "total": total}
+                                continue
+                            index, row = item
+                            done += 1
+                            if packer:
+                                event = {"type": "row", "index": index, "r": packer.pack(row),
+                                         "done": done, "total": total}
+                                tables = packer.new_entries()
+                                if tables:
+                                    event["t"] = tables
+                                yield event
+                            else:
+                                yield {"type": "row", "index": index, "row": legacy_row(row),
+                                       "done": done, "total": total}
+                    finally:
+                        await rows.aclose()
+            STAGE_SECONDS.observe(time.perf_counter() - start, stage='resolve')
+            yield {"type": "done", "total": total}
+        except Exception as e:
+            log.warning("Prepare stream failed: %s", e)
+            yield {"type": "error", "message": str(e)}
+
+    async def ndjson():
+        async for event in events():
+            yield dumps(event) + b"\n"
+
+    return StreamingResponse(
+        ndjson(),
+        media_type="application/x-ndjson",
+        # Ask proxies not to buffer, so rows reach the browser as they resolve
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
 @app.post("/api/create")
 async def create_playlist_endpoint(request: CreateRequest):
+    """
+    Queue the playlist for creation and return its job ID straight away;
+    poll GET /api/jobs/{job_id} for progress (see jobs.py). With JOB_QUEUE off
+    (serverless), the playlist is built before responding instead.
+    """
     try:
-        client = DeezerGWClient(request.arl)
-        
-        track_ids = request.track_ids
-        playlist_name = request.playlist_name
-        
-        if not track_ids:
+        if not request.track_ids:
              return {"status": "error", "message": "No tracks provided."}
 
-        found_count = len(track_ids)
-        
-        try:
-            # Try to create with ALL tracks first
-            playlist_id = client.create_playlist(playlist_name, track_ids)
-            msg = f"Playlist '{playlist_name}' created with {found_count} songs."
-            
-        except Exception as e:
-            print(f"Creation with tracks failed ({e}). Trying chunked strategy...")
-            # Fallback: Create empty, then add in chunks
-            playlist_id = client.create_playlist(playlist_name) # Empty
-            
-            # Chunk size
-            chunk_size = 20
-            for i in range(0, len(track_ids), chunk_size):
-                chunk = track_ids[i:i + chunk_size]
-                try:
-                    client.add_tracks_to_playlist(playlist_id, chunk)
-                    print(f"Added chunk {i}-{i+len(chunk)}")
-                    time.sleep(1) # Be nice to API
-                except Exception as chunk_e:
-                    print(f"Failed to add chunk {i}: {chunk_e}")
-            
-            msg = f"Playlist '{playlist_name}' created (Chunked mode) with {found_count} songs."
-
+        # Log in now so a bad ARL is reported here, not in the job
+        async with pool.use(request.arl):
+            pass
+        if not config.JOB_QUEUE:
+            job = await job_queue.create_now(request.arl, request.playlist_name, request.track_ids)
+            if job["status"] != "done":
+                return {"status": "error", "message": job["message"]}
+            return {"status": "success", "message": job["message"], "playlist_id": job["playlist_id"],
+                    "failed_ids": job["failed_ids"]}
+        job_id = job_queue.submit(request.arl, request.playlist_name, request.track_ids)
+        log.info("Create job %s queued (%d tracks)", job_id, len(request.track_ids))
         return {
-            "status": "success",
-            "message": msg,
-            "playlist_id": playlist_id
+            "status": "queued",
+            "job_id": job_id,
+            "message": f"Playlist '{request.playlist_name}' is queued.",
         }
-        
+
     except Exception as e:
-        print(f"Create API failed: {e}")
+        log.warning("Create API failed: %s", e)
+        return {"status": "error", "message": str(e)}
+
+@app.post("/api/bulk")
+async def bulk_endpoint(request: BulkRequest):
+    """
+    Many named tracklists in one submission: all parsed, their distinct songs resolved once,
+    one playlist job per list queued (see bulk.py). Returns the consolidated report:
+    per list the counts, unmatched songs and job_id (poll GET /api/jobs/{job_id}), plus totals.
+    """
+    try:
+        if not request.lists:
+            return {"status": "error", "message": "No tracklists provided."}
+        lists = [{"name": item.name, "text": item.text} for item in request.lists]
+        async with pool.use(request.arl) as client:
+            report = await bulk_import(client, request.arl, lists, job_queue, request.include_ambiguous)
+        if request.wait or not config.JOB_QUEUE:
+            await finish_report(report, job_queue)
+        totals = report["totals"]
+        log.info("Bulk: %d lists, %d songs (%d distinct), %d playlists queued",
+                 totals["lists"], totals["songs"], totals["unique_songs"], totals["playlists_queued"])
+        return FastJSONResponse({"status": "success", **report})
+    except Exception as e:
+        log.warning("Bulk API failed: %s", e)
+        return {"status": "error", "message": str(e)}
+
+@app.get("/api/jobs/{job_id}")
+async def job_status(job_id: str):
+    """Progress of a create job: status, playlist_id, added / requested, failed_ids, message."""
+    job = job_queue.store.view(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown job")
+    return job
+
+@app.post("/api/sync")
+async def sync_playlist_endpoint(request: SyncRequest):
+    """
+    Make an existing playlist match track_ids (order included) by sending only the difference:
+    a re-run with a few fixed rows costs a handful of calls instead of a whole new playlist.
+    """
+    try:
+        playlist_id = parse_playlist_id(request.playlist)
+        if playlist_id is None:
+            return {"status": "error", "message": "Not a playlist ID or link."}
+        if not request.track_ids:
+            return {"status": "error", "message": "No tracks provided."}
+
+        async with pool.use(request.arl) as client:
+            with STAGE_SECONDS.time(stage='sync'), tracer.span('sync', tracks=len(request.track_ids)):
+                report = await client.sync_playlist(playlist_id, request.track_ids)
+        msg = (f"Playlist {playlist_id} synced: {report['added']} added, {report['removed']} removed, "
+               f"{report['moved']} moved, {report['unchanged']} unchanged ({report['calls']} Deezer calls).")
+        return {"status": "success", "message": msg, "playlist_id": playlist_id, "report": report}
+
+    except Exception as e:
+        log.warning("Sync API failed: %s", e)
         return {"status": "error", "message": str(e)}
 
 @app.post("/api/search_candidates")
 async def search_candidates_api(request: SearchCandidatesRequest):
     try:
-        client = DeezerGWClient(request.arl)
-        candidates = client.search_candidates(request.query, limit=10) # Higher limit for refinement
-        return {"candidates": candidates}
+        async with pool.use(request.arl) as client:
+            candidates, _ = await candidate_cache.search(client, request.query, limit=10) # Higher limit for refinement
+        return FastJSONResponse({"candidates": [candidate_dict(c) for c in candidates]})
     except Exception as e:
-        print(f"Search candidates failed: {e}")
+        log.warning("Search candidates failed: %s", e)
         return {"status": "error", "message": str(e)}
 
+@app.post("/api/suggest")
+async def suggest_api(request: SuggestRequest):
+    """
+    Type-ahead for the refine box. Compact payload: rows of [id, artist, title, album],
+    plus the query it answers ("q") so the browser can drop answers to older keystrokes.
+    "src" is exact / prefix (answered from the cache) or network.
+    """
+    try:
+        async with pool.use(request.arl) as client:
+            candidates, source = await candidate_cache.search(
+                client, request.query, limit=max(1, min(request.limit, 50)))
+        return {
+            "q": request.query,
+            "src": source,
+            "c": [[c.id, c.artist, c.title, c.album] for c in candidates],
+        }
+    except Exception as e:
+        log.warning("Suggest failed: %s", e)
+        return {"q": request.query, "status": "error", "message": str(e)}
+
+@app.get("/api/stats")
+async def stats():
+    return {
+        "session_pool": pool.stats(),
+        "search_cache": search_cache.stats(),
+        "track_index": track_index.stats(),
+        "coordinator": coordinator.stats(),
+        "jobs": job_queue.stats(),
+        "suggest": candidate_cache.stats(),
+        "search_backends": search_router.stats(),
+        "tracing": tracer.stats(),
+        "rate_limit": gw_limiters.stats(),
+    }
+
+@metrics.register_collector
+def component_metrics():
+    """The /api/stats numbers as gauges, read at scrape time."""
+    families = []
+    components = (
+        ('session_pool', pool.stats()),
+        ('search_cache', search_cache.stats()),
+        ('track_index', track_index.stats()),
+        ('coordinator', coordinator.stats()),
+        ('jobs', job_queue.stats()),
+        ('suggest', candidate_cache.stats()),
+        ('tracing', tracer.stats()),
+    )
+    for component, values in components:
+        for key, value in values.items():
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                families.append((f'deezer_{component}_{key}', 'gauge', f'{component} {key} (see /api/stats)', [({}, value)]))
+
+    limits = gw_limiters.stats()
+    limiters = [('process', limits['process'])] + [(f'account {key}', v) for key, v in limits['accounts'].items()]
+    states = {'closed': 0, 'half-open': 1, 'open': 2}
+    for key in ('rate', 'tokens', 'calls', 'waits', 'wait_seconds', 'throttles', 'failures', 'breaker_opens', 'rejected'):
+        families.append((f'deezer_rate_limit_{key}', 'gauge', f'rate limiter {key} (see /api/stats)',
+                         [({'limiter': name}, v[key]) for name, v in limiters]))
+    families.append(('deezer_rate_limit_breaker_state', 'gauge', 'circuit breaker: 0 closed, 1 half-open, 2 open',
+                     [({'limiter': name}, states[v['state']]) for name, v in limiters]))
+    return families
+
+@app.get("/metrics")
+async def metrics_endpoint():
+    """Prometheus text format: gw-light call latencies, search outcomes, endpoint latencies, stage timings."""
+    return Response(metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+def require_admin(request: Request):
+    """Admin endpoints need X-Admin-Token to match ADMIN_TOKEN; without ADMIN_TOKEN they don't exist."""
+    if not config.ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not hmac.compare_digest(request.headers.get("x-admin-token", ""), config.ADMIN_TOKEN):
+        raise HTTPException(status_code=403, detail="Admin token required")
+
+@app.get("/api/traces")
+async def list_traces(request: Request):
+    """Recent traced requests, newest first (see tracing.py). Admin only: traces hold search queries."""
+    require_admin(request)
+    return {"tracing": tracer.stats(), "traces": tracer.recent()}
+
+@app.get("/api/traces/{trace_id}")
+async def trace_view(trace_id: str, request: Request, format: str = "text"):
+    """One trace as a text waterfall, or with ?format=json as its Zipkin v2 spans."""
+    require_admin(request)
+    trace = tracer.get(trace_id)
+    if trace is None:
+        raise HTTPException(status_code=404, detail="Unknown trace")
+    if format == "json":
+        return [span.zipkin() for span in trace.spans]
+    return PlainTextResponse(waterfall(trace))
+
+@app.get("/api/admin/profile")
+async def profile(request: Request, seconds: float = 10, interval: float = 0.005):
+    """
+    Sample the live process's stacks for `seconds` (see profiler.py) and return them in
+    collapsed-stack format, for flamegraph.pl, speedscope or inferno:
+      curl -H "X-Admin-Token: ..." "localhost:8000/api/admin/profile?seconds=30" > out.folded
+    """
+    require_admin(request)
+    import profiler
+
+    seconds = max(0.1, min(seconds, config.PROFILE_MAX_SECONDS))
+    interval = max(0.001, min(interval, 1.0))
+    try:
+        # In a thread, so the event loop keeps serving (and gets sampled) meanwhile
+        stacks, snapshots = await asyncio.to_thread(profiler.sample, seconds, interval)
+    except profiler.ProfilerBusy as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    log.info("Profiled %.1fs: %d snapshots, %d distinct stacks", seconds, snapshots, len(stacks))
+    return PlainTextResponse(profiler.folded(stacks), headers={"X-Profile-Snapshots": str(snapshots)})
+
 if __name__ == "__main__":
+    import uvicorn
+
     # Auto-reload for dev
     uvicorn.run("server:app", host="0.0.0.0", port=8000, reload=True)
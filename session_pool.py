@@ -0,0 +1,162 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+
+import config
+from deezer_gw import arl_key
+from deezer_gw_async import AsyncDeezerGWClient
+
+log = logging.getLogger(__name__)
+
+
+class SessionPool:
+    """
+    Process-wide pool of logged-in AsyncDeezerGWClient instances, keyed by a hash of the ARL.
+    Reusing a client keeps its keep-alive connections and skips the deezer.getUserData
+    round-trip that a fresh client does on every call.
+
+        async with pool.use(arl) as client:
+            ...
+
+    A client that is evicted or invalidated is closed once the last block using it exits.
+    Used from the server's event loop only.
+    """
+
+    def __init__(self, max_size=None, token_ttl=None, connect=AsyncDeezerGWClient.connect):
+        self.max_size = max_size or config.SESSION_POOL_SIZE
+        self.token_ttl = token_ttl or config.SESSION_TOKEN_TTL
+        self.connect = connect
+
+        self._clients = OrderedDict()  # arl_key -> client, least recently used first
+        self._connecting = {}  # arl_key -> Future, so concurrent first requests log in once
+        self._uses = {}  # client -> number of use() blocks holding it
+        self._retired = set()  # no longer pooled, still in use: closed when the last use ends
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.refreshes = 0
+
+    @asynccontextmanager
+    async def use(self, arl):
+        """A logged-in client for this ARL for the duration of the block (see get())."""
+        client = await self.get(arl)
+        self._uses[client] = self._uses.get(client, 0) + 1
+        try:
+            yield client
+        finally:
+            uses = self._uses.pop(client) - 1
+            if uses:
+                self._uses[client] = uses
+            elif client in self._retired:
+                self._retired.discard(client)
+                await self._close(client)
+
+    async def get(self, arl):
+        """
+        Return a logged-in client for this ARL, creating (and logging in) if needed.
+        Prefer use(): a client from get() may be closed once it is evicted.
+        """
+        key = arl_key(arl)
+
+        client = self._clients.get(key)
+        if client is None:
+            self.misses += 1
+            return await self._login(key, arl)
+
+        self._clients.move_to_end(key)
+        self.hits += 1
+
+        # Cached api_token/user_id are too old: refresh them on the same connection
+        if time.time() - client.authenticated_at > self.token_ttl:
+            try:
+                await client.refresh_session(stale_token=client.api_token)
+            except Exception:
+                await self.invalidate(arl)
+                raise
+            self.refreshes += 1
+
+        return client
+
+    async def _login(self, key, arl):
+        pending = self._connecting.get(key)
+        if pending is not None:
+            try:
+                return await asyncio.shield(pending)
+            except asyncio.CancelledError:
+                if not pending.cancelled():
+                    raise
+            # The request doing the login was cancelled, not us: try again
+            return await self.get(arl)
+
+        pending = asyncio.get_running_loop().create_future()
+        self._connecting[key] = pending
+        try:
+            # Raises on invalid ARL, so bad cookies never get pooled
+            client = await self.connect(arl)
+        except asyncio.CancelledError:
+            pending.cancel()
+            raise
+        except Exception as e:
+            pending.set_exception(e)
+            pending.exception()  # mark retrieved when nobody else was waiting
+            raise
+        finally:
+            del self._connecting[key]
+
+        self._clients[key] = client
+        evicted = []
+        while len(self._clients) > self.max_size:
+            evicted.append(self._clients.popitem(last=False)[1])
+            self.evictions += 1
+        pending.set_result(client)
+        for old in evicted:
+            await self._retire(old)
+        return client
+
+    async def invalidate(self, arl):
+        """Drop the pooled client for this ARL (e.g. after it turned out to be invalid)."""
+        client = self._clients.pop(arl_key(arl), None)
+        if client is not None:
+            await self._retire(client)
+
+    async def _retire(self, client):
+        if self._uses.get(client):
+            self._retired.add(client)  # an in-flight request still holds it
+        else:
+            await self._close(client)
+
+    @staticmethod
+    async def _close(client):
+        try:
+            await client.aclose()
+        except Exception as e:
+            log.debug("Closing a pooled client failed: %s", e)
+
+    async def aclose(self):
+        """Close every client, pooled or retired (shutdown)."""
+        clients = list(self._clients.values()) + list(self._retired)
+        self._clients.clear()
+        self._retired.clear()
+        for client in clients:
+            await self._close(client)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'size': len(self._clients),
+            'max_size': self.max_size,
+            'token_ttl': self.token_ttl,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': round(self.hits / lookups, 4) if lookups else 0.0,
+            'evictions': self.evictions,
+            'retired_in_use': len(self._retired),
+            'refreshes': self.refreshes,
+        }
+
+
+# Shared by all server endpoints
+pool = SessionPool()
@@ -1,7 +1,6 @@
 document.addEventListener('DOMContentLoaded', () => {
     // State
     let currentSongs = []; // From Parse
-    let preparedResults = []; // From Match
 
     const elements = {
         authOverlay: document.getElementById('authOverlay'),
@@ -18,6 +17,7 @@ document.addEventListener('DOMContentLoaded', () => {
         songsCount: document.getElementById('songsCount'),
 
         playlistName: document.getElementById('playlistName'),
+        syncTarget: document.getElementById('syncTarget'),
         btnCreate: document.getElementById('btnCreate'),
     };
 
@@ -86,8 +86,9 @@ document.addEventListener('DOMContentLoaded', () => {
             const data = await res.json();
 
             currentSongs = data.songs;
-            preparedResults = []; // Reset matches
-            renderSongsState('parsed'); // Render just text list
+            resetMatches(0); // Reset matches
+            elements.songsCount.textContent = `Review Songs (${currentSongs.length})`;
+            showRows(currentSongs.length); // Just the parsed text, until matches stream in
             elements.btnParse.textContent = "1. Parse Songs";
         } catch (e) {
             alert("Error parsing text");
@@ -96,185 +97,446 @@ document.addEventListener('DOMContentLoaded', () => {
     });
 
     // --- Matching Functions ---
+    let matchController = null; // AbortController of the running match stream
+
     elements.btnMatch.addEventListener('click', async () => {
+        // Second click while searching = Stop (server cancels outstanding searches)
+        if (matchController) {
+            matchController.abort();
+            return;
+        }
         if (!currentSongs.length) return alert("Parse songs first!");
 
-        elements.btnMatch.textContent = "Searching...";
-        elements.btnMatch.disabled = true;
+        matchController = new AbortController();
+        elements.btnMatch.textContent = "Stop";
+
+        resetMatches(currentSongs.length);
+        showRows(currentSongs.length);
 
         try {
-            const res = await fetch('/api/prepare', {
+            const res = await fetch('/api/prepare/stream', {
                 method: 'POST',
                 headers: { 'Content-Type': 'application/json' },
                 body: JSON.stringify({
                     arl: storedArl,
-                    songs: currentSongs
-                })
+                    songs: currentSongs,
+                    format: 'compact'
+                }),
+                signal: matchController.signal
             });
-            const data = await res.json();
-            if (data.results) {
-                preparedResults = data.results;
-                renderSongsState('matched');
-            } else {
-                alert("Error fetching matches");
+
+            // NDJSON: one event per line, rows arrive as soon as they are resolved
+            const reader = res.body.getReader();
+            const decoder = new TextDecoder();
+            let buffer = '';
+            while (true) {
+                const { value, done } = await reader.read();
+                if (done) break;
+                buffer += decoder.decode(value, { stream: true });
+                const lines = buffer.split('\n');
+                buffer = lines.pop();
+                lines.filter(line => line.trim()).forEach(line => handleMatchEvent(JSON.parse(line)));
             }
         } catch (e) {
-            alert("Network error: " + e);
+            if (e.name !== 'AbortError') alert("Network error: " + e);
         } finally {
+            matchController = null;
             elements.btnMatch.textContent = "2. Find Matches";
-            elements.btnMatch.disabled = false;
+            scheduleRender();
         }
     });
 
+    // Compact rows (see payload.py): [status, confidence, artist, title, id, candidates],
+    // candidates [id, title, artist, album, score], names as indexes into tables that
+    // grow with each row event ("t").
+    let compact = null; // {statuses, artists, albums} while a compact stream runs
+
+    // Match state, one slot per song. Rows stay packed and are only unpacked for the
+    // rows on screen; the user's choices live next to them.
+    let packedRows = []; // compact row, or null until it arrives
+    let selectedIds = []; // track ID that goes into the playlist, as the server sent it; null = none
+    let matchedCount = 0;
+    const refineText = new Map(); // index -> what the user typed in the refine box
+    const refineRows = new Map(); // index -> type-ahead rows [id, artist, title, album] picked from
+
+    function resetMatches(count) {
+        packedRows = new Array(count).fill(null);
+        selectedIds = new Array(count).fill(null);
+        matchedCount = 0;
+        refineText.clear();
+        refineRows.clear();
+        suggestPending.forEach(controller => controller.abort());
+        suggestPending.clear();
+    }
+
+    function unpackRow(r) {
+        const { statuses, artists, albums } = compact;
+        const row = { status: statuses[r[0]], confidence: r[1], artist: artists[r[2]], title: r[3] };
+        if (r[4] !== null) row.id = r[4];
+        if (r[5]) {
+            row.candidates = r[5].map(c => ({ id: c[0], title: c[1], artist: artists[c[2]], album: albums[c[3]], score: c[4] }));
+            row.selected_id = row.candidates[0].id;
+        }
+        return row;
+    }
+
+    function handleMatchEvent(event) {
+        if (event.type === 'start') {
+            compact = { statuses: event.statuses, artists: [], albums: [] };
+        } else if (event.type === 'row') {
+            if (event.t) {
+                compact.artists.push(...event.t.a);
+                compact.albums.push(...event.t.b);
+            }
+            const r = event.r;
+            if (packedRows[event.index] === null) matchedCount++;
+            packedRows[event.index] = r;
+            // found: its id; ambiguous: the first candidate, as the dropdown shows
+            selectedIds[event.index] = r[4] !== null ? r[4] : (r[5] && r[5].length ? r[5][0][0] : null);
+            markRow(event.index);
+        } else if (event.type === 'error') {
+            alert("Error fetching matches: " + event.message);
+        }
+        // 'heartbeat' / 'done' only keep the stream alive
+    }
+
+    function updateMatchCount() {
+        if (!packedRows.length) return;
+        elements.songsCount.textContent = matchController
+            ? `Searching... (${matchedCount}/${packedRows.length})`
+            : `Matches Found (${matchedCount})`;
+    }
 
-    function renderSongsState(state) {
-        // state = 'parsed' (show simple list from currentSongs)
-        // state = 'matched' (show complex list from preparedResults)
+    // --- Results table ---
+    // Only the rows in view (plus OVERSCAN either side) are in the DOM, absolutely placed
+    // inside a spacer as tall as the whole list. Rows come in two fixed heights, measured
+    // once from the stylesheet: 'plain' (a song) and 'choice' (refine box and dropdown), so
+    // any row's offset is a prefix sum. Stream events, scrolling and resizing only mark
+    // what changed; the DOM is updated at most once per animation frame.
+    const OVERSCAN = 8;
+    const table = {
+        count: 0,
+        spacer: null,
+        offsets: null, // Float64Array(count + 1), null when heights changed
+        heights: {}, // kind -> px
+        rendered: new Map(), // index -> element
+        dirty: new Set(), // indexes to rebuild
+        frame: 0,
+    };
 
+    function showRows(count) {
         elements.songList.innerHTML = '';
+        table.spacer = document.createElement('div');
+        table.spacer.className = 'virtual-spacer';
+        elements.songList.appendChild(table.spacer);
+        elements.songList.scrollTop = 0;
+        table.count = count;
+        table.offsets = null;
+        table.rendered.clear();
+        table.dirty.clear();
+        scheduleRender();
+    }
 
-        if (state === 'parsed') {
-            elements.songsCount.textContent = `Review Songs (${currentSongs.length})`;
-            currentSongs.forEach(song => {
-                const item = document.createElement('div');
-                item.className = 'song-item';
-                item.innerHTML = `
-                    <div class="song-status" style="background:#555"></div>
-                    <div class="song-info">
-                        <div class="song-title">${song.title}</div>
-                        <div class="song-artist">${song.artist || '(No Artist)'}</div>
-                    </div>
-                `;
-                elements.songList.appendChild(item);
-            });
-        } else if (state === 'matched') {
-            elements.songsCount.textContent = `Matches Found (${preparedResults.length})`;
-
-            preparedResults.forEach((res, idx) => {
-                const item = document.createElement('div');
-                item.className = 'song-item';
-
-                let content = '';
-                let statusClass = '';
-
-                if (res.status === 'found') {
-                    statusClass = 'found';
-                    content = `
-                        <div class="song-info">
-                            <div class="song-title">${res.title}</div>
-                            <div class="song-artist" style="color:#00ff88">Found: ${res.artist}</div>
-                        </div>
-                        <input type="hidden" class="track-id" value="${res.id}">
-                    `;
-                } else if (res.status === 'missing') {
-                    statusClass = 'missing';
-                    content = `
-                        <div class="song-info">
-                            <div class="song-title">${res.title}</div>
-                            <div class="song-artist" style="color:#ff3b3b">Not Found</div>
-                            <div class="refine-container" style="display:flex; gap:5px; margin-top:5px;">
-                                <input type="text" class="refine-input" placeholder="Refine search..." value="${res.artist} ${res.title}">
-                                <button class="small-btn refine-btn" data-index="${idx}">Search</button>
-                            </div>
-                            <select class="candidate-select" style="width:100%; margin-top:5px; display:none;">
-                            </select>
-                        </div>
-                    `;
-                } else if (res.status === 'ambiguous') {
-                    statusClass = 'ambiguous'; // yellow?
-                    // Create Dropdown
-                    let options = res.candidates.map(c =>
-                        `<option value="${c.id}">${c.artist} - ${c.title} (${c.album})</option>`
-                    ).join('');
-
-                    content = `
-                        <div class="song-info">
-                            <div class="song-title" style="color:#ffd700">${res.title} (Choose Match)</div>
-                            <div class="refine-container" style="display:flex; gap:5px; margin-top:5px;">
-                                <input type="text" class="refine-input" placeholder="Refine search..." value="${res.title}">
-                                <button class="small-btn refine-btn" data-index="${idx}">Search</button>
-                            </div>
-                            <select class="candidate-select" style="width:100%; margin-top:5px; font-size:0.8rem; padding:6px;">
-                                ${options}
-                            </select>
-                        </div>
-                     `;
-                }
-
-                item.innerHTML = `<div class="song-status ${statusClass}" style="${res.status === 'ambiguous' ? 'background:#ffd700' : ''}"></div>` + content;
-                elements.songList.appendChild(item);
-            });
+    function markRow(index) {
+        table.dirty.add(index);
+        table.offsets = null; // its height may have changed
+        scheduleRender();
+    }
+
+    function scheduleRender() {
+        if (!table.frame) table.frame = requestAnimationFrame(renderTable);
+    }
+
+    function rowKind(index) {
+        const r = packedRows[index];
+        return r && compact.statuses[r[0]] !== 'found' ? 'choice' : 'plain';
+    }
+
+    function rowHeight(kind) {
+        if (!table.heights[kind]) {
+            // Measure a sample row of this kind with the current stylesheet and width
+            const sample = kind === 'choice'
+                ? choiceItem(-1, 'M', 'M', '', 'M', '<option>M</option>', 'ambiguous')
+                : plainItem(-1, 'M', 'M', '');
+            sample.style.visibility = 'hidden';
+            table.spacer.appendChild(sample);
+            const height = sample.offsetHeight;
+            sample.remove();
+            if (!height) return 60; // not laid out yet (hidden panel): guess, measure next frame
+            table.heights[kind] = height;
+        }
+        return table.heights[kind];
+    }
+
+    function computeOffsets() {
+        const offsets = new Float64Array(table.count + 1);
+        const plain = rowHeight('plain');
+        const choice = rowHeight('choice');
+        for (let i = 0; i < table.count; i++) {
+            offsets[i + 1] = offsets[i] + (rowKind(i) === 'choice' ? choice : plain);
+        }
+        return offsets;
+    }
+
+    // First row whose bottom edge is below y
+    function rowAt(offsets, y) {
+        let lo = 0, hi = table.count;
+        while (lo < hi) {
+            const mid = (lo + hi) >> 1;
+            if (offsets[mid + 1] <= y) lo = mid + 1; else hi = mid;
+        }
+        return lo;
+    }
+
+    function renderTable() {
+        table.frame = 0;
+        if (!table.spacer) return;
+        updateMatchCount();
+        const reflow = !table.offsets;
+        if (reflow) table.offsets = computeOffsets();
+        const offsets = table.offsets;
+        table.spacer.style.height = `${offsets[table.count]}px`;
+
+        const top = elements.songList.scrollTop - table.spacer.offsetTop;
+        const bottom = top + elements.songList.clientHeight;
+        const first = Math.max(0, rowAt(offsets, top) - OVERSCAN);
+        const last = Math.min(table.count, rowAt(offsets, bottom) + 1 + OVERSCAN);
+
+        // Drop rows that left the window, except one the user is typing in
+        const focused = document.activeElement && document.activeElement.closest('.virtual-row');
+        table.rendered.forEach((item, index) => {
+            if ((index < first || index >= last) && item !== focused) {
+                item.remove();
+                table.rendered.delete(index);
+            }
+        });
+
+        const fragment = document.createDocumentFragment();
+        for (let i = first; i < last; i++) {
+            let item = table.rendered.get(i);
+            if (item && table.dirty.has(i) && item !== focused) {
+                item.remove();
+                item = null;
+            }
+            if (!item) {
+                item = buildRow(i);
+                item.style.top = `${offsets[i]}px`;
+                table.rendered.set(i, item);
+                fragment.appendChild(item);
+            } else if (reflow) {
+                item.style.top = `${offsets[i]}px`;
+            }
+        }
+        table.spacer.appendChild(fragment);
+        table.dirty.clear();
+    }
+
+    elements.songList.addEventListener('scroll', scheduleRender, { passive: true });
+    window.addEventListener('resize', () => {
+        table.heights = {};
+        table.offsets = null;
+        scheduleRender();
+    });
+
+    // --- Rows ---
+    function escapeHtml(text) {
+        return String(text).replace(/[&<>"']/g, c => ({ '&': '&amp;', '<': '&lt;', '>': '&gt;', '"': '&quot;', "'": '&#39;' })[c]);
+    }
+
+    function rowElement(index, statusClass, html) {
+        const item = document.createElement('div');
+        item.className = 'song-item virtual-row';
+        item.dataset.index = index;
+        item.innerHTML = `<div class="song-status ${statusClass}"></div>` + html;
+        return item;
+    }
+
+    function plainItem(index, title, artistLine, statusClass, artistStyle = '') {
+        return rowElement(index, statusClass, `
+            <div class="song-info">
+                <div class="song-title">${escapeHtml(title)}</div>
+                <div class="song-artist" style="${artistStyle}">${escapeHtml(artistLine)}</div>
+            </div>
+        `);
+    }
+
+    function choiceItem(index, title, statusLine, statusStyle, query, options, statusClass) {
+        return rowElement(index, statusClass, `
+            <div class="song-info">
+                <div class="song-title">${escapeHtml(title)}</div>
+                <div class="song-artist" style="${statusStyle}">${escapeHtml(statusLine)}</div>
+                <div class="refine-container">
+                    <input type="text" class="refine-input" placeholder="Refine search..." value="${escapeHtml(query)}">
+                    <button class="small-btn refine-btn">Search</button>
+                </div>
+                <select class="candidate-select${options ? '' : ' empty'}">${options}</select>
+            </div>
+        `);
+    }
+
+    function optionsHtml(choices, selected) {
+        // choices: [id, label]
+        return choices.map(([id, label]) =>
+            `<option value="${id}"${id === selected ? ' selected' : ''}>${escapeHtml(label)}</option>`
+        ).join('');
+    }
+
+    function offeredIds(index) {
+        // The ids in the row's dropdown, in option order
+        const rows = refineRows.get(index);
+        if (rows) return rows.map(row => row[0]);
+        const r = packedRows[index];
+        return r && r[5] ? r[5].map(c => c[0]) : [];
+    }
+
+    function refineOptions(index) {
+        const rows = refineRows.get(index);
+        return rows ? optionsHtml(rows.map(([id, artist, title, album]) => [id, `${artist} - ${title} (${album})`]), selectedIds[index]) : '';
+    }
+
+    function buildRow(index) {
+        const r = packedRows[index];
+        if (!r) {
+            // Parsed, not matched (yet)
+            const song = currentSongs[index];
+            return plainItem(index, song.title, song.artist || '(No Artist)', 'pending');
+        }
+        const row = unpackRow(r);
+        if (row.status === 'found') {
+            return plainItem(index, row.title, `Found: ${row.artist}`, 'found', 'color:#00ff88');
+        }
+        if (row.status === 'missing') {
+            const options = refineOptions(index);
+            return choiceItem(index, row.title, 'Not Found', 'color:#ff3b3b',
+                refineText.get(index) ?? `${row.artist} ${row.title}`, options, options ? 'ambiguous' : 'missing');
+        }
+        const options = refineOptions(index) || optionsHtml(
+            row.candidates.map(c => [c.id, `${c.artist} - ${c.title} (${c.album})`]), selectedIds[index]);
+        return choiceItem(index, row.title, 'Choose Match', 'color:#ffd700',
+            refineText.get(index) ?? row.title, options, 'ambiguous');
+    }
+
+    // One set of listeners for the whole table: rows come and go as it scrolls
+    function rowIndex(target) {
+        const item = target.closest('.virtual-row');
+        return item ? Number(item.dataset.index) : -1;
+    }
+
+    elements.songList.addEventListener('click', e => {
+        if (e.target.classList.contains('refine-btn')) onRefineClick(e.target, rowIndex(e.target));
+    });
+    elements.songList.addEventListener('input', e => {
+        if (!e.target.classList.contains('refine-input')) return;
+        const index = rowIndex(e.target);
+        refineText.set(index, e.target.value);
+        clearTimeout(suggestTimers.get(index));
+        suggestTimers.set(index, setTimeout(() => suggest(index), SUGGEST_DEBOUNCE_MS));
+    });
+    elements.songList.addEventListener('change', e => {
+        if (!e.target.classList.contains('candidate-select')) return;
+        // By position, not by parsing the option's value: IDs aren't always numeric
+        const index = rowIndex(e.target);
+        selectedIds[index] = offeredIds(index)[e.target.selectedIndex] ?? null;
+    });
+
+    // --- Refine type-ahead ---
+    const SUGGEST_DEBOUNCE_MS = 80;
+    const SUGGEST_MIN_CHARS = 2;
+    const suggestMemo = new Map(); // query -> rows [id, artist, title, album], most recent last
+    const suggestTimers = new Map(); // index -> debounce timer
+    const suggestPending = new Map(); // index -> AbortController of its in-flight request
+
+    function showCandidates(index, rows) {
+        refineRows.set(index, rows);
+        selectedIds[index] = rows[0][0];
+        // Update the row in place if it's on screen, so the refine box keeps focus
+        const item = table.rendered.get(index);
+        if (!item) return;
+        const select = item.querySelector('.candidate-select');
+        select.innerHTML = refineOptions(index);
+        select.classList.remove('empty');
+        // Update status color if it was missing
+        item.querySelector('.song-status').className = 'song-status ambiguous';
+    }
+
+    // Returns the rows for the row's current refine text, or null if it was superseded
+    async function suggest(index) {
+        const query = (refineText.get(index) || '').trim();
+        if (query.length < SUGGEST_MIN_CHARS) return null;
+
+        if (suggestMemo.has(query)) {
+            const rows = suggestMemo.get(query);
+            if (rows.length) showCandidates(index, rows);
+            return rows;
+        }
 
-            // Attach Refine Events
-            document.querySelectorAll('.refine-btn').forEach(btn => {
-                btn.addEventListener('click', async (e) => {
-                    const idx = e.target.getAttribute('data-index');
-                    const parent = e.target.closest('.song-info');
-                    const input = parent.querySelector('.refine-input');
-                    const select = parent.querySelector('.candidate-select');
-
-                    const query = input.value;
-                    if (!query) return;
-
-                    e.target.textContent = "...";
-
-                    try {
-                        const res = await fetch('/api/search_candidates', {
-                            method: 'POST',
-                            headers: { 'Content-Type': 'application/json' },
-                            body: JSON.stringify({ arl: storedArl, query: query })
-                        });
-                        const data = await res.json();
-
-                        if (data.candidates && data.candidates.length > 0) {
-                            select.innerHTML = data.candidates.map(c =>
-                                `<option value="${c.id}">${c.artist} - ${c.title} (${c.album})</option>`
-                            ).join('');
-                            select.style.display = 'block';
-
-                            // Update status color if it was missing
-                            const statusDot = parent.parentElement.querySelector('.song-status');
-                            if (statusDot) statusDot.style.background = '#ffd700'; // Turn yellow
-                        } else {
-                            alert("No matches found for that query");
-                        }
-                    } catch (err) {
-                        alert("Search failed: " + err);
-                    } finally {
-                        e.target.textContent = "Search";
-                    }
-                });
+        // A newer keystroke cancels the request for the older one
+        if (suggestPending.has(index)) suggestPending.get(index).abort();
+        const controller = new AbortController();
+        suggestPending.set(index, controller);
+
+        try {
+            const res = await fetch('/api/suggest', {
+                method: 'POST',
+                headers: { 'Content-Type': 'application/json' },
+                body: JSON.stringify({ arl: storedArl, query: query }),
+                signal: controller.signal
             });
+            const data = await res.json();
+            if (data.status === 'error') throw new Error(data.message);
+
+            suggestMemo.set(data.q, data.c);
+            if (suggestMemo.size > 200) suggestMemo.delete(suggestMemo.keys().next().value);
+
+            // Stale: the box no longer says what this answers
+            if (data.q !== (refineText.get(index) || '').trim()) return null;
+            if (data.c.length) showCandidates(index, data.c);
+            return data.c;
+        } catch (err) {
+            if (err.name === 'AbortError') return null;
+            throw err;
+        } finally {
+            if (suggestPending.get(index) === controller) suggestPending.delete(index);
+        }
+    }
+
+    async function onRefineClick(button, index) {
+        const input = button.closest('.song-info').querySelector('.refine-input');
+        clearTimeout(suggestTimers.get(index));
+        refineText.set(index, input.value);
+
+        if (!input.value.trim()) return;
+
+        button.textContent = "...";
+
+        try {
+            const rows = await suggest(index);
+            if (rows && rows.length === 0) alert("No matches found for that query");
+        } catch (err) {
+            alert("Search failed: " + err);
+        } finally {
+            button.textContent = "Search";
         }
     }
 
     // --- Creation Functions ---
     elements.btnCreate.addEventListener('click', async () => {
-        if (!preparedResults.length) return alert("Please click 'Find Matches' first!");
+        if (!matchedCount) return alert("Please click 'Find Matches' first!");
 
         const playlistName = elements.playlistName.value.trim();
-        if (!playlistName) return alert("Enter a playlist name!");
+        const syncTarget = elements.syncTarget.value.trim();
+        if (!playlistName && !syncTarget) return alert("Enter a playlist name!");
 
-        // Collect IDs
+        // Collect IDs: from the match state, not the DOM (only the rows in view are rendered)
         const trackIds = [];
-        const items = elements.songList.querySelectorAll('.song-item');
-
-        items.forEach(item => {
-            // Check for hidden input
-            const hidden = item.querySelector('.track-id');
-            if (hidden) {
-                trackIds.push(parseInt(hidden.value));
-            } else {
-                // Check for select
-                const select = item.querySelector('select');
-                if (select) {
-                    trackIds.push(parseInt(select.value));
-                }
-            }
+        selectedIds.forEach(id => {
+            if (id !== null) trackIds.push(id);
         });
 
         if (trackIds.length === 0) return alert("No valid tracks selected to add.");
 
+        if (syncTarget) return syncPlaylist(syncTarget, trackIds);
+
         elements.btnCreate.textContent = "Creating...";
         elements.btnCreate.disabled = true;
 
@@ -291,9 +553,21 @@ document.addEventListener('DOMContentLoaded', () => {
             const data = await res.json();
 
             if (data.status === 'success') {
+                // Built within the request (server without a job queue, e.g. serverless)
                 alert(data.message);
-            } else {
+                return;
+            }
+            if (data.status !== 'queued') {
                 alert("Error: " + data.message);
+                return;
+            }
+
+            // The playlist is built in the background: poll the job until it's finished
+            const job = await waitForJob(data.job_id);
+            if (job.status === 'done') {
+                alert(job.message);
+            } else {
+                alert("Error: " + job.message);
             }
         } catch (e) {
             alert("Network error: " + e);
@@ -303,6 +577,37 @@ document.addEventListener('DOMContentLoaded', () => {
         }
     });
 
+    // Update an existing playlist instead of creating a new one: only the difference is sent
+    async function syncPlaylist(playlist, trackIds) {
+        elements.btnCreate.textContent = "Syncing...";
+        elements.btnCreate.disabled = true;
+        try {
+            const res = await fetch('/api/sync', {
+                method: 'POST',
+                headers: { 'Content-Type': 'application/json' },
+                body: JSON.stringify({ arl: storedArl, playlist: playlist, track_ids: trackIds })
+            });
+            const data = await res.json();
+            alert(data.status === 'success' ? data.message : "Error: " + data.message);
+        } catch (e) {
+            alert("Network error: " + e);
+        } finally {
+            elements.btnCreate.textContent = "Create Playlist";
+            elements.btnCreate.disabled = false;
+        }
+    }
+
+    async function waitForJob(jobId) {
+        while (true) {
+            await new Promise(resolve => setTimeout(resolve, 1000));
+            const res = await fetch(`/api/jobs/${jobId}`);
+            if (!res.ok) throw new Error(`job status ${res.status}`);
+            const job = await res.json();
+            if (job.status === 'done' || job.status === 'failed') return job;
+            elements.btnCreate.textContent = `Adding... ${job.added}/${job.requested}`;
+        }
+    }
+
     // Init
     if (storedArl) {
         checkConnection(storedArl);
@@ -0,0 +1,129 @@
+import threading
+import time
+from collections import OrderedDict
+
+import config
+import metrics
+from deezer_gw import parse_candidates, SEARCH_CANDIDATES
+from matching import fold, TOKEN_RE
+
+SUGGEST_SOURCE = metrics.counter(
+    'deezer_suggest_total', 'Refine-box lookups by source (exact, prefix, network)', ('source',))
+
+
+def normalize(query):
+    """Cache key for a typed query: case, accents, punctuation and spacing don't matter."""
+    return ' '.join(TOKEN_RE.findall(fold(query)))
+
+
+def matches(candidate, words):
+    """Every typed word starts some word of the candidate's artist, title or album."""
+    text = fold(f"{candidate.artist or ''} {candidate.title or ''} {candidate.album or ''}")
+    have = TOKEN_RE.findall(text)
+    return all(any(h.startswith(w) for h in have) for w in words)
+
+
+class _Entry:
+    __slots__ = ('expires', 'candidates', 'complete')
+
+    def __init__(self, expires, candidates, complete):
+        self.expires = expires
+        self.candidates = candidates
+        self.complete = complete
+
+
+class CandidateCache:
+    """
+    Type-ahead cache in front of search_candidates for the refine box.
+
+    Each network lookup fetches a pool of SUGGEST_POOL results and keeps it under the
+    normalised query. While the user keeps typing, a query that extends a cached one
+    ("queen bo" -> "queen boh") is answered by filtering that pool locally: exactly when
+    the pool held every result Deezer had for the shorter query, and otherwise only if
+    enough of it still matches to fill the answer. Anything else goes to the network
+    (through the shared search cache, which also merges identical in-flight lookups).
+    """
+
+    def __init__(self, max_entries=None, ttl=None, pool=None):
+        self.max_entries = max_entries or config.SUGGEST_CACHE_SIZE
+        self.ttl = ttl if ttl is not None else config.SUGGEST_TTL
+        self.pool = pool or config.SUGGEST_POOL
+        self._entries = OrderedDict()  # normalised query -> _Entry
+        self._lock = threading.Lock()
+
+        self.exact = 0
+        self.prefix = 0
+        self.network = 0
+
+    def _get(self, key, now):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry.expires <= now:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def lookup(self, query, limit):
+        """(candidates, 'exact' | 'prefix') from the cache, or (None, None)."""
+        key = normalize(query)
+        now = time.time()
+        with self._lock:
+            entry = self._get(key, now)
+            if entry is not None:
+                self.exact += 1
+                return entry.candidates[:limit], 'exact'
+            # Longest cached prefix of what was typed; shorter ones can't do better
+            for cut in range(len(key) - 1, 0, -1):
+                entry = self._get(key[:cut], now)
+                if entry is not None:
+                    break
+            else:
+                return None, None
+        words = key.split()
+        found = [c for c in entry.candidates if matches(c, words)]
+        if entry.complete or len(found) >= limit:
+            with self._lock:
+                self.prefix += 1
+            return found[:limit], 'prefix'
+        return None, None
+
+    def put(self, query, candidates, complete):
+        key = normalize(query)
+        with self._lock:
+            self._entries[key] = _Entry(time.time() + self.ttl, candidates, complete)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    async def search(self, client, query, limit=10):
+        """search_candidates(query, limit) for a pooled async client, answered locally when possible."""
+        candidates, source = self.lookup(query, limit)
+        if candidates is None:
+            results = await client._search(query, max(limit, self.pool))
+            candidates = parse_candidates(results)
+            results = results or {}  # gw-light answers null when nothing matched
+            # The offline index answers with what it has, not Deezer's full result count
+            complete = results.get('source') != 'track_index' and int(results.get('total') or 0) <= len(candidates)
+            self.put(query, candidates, complete)
+            SEARCH_CANDIDATES.inc(result='hit' if candidates else 'empty')
+            with self._lock:
+                self.network += 1
+            candidates, source = candidates[:limit], 'network'
+        SUGGEST_SOURCE.inc(source=source)
+        return candidates, source
+
+    def stats(self):
+        lookups = self.exact + self.prefix + self.network
+        return {
+            'entries': len(self._entries),
+            'exact_hits': self.exact,
+            'prefix_hits': self.prefix,
+            'network': self.network,
+            'hit_ratio': round((self.exact + self.prefix) / lookups, 4) if lookups else 0.0,
+        }
+
+
+# Shared by the server's refine endpoints
+candidate_cache = CandidateCache()
@@ -0,0 +1,30 @@
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Loaded by the first request that needs them, never at import (see benchmarks/bench_cold_start.py)
+LAZY = ('requests', 'httpx', 'h2', 'uvicorn')
+# deezer_gw's helpers are imported on their own (query building, parsing); they shouldn't open
+# the search cache or the track index, or pull in the rest of the app
+CLIENT_ONLY = LAZY + ('search_cache', 'track_index', 'tracing', 'playlist_sync')
+
+
+def loaded(module, watched):
+    """Which of `watched` are in sys.modules after importing `module` in a fresh interpreter."""
+    env = dict(os.environ, PYTHONDONTWRITEBYTECODE='1', VERCEL='1')
+    env.update({'SEARCH_CACHE_DB': '', 'TRACK_INDEX_PATH': '', 'JOBS_DB': ''})
+    code = f'import json, sys, {module}; print(json.dumps([m for m in {list(watched)!r} if m in sys.modules]))'
+    proc = subprocess.run([sys.executable, '-c', code], cwd=ROOT, env=env, capture_output=True, text=True)
+    assert proc.returncode == 0, proc.stderr
+    return json.loads(proc.stdout.splitlines()[-1])
+
+
+def test_server_import_leaves_http_clients_unloaded():
+    assert loaded('server', LAZY) == []
+
+
+def test_deezer_gw_import_leaves_stores_unloaded():
+    assert loaded('deezer_gw', CLIENT_ONLY) == []
@@ -0,0 +1,64 @@
+from matching import Candidate, classify, rank
+
+
+def best(artist, title, candidates):
+    score, candidate = rank(artist, title, candidates)[0]
+    return classify(score), candidate
+
+
+def test_exact_match_is_found():
+    status, candidate = best('Daft Punk', 'One More Time', [
+        Candidate(1, 'One More Time', 'Daft Punk', 'Discovery'),
+    ])
+    assert (status, candidate.id) == ('found', 1)
+
+
+def test_karaoke_and_live_versions_are_not_found():
+    for title in ('One More Time (Karaoke Version)', 'One More Time - Live', 'One More Time [Live]'):
+        status, _ = best('Daft Punk', 'One More Time', [Candidate(1, title, 'Daft Punk', 'Alive')])
+        assert status == 'ambiguous', title
+
+
+def test_original_is_not_found_for_a_requested_remix():
+    status, _ = best('Daft Punk', 'One More Time (Remix)', [
+        Candidate(1, 'One More Time', 'Daft Punk', 'Discovery'),
+    ])
+    assert status == 'ambiguous'
+
+
+def test_requested_remix_ranks_first_and_is_found():
+    status, candidate = best('Daft Punk', 'One More Time (Remix)', [
+        Candidate(1, 'One More Time', 'Daft Punk', 'Discovery'),
+        Candidate(2, 'One More Time (Remix)', 'Daft Punk', 'Daft Club'),
+    ])
+    assert (status, candidate.id) == ('found', 2)
+
+
+def test_title_only_line_is_never_found():
+    candidates = [
+        Candidate(1, 'Manhattan Project', 'Rush', 'Power Windows'),
+        Candidate(2, 'Manhattan Project', 'Crystal Method', 'Vegas'),
+    ]
+    scores = rank('', 'Manhattan Project', candidates)
+    assert scores[0][0] == scores[1][0]
+    assert classify(scores[0][0]) == 'ambiguous'
+
+
+def test_title_only_line_with_artist_words_is_not_found():
+    # "Artist Title" with no dash matches the candidate's artist + title words, still unconfirmed
+    status, _ = best('', 'Rush Manhattan Project', [Candidate(1, 'Manhattan Project', 'Rush', 'Power Windows')])
+    assert status == 'ambiguous'
+
+
+def test_release_mix_suffixes_are_not_versions():
+    # DJ tracklists name the track as released "(Original Mix)" / "(Extended Mix)"; Deezer often doesn't
+    for title in ('Strobe (Original Mix)', 'Strobe - Original Mix', 'Strobe (Extended Mix)', 'Strobe (Club Mix)'):
+        status, _ = best('Deadmau5', title, [Candidate(1, 'Strobe', 'Deadmau5', 'For Lack of a Better Name')])
+        assert status == 'found', title
+        status, _ = best('Deadmau5', 'Strobe', [Candidate(1, title, 'Deadmau5', 'Strobe')])
+        assert status == 'found', title
+
+
+def test_named_mix_is_still_a_remix():
+    status, _ = best('Deadmau5', 'Strobe', [Candidate(1, 'Strobe (Tiesto Mix)', 'Deadmau5', 'Strobe')])
+    assert status == 'ambiguous'
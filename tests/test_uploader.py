@@ -0,0 +1,47 @@
+import asyncio
+
+from deezer_gw import DeezerAPIError
+from uploader import upload_tracks
+
+
+class FakePlaylistClient:
+    """add_tracks_to_playlist that refuses chunks over `limit` tracks or containing a bad ID."""
+
+    def __init__(self, bad=(), limit=None):
+        self.bad = set(bad)
+        self.limit = limit
+        self.playlist = []
+        self.calls = []
+
+    async def add_tracks_to_playlist(self, playlist_id, track_ids, offset=-1):
+        self.calls.append(len(track_ids))
+        if self.limit and len(track_ids) > self.limit:
+            raise DeezerAPIError('playlist.addSongs', {'ERROR': 'too many songs'})
+        if self.bad & set(track_ids):
+            raise DeezerAPIError('playlist.addSongs', {'ERROR': 'invalid song id'})
+        if offset < 0:
+            self.playlist.extend(track_ids)
+        else:
+            self.playlist[offset:offset] = track_ids
+
+
+def test_one_bad_id_does_not_shrink_later_chunks():
+    ids = list(range(1, 1001))
+    client = FakePlaylistClient(bad={500})
+    report = asyncio.run(upload_tracks(client, 1, ids))
+
+    assert report['failed_ids'] == [500]
+    assert client.playlist == [i for i in ids if i != 500]
+    assert len(client.calls) <= 25
+    assert client.calls[-2] == 100  # back to full-size chunks after the bad ID
+
+
+def test_size_limit_lowers_the_chunk_size():
+    ids = list(range(1, 1001))
+    client = FakePlaylistClient(limit=50)
+    report = asyncio.run(upload_tracks(client, 1, ids))
+
+    assert report['failed_ids'] == []
+    assert client.playlist == ids
+    assert client.calls.count(80) == 1  # rejected once, not retried at that size
+    assert max(client.calls[-3:]) <= 50
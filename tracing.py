@@ -0,0 +1,253 @@
+"""
+Request tracing: a trace per sampled request, with spans for its stages (session login,
+resolve, each search and how it was answered, each gw-light call attempt, JSON encoding).
+
+    with tracer.span('resolve', songs=len(songs)):
+        ...
+
+Spans follow the request through asyncio tasks (contextvars), and span() is a no-op outside
+a sampled request, so the untraced path costs one ContextVar lookup. TRACE_SAMPLE sets the
+share of requests traced; a request sent with "X-Trace: 1" is always traced.
+
+The last TRACE_KEEP traces are kept for GET /api/traces (waterfall() renders one as text).
+Finished traces are also written, as Zipkin v2 JSON spans, to TRACE_FILE (one trace per
+line) and/or POSTed to TRACE_COLLECTOR_URL (Zipkin, Jaeger and the OpenTelemetry collector
+all accept that format), from a background thread so requests never wait on it.
+"""
+import contextvars
+import json
+import logging
+import queue
+import random
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+import config
+
+log = logging.getLogger(__name__)
+
+SERVICE_NAME = 'deezer-playlist'
+
+_current = contextvars.ContextVar('trace_span', default=None)
+
+
+class Trace:
+    def __init__(self, trace_id):
+        self.trace_id = trace_id
+        self.spans = []
+        self.root = None
+
+
+class Span:
+    __slots__ = ('trace', 'span_id', 'parent_id', 'name', 'start', 'offset', 'duration', 'attrs', 'error')
+
+    def __init__(self, trace, name, parent_id=None, start=None, attrs=None):
+        self.trace = trace
+        self.span_id = f'{random.getrandbits(64):016x}'
+        self.parent_id = parent_id
+        self.name = name
+        self.start = time.perf_counter() if start is None else start  # perf_counter
+        self.offset = time.time() - (time.perf_counter() - self.start)  # wall clock at start
+        self.duration = None
+        self.attrs = attrs or {}
+        self.error = None
+        trace.spans.append(self)
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def end(self, end=None):
+        if self.duration is None:
+            self.duration = (time.perf_counter() if end is None else end) - self.start
+
+    def zipkin(self):
+        span = {
+            'traceId': self.trace.trace_id,
+            'id': self.span_id,
+            'name': self.name,
+            'timestamp': int(self.offset * 1e6),
+            'duration': max(1, int((self.duration or 0.0) * 1e6)),
+            'localEndpoint': {'serviceName': SERVICE_NAME},
+            'tags': {k: str(v) for k, v in self.attrs.items()},
+        }
+        if self.parent_id:
+            span['parentId'] = self.parent_id
+        if self.error:
+            span['tags']['error'] = self.error
+        return span
+
+
+class Tracer:
+    def __init__(self, sample=None, keep=None, file=None, collector=None):
+        self.sample = config.TRACE_SAMPLE if sample is None else sample
+        self.file = config.TRACE_FILE if file is None else file
+        self.collector = config.TRACE_COLLECTOR_URL if collector is None else collector
+        self._traces = deque(maxlen=keep or config.TRACE_KEEP)
+        self._exports = None  # queue for the export thread, started on first use
+        self._lock = threading.Lock()
+
+        self.traced = 0
+        self.exported = 0
+        self.export_errors = 0
+
+    def current(self):
+        return _current.get()
+
+    def start_trace(self, name, force=False, **attrs):
+        """Root span of a new trace if this request is sampled, else None. Pair with finish()."""
+        if not force and (self.sample <= 0 or random.random() >= self.sample):
+            return None
+        trace = Trace(f'{random.getrandbits(128):032x}')
+        trace.root = Span(trace, name, attrs=attrs)
+        return trace.root
+
+    @contextmanager
+    def activate(self, span):
+        """Make `span` the parent of spans started in this context (and tasks created in it)."""
+        token = _current.set(span)
+        try:
+            yield span
+        finally:
+            _current.reset(token)
+
+    @contextmanager
+    def span(self, name, **attrs):
+        """Child span of the current one, or nothing at all outside a traced request."""
+        parent = _current.get()
+        if parent is None:
+            yield None
+            return
+        span = Span(parent.trace, name, parent.span_id, attrs=attrs)
+        token = _current.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.error = type(e).__name__ if not str(e) else f'{type(e).__name__}: {e}'
+            raise
+        finally:
+            _current.reset(token)
+            span.end()
+
+    def record(self, name, start, end=None, **attrs):
+        """A finished child span of the current one, from a perf_counter() start (e.g. observe_call)."""
+        parent = _current.get()
+        if parent is None:
+            return
+        span = Span(parent.trace, name, parent.span_id, start=start, attrs=attrs)
+        span.end(end)
+
+    def finish(self, root):
+        """End the trace's root span, keep the trace and hand it to the exporters."""
+        root.end()
+        trace = root.trace
+        with self._lock:
+            self._traces.append(trace)
+            self.traced += 1
+        if self.file or self.collector:
+            self._export(trace)
+
+    def get(self, trace_id):
+        with self._lock:
+            for trace in self._traces:
+                if trace.trace_id == trace_id:
+                    return trace
+        return None
+
+    def recent(self):
+        """Newest first: id, root name, duration, span count and root attributes."""
+        with self._lock:
+            traces = list(self._traces)
+        return [{
+            'trace_id': t.trace_id,
+            'name': t.root.name,
+            'started': round(t.root.offset, 3),
+            'duration_ms': round((t.root.duration or 0.0) * 1000, 1),
+            'spans': len(t.spans),
+            **t.root.attrs,
+        } for t in reversed(traces)]
+
+    def _export(self, trace):
+        if self._exports is None:
+            with self._lock:
+                if self._exports is None:
+                    self._exports = queue.Queue(maxsize=1000)
+                    threading.Thread(target=self._export_loop, name='trace-export', daemon=True).start()
+        try:
+            self._exports.put_nowait(trace)
+        except queue.Full:
+            self.export_errors += 1  # collector down or slow: drop rather than grow
+
+    def _export_loop(self):
+        while True:
+            trace = self._exports.get()
+            spans = [span.zipkin() for span in trace.spans if span.duration is not None]
+            body = json.dumps(spans, separators=(',', ':'))
+            try:
+                if self.file:
+                    with open(self.file, 'a', encoding='utf-8') as f:
+                        f.write(body + '\n')
+                if self.collector:
+                    from urllib.request import Request, urlopen
+                    request = Request(self.collector, data=body.encode('utf-8'),
+                                      headers={'Content-Type': 'application/json'}, method='POST')
+                    with urlopen(request, timeout=5):
+                        pass
+                self.exported += 1
+            except Exception as e:
+                self.export_errors += 1
+                log.debug("Trace export failed: %s", e)
+
+    def stats(self):
+        with self._lock:
+            kept = len(self._traces)
+        return {
+            'sample': self.sample,
+            'traced': self.traced,
+            'kept': kept,
+            'exported': self.exported,
+            'export_errors': self.export_errors,
+        }
+
+
+def waterfall(trace, width=60):
+    """
+    The trace as text, one line per span in start order, indented under its parent:
+    offset and duration in ms, then a bar placed on the root span's timeline.
+    """
+    root = trace.root
+    total = root.duration or max((s.start + (s.duration or 0.0) for s in trace.spans), default=root.start) - root.start
+    scale = width / total if total > 0 else 0.0
+    children = {}
+    for span in trace.spans:
+        children.setdefault(span.parent_id, []).append(span)
+
+    lines = [f'trace {trace.trace_id}  {root.name}  {total * 1000:.1f} ms  {len(trace.spans)} spans', '']
+    names = []
+
+    def walk(span, depth):
+        names.append((span, depth))
+        for child in sorted(children.get(span.span_id, ()), key=lambda s: s.start):
+            walk(child, depth + 1)
+
+    walk(root, 0)
+    label_width = min(60, max(len('  ' * depth + label(span)) for span, depth in names))
+    for span, depth in names:
+        offset = span.start - root.start
+        duration = span.duration if span.duration is not None else total - offset
+        left = int(offset * scale)
+        bar = ' ' * left + '#' * max(1, int(round(duration * scale)))
+        text = ('  ' * depth + label(span))[:label_width]
+        lines.append(f'{offset * 1000:>9.1f} {duration * 1000:>9.1f}  {text:<{label_width}}  |{bar:<{width}}|'
+                     + (f'  ! {span.error}' if span.error else ''))
+    return '\n'.join(lines) + '\n'
+
+
+def label(span):
+    attrs = ' '.join(f'{k}={v}' for k, v in span.attrs.items())
+    return f'{span.name} {attrs}' if attrs else span.name
+
+
+# Shared by the server and the gw-light clients
+tracer = Tracer()
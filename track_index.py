@@ -0,0 +1,411 @@
+"""
+Offline track index: answers search.music locally for tracks we've already seen.
+
+Tracks (id, artist, title, album) come from earlier search.music results and from
+imported dumps. Lookups go through an inverted index of normalised tokens (matching.py)
+and the hits are scored with matching.rank; only a confident answer is returned, anything
+else falls through to the search cache / network.
+
+On disk:
+  <path>      compact base file, memory-mapped read-only (format below)
+  <path>.log  JSON lines appended for every new track since the last compaction
+
+compact() (or `python track_index.py compact`) merges the log into a new base file.
+
+Base file layout (little-endian, sections 8-byte aligned):
+  header    HEADER
+  tracks    n_tracks x TRACK  (id, offset and length of "artist\\x1ftitle\\x1falbum" in strings)
+  ids       n_tracks x int64 sorted ids, then n_tracks x uint32 track numbers
+  strings   UTF-8 blob
+  tokens    n_tokens x TOKEN sorted by token bytes (offset/length in token strings, postings range)
+  tokstr    UTF-8 blob
+  postings  uint32 track numbers
+"""
+import argparse
+import json
+import logging
+import mmap
+import os
+import re
+import struct
+import sys
+import threading
+from array import array
+from bisect import bisect_left
+from collections import Counter
+
+import config
+from matching import Candidate, artist_features, title_features, rank
+
+log = logging.getLogger(__name__)
+
+MAGIC = b'DZTIDX1\n'
+HEADER = struct.Struct('<8sII7Q')  # magic, n_tracks, n_tokens, section offsets (tracks..end)
+TRACK = struct.Struct('<qII')
+TOKEN = struct.Struct('<IIII')
+SEP = '\x1f'
+
+# deezer_gw.strict_query's format
+STRICT_QUERY_RE = re.compile(r'^artist:"(.*)" track:"(.*)"$')
+
+
+def track_tokens(artist, title):
+    a = artist_features(artist or '')
+    t = title_features(title or '')
+    return a.words | a.featured | t.words | t.featured
+
+
+def _pad(f):
+    f.write(b'\0' * (-f.tell() % 8))
+    return f.tell()
+
+
+def write_base(path, tracks):
+    """Write tracks [(id, artist, title, album)] as a base file (atomically replaces path)."""
+    postings = {}
+    strings = bytearray()
+    track_rows = []
+    for n, (tid, artist, title, album) in enumerate(tracks):
+        data = SEP.join((artist or '', title or '', album or '')).encode('utf-8')
+        track_rows.append(TRACK.pack(tid, len(strings), len(data)))
+        strings += data
+        for token in track_tokens(artist, title):
+            postings.setdefault(token.encode('utf-8'), []).append(n)
+
+    tmp = f'{path}.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(b'\0' * HEADER.size)
+        offsets = [_pad(f)]
+        f.write(b''.join(track_rows))
+
+        offsets.append(_pad(f))
+        by_id = sorted(range(len(tracks)), key=lambda n: tracks[n][0])
+        f.write(array('q', (tracks[n][0] for n in by_id)).tobytes())
+        f.write(array('I', by_id).tobytes())
+
+        offsets.append(_pad(f))
+        f.write(strings)
+
+        tokstr = bytearray()
+        token_rows = []
+        all_postings = array('I')
+        for token in sorted(postings):
+            numbers = postings[token]
+            token_rows.append(TOKEN.pack(len(tokstr), len(token), len(all_postings), len(numbers)))
+            tokstr += token
+            all_postings.extend(numbers)
+
+        offsets.append(_pad(f))
+        f.write(b''.join(token_rows))
+        offsets.append(_pad(f))
+        f.write(tokstr)
+        offsets.append(_pad(f))
+        f.write(all_postings.tobytes())
+        offsets.append(f.tell())
+
+        f.seek(0)
+        f.write(HEADER.pack(MAGIC, len(tracks), len(token_rows), *offsets))
+    os.replace(tmp, path)
+
+
+class BaseIndex:
+    """Read-only, memory-mapped view of a base file. Nothing is loaded up front."""
+
+    def __init__(self, path):
+        self._file = open(path, 'rb')
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        (magic, self.n_tracks, self.n_tokens, self._tracks, ids, self._strings,
+         self._tokens, self._tokstr, postings, _end) = HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC:
+            self.close()
+            raise ValueError(f'{path} is not a track index')
+        view = memoryview(self._mm)
+        self._ids = view[ids:ids + 8 * self.n_tracks].cast('q')
+        self._id_numbers = view[ids + 8 * self.n_tracks:ids + 12 * self.n_tracks].cast('I')
+        self._postings = view[postings:_end].cast('I')
+
+    def close(self):
+        for name in ('_ids', '_id_numbers', '_postings'):
+            if hasattr(self, name):
+                getattr(self, name).release()
+        self._mm.close()
+        self._file.close()
+
+    def track(self, n):
+        tid, offset, length = TRACK.unpack_from(self._mm, self._tracks + n * TRACK.size)
+        start = self._strings + offset
+        artist, title, album = self._mm[start:start + length].decode('utf-8').split(SEP)
+        return tid, artist, title, album or None
+
+    def has_id(self, tid):
+        i = bisect_left(self._ids, tid)
+        return i < self.n_tracks and self._ids[i] == tid
+
+    def postings(self, token):
+        """Track numbers containing token (a zero-copy uint32 view), or an empty tuple."""
+        key = token.encode('utf-8')
+        lo, hi = 0, self.n_tokens
+        while lo < hi:
+            mid = (lo + hi) // 2
+            offset, length, start, count = TOKEN.unpack_from(self._mm, self._tokens + mid * TOKEN.size)
+            found = self._mm[self._tokstr + offset:self._tokstr + offset + length]
+            if found < key:
+                lo = mid + 1
+            elif found > key:
+                hi = mid
+            else:
+                return self._postings[start:start + count]
+        return ()
+
+    def tracks(self):
+        for n in range(self.n_tracks):
+            yield self.track(n)
+
+
+class TrackIndex:
+    """
+    Base file + in-memory delta (replayed from the log). Thread-safe; shared by
+    DeezerGWClient and AsyncDeezerGWClient like the search cache.
+    path '' keeps the index in memory only (it still learns for the life of the process).
+    """
+
+    def __init__(self, path=None, min_score=None, max_postings=None, compact_every=None):
+        self.path = config.TRACK_INDEX_PATH if path is None else path
+        self.min_score = min_score if min_score is not None else config.TRACK_INDEX_MIN_SCORE
+        self.max_postings = max_postings or config.TRACK_INDEX_MAX_POSTINGS
+        self.compact_every = compact_every or config.TRACK_INDEX_COMPACT_EVERY
+        self._lock = threading.Lock()
+        self._base = None
+        self._log = None
+        self._reset_delta()
+
+        self.lookups = 0
+        self.hits = 0
+        self.added = 0
+
+        if self.path:
+            try:
+                self._open()
+                if len(self._delta) >= self.compact_every:
+                    self.compact()
+            except (OSError, ValueError) as e:
+                # e.g. read-only filesystem on serverless: keep going memory-only
+                log.warning("Track index: disk disabled (%s)", e)
+                self._close_files()
+                self.path = ''
+
+    def _reset_delta(self):
+        self._delta = []  # [(id, artist, title, album)]
+        self._delta_ids = set()
+        self._delta_postings = {}  # token -> [delta number]
+
+    def _open(self):
+        if os.path.exists(self.path):
+            self._base = BaseIndex(self.path)
+        log_path = f'{self.path}.log'
+        if os.path.exists(log_path):
+            with open(log_path, encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        tid, artist, title, album = json.loads(line)
+                    except ValueError:
+                        continue  # torn last line after a crash
+                    self._add_locked(int(tid), artist, title, album)
+        self._log = open(log_path, 'a', encoding='utf-8')
+
+    def _close_files(self):
+        if self._base is not None:
+            self._base.close()
+            self._base = None
+        if self._log is not None:
+            self._log.close()
+            self._log = None
+
+    def __len__(self):
+        return (self._base.n_tracks if self._base else 0) + len(self._delta)
+
+    # --- updates ---
+
+    def _add_locked(self, tid, artist, title, album):
+        if tid in self._delta_ids or (self._base is not None and self._base.has_id(tid)):
+            return False
+        n = len(self._delta)
+        self._delta.append((tid, artist, title, album))
+        self._delta_ids.add(tid)
+        for token in track_tokens(artist, title):
+            self._delta_postings.setdefault(token, []).append(n)
+        return True
+
+    def add(self, candidates, persist=True):
+        """Add Candidates (e.g. parse_candidates output). Returns how many were new."""
+        added = 0
+        with self._lock:
+            for c in candidates:
+                try:
+                    tid = int(c.id)
+                except (TypeError, ValueError):
+                    continue
+                if self._add_locked(tid, c.artist, c.title, c.album):
+                    added += 1
+                    if persist and self._log is not None:
+                        self._log.write(json.dumps([tid, c.artist, c.title, c.album],
+                                                   ensure_ascii=False) + '\n')
+            if added and persist and self._log is not None:
+                self._log.flush()
+            self.added += added
+        return added
+
+    def compact(self):
+        """Merge the log into a new base file, so it is mmapped instead of held in memory."""
+        if not self.path:
+            return
+        with self._lock:
+            tracks = list(self._base.tracks()) if self._base else []
+            tracks.extend(self._delta)
+            self._close_files()
+            write_base(self.path, tracks)
+            open(f'{self.path}.log', 'w').close()
+            self._reset_delta()
+            self._open()
+
+    # --- lookups ---
+
+    def _candidates(self, tokens, limit):
+        """Tracks sharing the most tokens with the query, rarest tokens first."""
+        lists = []
+        for token in tokens:
+            base = self._base.postings(token) if self._base is not None else ()
+            delta = self._delta_postings.get(token, ())
+            lists.append((len(base) + len(delta), base, delta))
+        lists.sort(key=lambda entry: entry[0])
+
+        counts = Counter()
+        base_offset = self._base.n_tracks if self._base is not None else 0
+        for size, base, delta in lists:
+            if counts and size > self.max_postings:
+                break  # very common token: the rarer ones already picked the candidates
+            counts.update(base)
+            counts.update(n + base_offset for n in delta)
+
+        # Only the best-overlapping tracks can reach min_score; allow one token off for longer queries
+        best = counts.most_common(limit)
+        cutoff = best[0][1] - (best[0][1] > 2) if best else 0
+        tracks = []
+        for n, count in best:
+            if count < cutoff:
+                break
+            tid, artist, title, album = self._base.track(n) if n < base_offset else self._delta[n - base_offset]
+            tracks.append(Candidate(tid, title, artist, album))
+        return tracks
+
+    def search(self, artist, title, limit=10, pool=50):
+        """[(score, Candidate)] best first, scored like the resolver does."""
+        tokens = track_tokens(artist, title)
+        if not tokens:
+            return []
+        with self._lock:
+            candidates = self._candidates(tokens, pool)
+        return rank(artist, title, candidates)[:limit]
+
+    def search_results(self, query, nb):
+        """
+        A search.music-shaped result for a query built by strict_query/loose_query/free text,
+        or None if the index isn't confident (then ask Deezer).
+        """
+        strict = STRICT_QUERY_RE.match(query)
+        artist, title = strict.groups() if strict else ('', query)
+        ranked = self.search(artist, title, limit=nb)
+        with self._lock:
+            self.lookups += 1
+            if not ranked or ranked[0][0] < self.min_score:
+                return None
+            self.hits += 1
+        data = [{'SNG_ID': str(c.id), 'SNG_TITLE': c.title, 'ART_NAME': c.artist, 'ALB_TITLE': c.album}
+                for score, c in ranked if score >= config.MATCH_MIN_SCORE]
+        return {'data': data, 'total': len(data), 'source': 'track_index'}
+
+    def stats(self):
+        with self._lock:
+            return {
+                'tracks': len(self),
+                'base_tracks': self._base.n_tracks if self._base else 0,
+                'log_tracks': len(self._delta),
+                'disk': bool(self.path),
+                'lookups': self.lookups,
+                'hits': self.hits,
+                'hit_ratio': round(self.hits / self.lookups, 4) if self.lookups else 0.0,
+                'added': self.added,
+            }
+
+    # --- bulk import ---
+
+    def import_dump(self, path):
+        """
+        Import a dump: JSON lines, each a track ({id, artist, title, album} or gw keys
+        like SNG_ID/ART_NAME) or a whole search.music result ({'data': [...]}).
+        Goes straight to a new base file. Returns the number of new tracks.
+        """
+        from deezer_gw import parse_candidates
+
+        added = 0
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                item = json.loads(line)
+                added += self.add(parse_candidates(item if 'data' in item else {'data': [item]}), persist=False)
+        self.compact()
+        return added
+
+    def import_search_cache(self, db_path=None):
+        """Import every cached search.music result from the search cache's SQLite file."""
+        import sqlite3
+        from deezer_gw import parse_candidates
+
+        db = sqlite3.connect(db_path or config.SEARCH_CACHE_DB)
+        added = 0
+        try:
+            for (results,) in db.execute('SELECT results FROM search_cache'):
+                added += self.add(parse_candidates(json.loads(results)), persist=False)
+        finally:
+            db.close()
+        self.compact()
+        return added
+
+
+# Shared by DeezerGWClient and AsyncDeezerGWClient
+track_index = TrackIndex()
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description='Build and query the offline track index.')
+    ap.add_argument('--path', default=None, help=f'index file (default TRACK_INDEX_PATH={config.TRACK_INDEX_PATH})')
+    sub = ap.add_subparsers(dest='command', required=True)
+    imp = sub.add_parser('import', help='import JSON-lines dumps of tracks or search.music results')
+    imp.add_argument('files', nargs='+')
+    cache = sub.add_parser('import-cache', help='import everything in the search cache')
+    cache.add_argument('--db', default=None)
+    sub.add_parser('compact', help='merge the update log into the base file')
+    sub.add_parser('stats')
+    query = sub.add_parser('query', help='look up "Artist - Title"')
+    query.add_argument('text')
+    args = ap.parse_args(argv)
+
+    index = track_index if args.path is None else TrackIndex(args.path)
+    if args.command == 'import':
+        for path in args.files:
+            print(f'{path}: {index.import_dump(path)} new tracks')
+    elif args.command == 'import-cache':
+        print(f'{index.import_search_cache(args.db)} new tracks')
+    elif args.command == 'compact':
+        index.compact()
+    elif args.command == 'query':
+        artist, sep, title = args.text.partition(' - ')
+        for score, c in (index.search(artist, title) if sep else index.search('', args.text)):
+            print(f"{score:.3f}  {c.id:>12}  {c.artist} - {c.title} ({c.album})")
+    print(json.dumps(index.stats()))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
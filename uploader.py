@@ -0,0 +1,156 @@
+import asyncio
+import logging
+
+import config
+from deezer_gw import DeezerAPIError
+
+log = logging.getLogger(__name__)
+
+
+class Upload:
+    """Progress of one upload_tracks run; report() is what the API returns."""
+
+    def __init__(self, playlist_id, track_ids):
+        self.playlist_id = playlist_id
+        self.track_ids = list(track_ids)
+        self.added = [False] * len(self.track_ids)
+        self.chunks = []
+
+    def record(self, start, ids, offset, status, attempts, error=None):
+        # A retried chunk replaces the failed entries it covers
+        end = start + len(ids)
+        self.chunks = [c for c in self.chunks if not (c['status'] == 'failed' and start <= c['start'] < end)]
+        chunk = {
+            'start': start,
+            'offset': offset,
+            'status': status,
+            'attempts': attempts,
+            'added_ids' if status == 'added' else 'failed_ids': list(ids),
+        }
+        if error:
+            chunk['error'] = str(error)
+        if status == 'added':
+            for i in range(start, end):
+                self.added[i] = True
+        self.chunks.append(chunk)
+        return chunk
+
+    def position_of(self, start):
+        """Where index `start` belongs in the playlist: number of earlier tracks that landed."""
+        return sum(self.added[:start])
+
+    def report(self):
+        failed = [tid for tid, ok in zip(self.track_ids, self.added) if not ok]
+        return {
+            'playlist_id': self.playlist_id,
+            'requested': len(self.track_ids),
+            'added': len(self.track_ids) - len(failed),
+            'failed_ids': failed,
+            'chunks': sorted(self.chunks, key=lambda c: c['start']),
+        }
+
+
+def is_payload_error(error):
+    """Deezer rejected the request itself (too big / bad IDs), as opposed to a transient failure."""
+    return isinstance(error, DeezerAPIError) and not error.is_rate_limited
+
+
+async def _add_adaptive(client, upload, start, ids, offset, size, on_chunk):
+    """
+    Add `ids` (which begin at index `start` of the upload) at playlist position `offset`
+    (-1 = append), trying `size` tracks per call. Halves the chunk on payload
+    errors down to single tracks (so one bad ID only loses itself), doubles it after success.
+    If a rejected chunk then goes through in smaller pieces without any single track being
+    refused, it was too big: the chunk size stays at or below the largest one accepted.
+    Returns (next size, chunks that failed for transient reasons as (start, ids)).
+    """
+    failed = []
+    pos = 0
+    attempts = 0
+    ceiling = config.UPLOAD_MAX_CHUNK
+    largest_ok = 0
+    split = None  # [end, size, too big?] of a rejected chunk, while its pieces are sent
+    while pos < len(ids):
+        chunk = ids[pos:pos + size if split is None else min(pos + size, split[0])]
+        attempts += 1
+        try:
+            await client.add_tracks_to_playlist(upload.playlist_id, chunk, offset=offset)
+        except Exception as e:
+            if is_payload_error(e) and len(chunk) > 1:
+                if split is None:
+                    split = [pos + len(chunk), len(chunk), len(chunk) > largest_ok]
+                size = max(1, len(chunk) // 2)
+                log.info("Chunk of %d rejected (%s), retrying with %d", len(chunk), e, size)
+                continue
+            status = upload.record(start + pos, chunk, offset, 'failed', attempts, e)
+            if not is_payload_error(e):
+                failed.append((start + pos, chunk))
+            elif split is not None:
+                split[2] = False  # a bad ID, not the size: back to full-size chunks
+                size = split[1]
+            if on_chunk:
+                on_chunk(status, upload)
+        else:
+            status = upload.record(start + pos, chunk, offset, 'added', attempts)
+            if offset >= 0:
+                offset += len(chunk)
+            largest_ok = max(largest_ok, len(chunk))
+            size = min(ceiling, size * 2)
+            if on_chunk:
+                on_chunk(status, upload)
+        pos += len(chunk)
+        attempts = 0
+        if split is not None and pos >= split[0]:
+            if split[2]:
+                ceiling = min(ceiling, max(1, largest_ok))
+                size = min(size, ceiling)
+            split = None
+    return size, failed
+
+
+async def upload_tracks(client, playlist_id, track_ids, ordered=True, parallelism=None,
+                        on_chunk=None, base_offset=0):
+    """
+    Append track_ids to an existing playlist with playlist.addSongs and report what landed.
+
+    Chunk size adapts: it starts at UPLOAD_CHUNK_SIZE, doubles after each success
+    (up to UPLOAD_MAX_CHUNK) and halves when Deezer rejects the payload. Chunks that fail
+    for transient reasons (after _call's own retries) are retried at the end, inserted at
+    their original position via `offset`, so playlist order still matches track_ids.
+
+    Ordered inserts depend on where the previous chunk landed, so they run one at a time.
+    With ordered=False, up to `parallelism` chunks are sent at once and appended in
+    whatever order they complete.
+
+    base_offset is the number of tracks already in the playlist (0 for a new one).
+    on_chunk(chunk_report, upload) is called after every chunk (e.g. to persist progress).
+    """
+    upload = Upload(playlist_id, track_ids)
+    ids = upload.track_ids
+    size = config.UPLOAD_CHUNK_SIZE
+
+    if ordered:
+        size, failed = await _add_adaptive(client, upload, 0, ids, base_offset, size, on_chunk)
+    else:
+        # Fixed-size slices, `parallelism` of them in flight; each adapts on its own
+        workers = asyncio.Semaphore(max(1, parallelism or config.UPLOAD_PARALLELISM))
+        step = config.UPLOAD_MAX_CHUNK
+
+        async def run(start):
+            async with workers:
+                return await _add_adaptive(client, upload, start, ids[start:start + step], -1, size, on_chunk)
+
+        outcomes = await asyncio.gather(*(run(start) for start in range(0, len(ids), step)))
+        failed = [chunk for _, chunk_failed in outcomes for chunk in chunk_failed]
+
+    # Retry only the chunks that failed transiently, each at the position it belongs to
+    for _ in range(config.UPLOAD_RETRY_ROUNDS):
+        if not failed:
+            break
+        retry, failed = failed, []
+        for start, chunk in sorted(retry):
+            offset = base_offset + upload.position_of(start) if ordered else -1
+            _, still_failed = await _add_adaptive(client, upload, start, chunk, offset, len(chunk), on_chunk)
+            failed.extend(still_failed)
+
+    return upload.report()